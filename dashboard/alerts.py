@@ -0,0 +1,365 @@
+"""Moteur d'alertes à règles, évalué au fil de l'ingestion.
+
+Chaque règle déclarative (RULES) associe à chaque opération une valeur
+(erreur, urgence, durée hors seuil), l'accumule dans une fenêtre
+glissante par clé (engin ou zone) et compare l'agrégat de la fenêtre à un
+seuil de déclenchement et à un seuil de retour à la normale (hystérésis).
+Les fenêtres tiennent une somme courante : chaque événement coûte O(1)
+amorti, quelle que soit la taille de la fenêtre.
+
+Une alerte déclenchée est écrite dans la table alerts ; son retour à la
+normale renseigne resolue_a. Le dashboard ne fait que lire les alertes
+actives.
+
+Usage :
+    python dashboard/alerts.py install --db data/processed/portsec.db
+    python dashboard/alerts.py rebuild
+    python dashboard/alerts.py list
+"""
+import argparse
+import sqlite3
+import sys
+import time
+from collections import deque
+from contextlib import contextmanager
+from dataclasses import dataclass
+from datetime import datetime, timezone
+
+import numpy as np
+import pandas as pd
+
+import filters
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS alerts (
+    id INTEGER PRIMARY KEY,
+    regle TEXT NOT NULL,
+    cle TEXT NOT NULL,
+    severite TEXT NOT NULL,
+    message TEXT NOT NULL,
+    valeur REAL,
+    declenchee_a TEXT NOT NULL,
+    resolue_a TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_alerts_actives ON alerts (resolue_a, declenchee_a);
+"""
+
+ACTIVE_QUERY = """
+    SELECT id, regle, cle, severite, message, valeur, declenchee_a
+    FROM alerts
+    WHERE resolue_a IS NULL
+    ORDER BY declenchee_a DESC LIMIT ?
+"""
+
+
+@dataclass(frozen=True)
+class Rule:
+    """Règle déclarative évaluée sur une fenêtre glissante par clé
+
+    key     : colonne regroupant les fenêtres ('engin' ou 'zone')
+    value   : colonne d'opération -> valeur par événement (tableau numpy)
+    window  : ('count', n) n derniers événements, ('time', s) s dernières secondes
+    fire    : déclenche quand l'agrégat (somme) atteint ce seuil
+    clear   : l'alerte est résolue quand l'agrégat repasse sous ce seuil
+    errors  : la règle porte sur les erreurs (masquée avec les erreurs)
+    """
+    name: str
+    title: str
+    key: str
+    value: object
+    window: tuple
+    fire: float
+    clear: float
+    severity: str
+    message: str
+    min_events: int = 1
+    errors: bool = False
+
+
+RULES = [
+    Rule(
+        name="taux_erreur_engin", title="Taux d'erreur élevé", key="engin",
+        value=lambda ops: (ops['erreur'].fillna(0).to_numpy() != 0).astype(float),
+        window=("count", 50), fire=5, clear=3, min_events=50, severity="critique",
+        message="{cle} : {valeur:.0f} erreurs sur les 50 dernières opérations", errors=True,
+    ),
+    Rule(
+        name="pic_urgences_zone", title="Pic d'urgences", key="zone",
+        value=lambda ops: (ops['urgence'].fillna(0).to_numpy() != 0).astype(float),
+        window=("time", 3600), fire=3, clear=1, severity="avertissement",
+        message="{cle} : {valeur:.0f} urgences dans la dernière heure",
+    ),
+    Rule(
+        name="durees_excessives_engin", title="Durées excessives", key="engin",
+        value=lambda ops: (ops['duree_minutes'].fillna(0).to_numpy() > 90).astype(float),
+        window=("count", 20), fire=2, clear=1, severity="avertissement",
+        message="{cle} : {valeur:.0f} opérations de plus de 90 min sur les 20 dernières",
+    ),
+]
+
+RULES_BY_NAME = {rule.name: rule for rule in RULES}
+
+
+# ========== FENÊTRES GLISSANTES ==========
+class CountWindow:
+    """Somme des n dernières valeurs"""
+
+    def __init__(self, size):
+        self._values = deque(maxlen=size)
+        self.total = 0.0
+
+    def __len__(self):
+        return len(self._values)
+
+    def copy(self):
+        other = CountWindow(self._values.maxlen)
+        other._values.extend(self._values)
+        other.total = self.total
+        return other
+
+    def push(self, timestamp, value):
+        if len(self._values) == self._values.maxlen:
+            self.total -= self._values[0]
+        self._values.append(value)
+        self.total += value
+
+
+class TimeWindow:
+    """Somme des valeurs des s dernières secondes (horodatage de l'événement)"""
+
+    def __init__(self, seconds):
+        self.seconds = seconds
+        self._events = deque()
+        self.total = 0.0
+
+    def __len__(self):
+        return len(self._events)
+
+    def copy(self):
+        other = TimeWindow(self.seconds)
+        other._events.extend(self._events)
+        other.total = self.total
+        return other
+
+    def push(self, timestamp, value):
+        self._events.append((timestamp, value))
+        self.total += value
+        self.advance(timestamp)
+
+    def advance(self, now):
+        horizon = now - self.seconds
+        while self._events and self._events[0][0] <= horizon:
+            self.total -= self._events.popleft()[1]
+
+
+def _new_window(window):
+    kind, size = window
+    return CountWindow(size) if kind == "count" else TimeWindow(size)
+
+
+def _epoch_seconds(timestamps):
+    return pd.to_datetime(timestamps, format='ISO8601').to_numpy().astype('datetime64[s]').astype(np.int64)
+
+
+# ========== MOTEUR ==========
+class AlertEngine:
+    """État des fenêtres par (règle, clé) et alertes actives"""
+
+    def __init__(self, rules=RULES, conn=None):
+        self.rules = rules
+        self.conn = conn
+        self._windows = {}
+        self.active = {}  # (règle, clé) -> alerte
+        self._journal = None  # (règle, clé) -> fenêtre avant transaction
+
+    @classmethod
+    def for_connection(cls, conn, rules=RULES, warmup_rows=20_000):
+        """Moteur branché sur la base : fenêtres réchauffées sur les dernières
+        opérations (sans écriture), puis alertes actives rechargées depuis la table"""
+        engine = cls(rules)
+        engine.process(pd.read_sql_query(
+            "SELECT timestamp, zone, engin, duree_minutes, urgence, erreur "
+            "FROM operations ORDER BY timestamp DESC LIMIT ?", conn, params=(warmup_rows,)
+        ))
+        engine.conn = conn
+        engine.active = {}
+        cursor = conn.execute(ACTIVE_QUERY, (-1,))
+        columns = [c[0] for c in cursor.description]
+        for row in cursor:
+            alert = dict(zip(columns, row))
+            engine.active[(alert['regle'], alert['cle'])] = alert
+        return engine
+
+    @contextmanager
+    def transaction(self):
+        """Annule les changements en mémoire si le bloc échoue (rollback SQLite)
+
+        Seules les fenêtres touchées sont copiées, avant leur première écriture.
+        """
+        active = dict(self.active)
+        self._journal = {}
+        try:
+            yield self
+        except BaseException:
+            for state_key, window in self._journal.items():
+                if window is None:
+                    self._windows.pop(state_key, None)
+                else:
+                    self._windows[state_key] = window
+            self.active = active
+            raise
+        finally:
+            self._journal = None
+
+    def _window(self, state_key, rule=None):
+        window = self._windows.get(state_key)
+        if self._journal is not None and state_key not in self._journal:
+            self._journal[state_key] = window.copy() if window is not None else None
+        if window is None and rule is not None:
+            window = self._windows[state_key] = _new_window(rule.window)
+        return window
+
+    def process(self, ops):
+        """Évalue un lot d'opérations (dans l'ordre chronologique) ; retourne les alertes déclenchées"""
+        if ops.empty:
+            return []
+        seconds = _epoch_seconds(ops['timestamp'])
+        order = np.argsort(seconds, kind='stable')
+        seconds = seconds[order]
+        fired = []
+        for rule in self.rules:
+            keys = ops[rule.key].astype(str).to_numpy()[order]
+            values = rule.value(ops)[order]
+            for timestamp, key, value in zip(seconds.tolist(), keys.tolist(), values.tolist()):
+                state_key = (rule.name, key)
+                window = self._window(state_key, rule)
+                window.push(timestamp, value)
+                active = state_key in self.active
+                if not active and window.total >= rule.fire and len(window) >= rule.min_events:
+                    fired.append(self._fire(rule, key, window.total, timestamp))
+                elif active and window.total < rule.clear:
+                    self._resolve(state_key, timestamp)
+        # Une clé silencieuse voit aussi sa fenêtre temporelle se vider
+        now = int(seconds[-1])
+        for state_key in list(self.active):
+            window = self._window(state_key)
+            if isinstance(window, TimeWindow):
+                window.advance(now)
+                rule = next(r for r in self.rules if r.name == state_key[0])
+                if window.total < rule.clear:
+                    self._resolve(state_key, now)
+        return fired
+
+    def _fire(self, rule, key, total, timestamp):
+        alert = {
+            'regle': rule.name, 'cle': key, 'severite': rule.severity,
+            'message': rule.message.format(cle=key, valeur=total), 'valeur': total,
+            'declenchee_a': _format(timestamp),
+        }
+        if self.conn is not None:
+            alert['id'] = self.conn.execute(
+                "INSERT INTO alerts (regle, cle, severite, message, valeur, declenchee_a) "
+                "VALUES (:regle, :cle, :severite, :message, :valeur, :declenchee_a)", alert
+            ).lastrowid
+        self.active[(rule.name, key)] = alert
+        return alert
+
+    def _resolve(self, state_key, timestamp):
+        alert = self.active.pop(state_key)
+        if self.conn is not None:
+            self.conn.execute("UPDATE alerts SET resolue_a = ? WHERE id = ?", (_format(timestamp), alert['id']))
+
+    def active_alerts(self, limit=20):
+        """Alertes actives, plus récentes d'abord (même forme que ACTIVE_QUERY)"""
+        alerts = sorted(self.active.values(), key=lambda a: a['declenchee_a'], reverse=True)[:limit]
+        return pd.DataFrame(alerts, columns=['regle', 'cle', 'severite', 'message', 'valeur', 'declenchee_a'])
+
+
+def matching(active, active_filters):
+    """Alertes dont la clé (zone ou engin) passe les filtres de la barre latérale
+
+    Erreurs masquées : les alertes des règles portant sur les erreurs aussi.
+    """
+    scopes = active['regle'].map(lambda name: RULES_BY_NAME[name].key if name in RULES_BY_NAME else None)
+    keys = active['cle'].astype(str)
+    selected = np.ones(len(active), dtype=bool)
+    if active_filters.zones:
+        selected &= ((scopes != 'zone') | keys.isin(active_filters.zones)).to_numpy()
+    if active_filters.engin_types:
+        prefixes = tuple(filters.ENGIN_TYPES[t] for t in active_filters.engin_types)
+        selected &= ((scopes != 'engin') | keys.str.startswith(prefixes)).to_numpy()
+    if not active_filters.show_errors:
+        selected &= ~active['regle'].map(lambda name: name in RULES_BY_NAME and RULES_BY_NAME[name].errors).to_numpy(dtype=bool)
+    return active[selected].reset_index(drop=True)
+
+
+def _format(seconds):
+    return datetime.fromtimestamp(seconds, timezone.utc).strftime('%Y-%m-%d %H:%M:%S')
+
+
+def has_alerts(conn):
+    """Indique si la table des alertes existe dans la base"""
+    return conn.execute(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'alerts'"
+    ).fetchone() is not None
+
+
+def install(conn):
+    """Crée la table ; si neuve, l'alimente en rejouant l'historique"""
+    fresh = not has_alerts(conn)
+    with conn:
+        conn.executescript(SCHEMA)
+    if fresh:
+        rebuild(conn, log=lambda message: None)
+    return fresh
+
+
+def rebuild(conn, batch_size=500_000, log=print):
+    """Vide la table alerts et rejoue tout l'historique des opérations"""
+    with conn:
+        conn.execute("DELETE FROM alerts")
+    engine = AlertEngine(conn=conn)
+    total = 0
+    last = ("", 0)
+    while True:
+        batch = pd.read_sql_query(
+            "SELECT rowid AS op_id, timestamp, zone, engin, duree_minutes, urgence, erreur FROM operations "
+            "WHERE (timestamp, rowid) > (?, ?) ORDER BY timestamp, rowid LIMIT ?",
+            conn, params=(*last, batch_size),
+        )
+        if batch.empty:
+            break
+        with conn:
+            engine.process(batch)
+        total += len(batch)
+        last = (batch['timestamp'].iloc[-1], int(batch['op_id'].iloc[-1]))
+        log(f"   {total:,} opérations évaluées, {len(engine.active)} alertes actives")
+    return engine
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Moteur d'alertes PortSec")
+    parser.add_argument("command", choices=["install", "rebuild", "list"])
+    parser.add_argument("--db", default="data/processed/portsec.db", help="Chemin de la base SQLite")
+    args = parser.parse_args(argv)
+
+    conn = sqlite3.connect(args.db)
+    try:
+        started = time.perf_counter()
+        if args.command == "install":
+            fresh = install(conn)
+            print(f"✅ Table des alertes installée ({'recalculée' if fresh else 'déjà présente'})")
+        elif args.command == "rebuild":
+            engine = rebuild(conn)
+            print(f"✅ Alertes recalculées : {len(engine.active)} actives")
+        else:
+            for row in conn.execute(ACTIVE_QUERY, (50,)):
+                print(f"[{row[3]}] {row[6]} {row[4]}")
+        print(f"   ({time.perf_counter() - started:.2f}s)")
+        return 0
+    finally:
+        conn.close()
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,397 @@
+"""Scores d'anomalie incrémentaux par (engin, zone, métrique).
+
+Chaque clé garde une moyenne et un second moment pondérés
+exponentiellement (EWMA) : la mise à jour par un lot est vectorisée
+(somme pondérée par d^k, d = 1 - alpha, regroupée par np.bincount) et
+ne relit jamais l'historique. Le score d'une valeur est son écart à la
+moyenne en nombre d'écarts-types, calculé en O(1) depuis l'état.
+
+Métriques :
+    duree   durée de chaque opération (un pas par opération)
+    volume  nombre d'opérations par jour ; le jour en cours reste ouvert
+            et n'est replié qu'au passage au jour suivant, les jours sans
+            activité comptent pour 0
+
+L'état est sauvegardé dans anomaly_state avec le dernier rowid
+d'operations replié (anomaly_checkpoint) : un redémarrage recharge l'état
+et ne replie que les lignes postérieures.
+
+Usage :
+    python dashboard/anomalies.py install --db data/processed/portsec.db
+    python dashboard/anomalies.py update      # replie les nouvelles lignes
+    python dashboard/anomalies.py rebuild
+    python dashboard/anomalies.py top
+"""
+import argparse
+import sqlite3
+import sys
+import time
+from contextlib import contextmanager
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+# Poids des nouvelles valeurs par métrique (demi-vie ~ 14 opérations, ~ 5 jours)
+ALPHA = {
+    "duree": 0.05,
+    "volume": 2 / 15,
+}
+# Pas minimum avant qu'un score soit considéré comme significatif
+MIN_STEPS = 10
+ANOMALY_THRESHOLD = 3.0
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS anomaly_state (
+    engin TEXT NOT NULL,
+    zone TEXT NOT NULL,
+    metrique TEXT NOT NULL,
+    n INTEGER NOT NULL,
+    m1 REAL NOT NULL,
+    m2 REAL NOT NULL,
+    pas INTEGER NOT NULL,
+    courant REAL NOT NULL,
+    moyenne REAL,
+    ecart_type REAL,
+    dernier REAL,
+    score REAL,
+    PRIMARY KEY (engin, zone, metrique)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS anomaly_checkpoint (
+    id INTEGER PRIMARY KEY CHECK (id = 1),
+    dernier_rowid INTEGER NOT NULL,
+    updated_at TEXT NOT NULL
+);
+"""
+
+SAVE_SQL = """
+    INSERT OR REPLACE INTO anomaly_state
+        (engin, zone, metrique, n, m1, m2, pas, courant, moyenne, ecart_type, dernier, score)
+    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+"""
+
+TOP_QUERY = """
+    SELECT engin, zone, metrique, dernier, moyenne, ecart_type, score
+    FROM anomaly_state
+    WHERE n >= ? AND score IS NOT NULL
+    ORDER BY ABS(score) DESC LIMIT ?
+"""
+
+_OPERATIONS_AFTER = """
+    SELECT rowid AS op_id, timestamp, zone, engin, duree_minutes FROM operations
+    WHERE rowid > ? ORDER BY rowid LIMIT ?
+"""
+
+
+# ========== ÉTAT PAR MÉTRIQUE ==========
+class MetricState:
+    """Moments pondérés d'une métrique, un indice par clé (engin, zone)"""
+
+    _ARRAYS = ("m1", "m2", "n", "pas", "courant", "dernier", "score")
+
+    def __init__(self, alpha):
+        self.alpha = alpha
+        self.keys = []
+        self._index = {}
+        self.m1 = np.zeros(0)
+        self.m2 = np.zeros(0)
+        self.n = np.zeros(0, dtype=np.int64)
+        self.pas = np.zeros(0, dtype=np.int64)
+        self.courant = np.zeros(0)
+        self.dernier = np.zeros(0)
+        self.score = np.zeros(0)
+
+    def __len__(self):
+        return len(self.keys)
+
+    def ids(self, engins, zones):
+        """Indices des clés (créées au besoin) pour des tableaux d'engins et de zones"""
+        pairs = pd.MultiIndex.from_arrays([engins, zones])
+        codes, uniques = pd.factorize(pairs)
+        known = np.array([self._index.get(key, -1) for key in uniques], dtype=np.int64)
+        for i in np.flatnonzero(known < 0):
+            known[i] = self._index[uniques[i]] = len(self.keys)
+            self.keys.append(uniques[i])
+        self._grow()
+        return known[codes]
+
+    def _grow(self):
+        extra = len(self.keys) - len(self.m1)
+        if extra:
+            self.m1 = np.concatenate([self.m1, np.zeros(extra)])
+            self.m2 = np.concatenate([self.m2, np.zeros(extra)])
+            self.n = np.concatenate([self.n, np.zeros(extra, dtype=np.int64)])
+            self.pas = np.concatenate([self.pas, np.full(extra, -1, dtype=np.int64)])
+            self.courant = np.concatenate([self.courant, np.zeros(extra)])
+            self.dernier = np.concatenate([self.dernier, np.full(extra, np.nan)])
+            self.score = np.concatenate([self.score, np.full(extra, np.nan)])
+
+    def snapshot(self):
+        """Copie de l'état, pour restore()"""
+        return len(self.keys), [getattr(self, name).copy() for name in self._ARRAYS]
+
+    def restore(self, snapshot):
+        """Revient à un état de snapshot() (clés créées depuis oubliées)"""
+        size, arrays = snapshot
+        for key in self.keys[size:]:
+            del self._index[key]
+        del self.keys[size:]
+        for name, array in zip(self._ARRAYS, arrays):
+            setattr(self, name, array)
+
+    def moments(self, m1=None, m2=None, n=None):
+        """Moyenne et écart-type (corrigés du biais de départ à zéro)"""
+        m1 = self.m1 if m1 is None else m1
+        m2 = self.m2 if m2 is None else m2
+        n = self.n if n is None else n
+        with np.errstate(divide='ignore', invalid='ignore'):
+            weight = 1.0 - (1.0 - self.alpha) ** n
+            mean = np.where(n > 0, m1 / weight, np.nan)
+            std = np.sqrt(np.maximum(m2 / weight - mean * mean, 0.0))
+        return mean, std
+
+    def fold(self, ids, exponents, values, steps, last):
+        """Replie des valeurs pondérées par d^exposant ; steps pas par clé
+
+        last : valeur du dernier pas replié par clé (NaN si aucun pas),
+        notée contre l'état qui la précède.
+        """
+        d = 1.0 - self.alpha
+        size = len(self)
+        weights = d ** exponents
+        decay = d ** steps
+        self.m1 = decay * self.m1 + self.alpha * np.bincount(ids, weights * values, minlength=size)
+        self.m2 = decay * self.m2 + self.alpha * np.bincount(ids, weights * values * values, minlength=size)
+        self.n = self.n + steps
+        # État avant le dernier pas : m = d * m_prec + alpha * x
+        touched = steps > 0
+        previous_mean, previous_std = self.moments(
+            (self.m1 - self.alpha * last) / d, (self.m2 - self.alpha * last * last) / d, self.n - 1
+        )
+        with np.errstate(divide='ignore', invalid='ignore'):
+            score = np.where((previous_std > 1e-9) & (self.n - 1 >= MIN_STEPS),
+                             (last - previous_mean) / previous_std, np.nan)
+        self.dernier = np.where(touched, last, self.dernier)
+        self.score = np.where(touched, score, self.score)
+
+    def score_of(self, engin, zone, value):
+        """Score d'une valeur pour une clé, en O(1) ; None si clé inconnue ou état trop court"""
+        i = self._index.get((engin, zone))
+        if i is None or self.n[i] < MIN_STEPS:
+            return None
+        mean, std = self.moments(self.m1[i], self.m2[i], self.n[i])
+        return float((value - mean) / std) if std > 1e-9 else None
+
+
+def _labels(column):
+    return column.astype(object).fillna('').astype(str).to_numpy()
+
+
+# ========== SCOREUR ==========
+class AnomalyScorer:
+    """États EWMA de toutes les métriques et dernier rowid replié"""
+
+    def __init__(self, alpha=ALPHA):
+        self.metrics = {name: MetricState(a) for name, a in alpha.items()}
+        self.last_rowid = 0
+
+    @contextmanager
+    def transaction(self):
+        """Annule les changements en mémoire si le bloc échoue (rollback SQLite)"""
+        snapshots = {name: state.snapshot() for name, state in self.metrics.items()}
+        last_rowid = self.last_rowid
+        try:
+            yield self
+        except BaseException:
+            for name, snapshot in snapshots.items():
+                self.metrics[name].restore(snapshot)
+            self.last_rowid = last_rowid
+            raise
+
+    def process(self, ops):
+        """Replie un lot d'opérations (toutes métriques)"""
+        if ops.empty:
+            return
+        seconds = pd.to_datetime(ops['timestamp'], format='ISO8601').to_numpy().astype('datetime64[s]').astype(np.int64)
+        order = np.argsort(seconds, kind='stable')
+        engins = _labels(ops['engin'])[order]
+        zones = _labels(ops['zone'])[order]
+        self._fold_duree(engins, zones, ops['duree_minutes'].to_numpy(dtype=float)[order])
+        self._fold_volume(engins, zones, seconds[order] // 86400)
+
+    def _fold_duree(self, engins, zones, durations):
+        state = self.metrics["duree"]
+        valid = ~np.isnan(durations)
+        if not valid.any():
+            return
+        ids = state.ids(engins[valid], zones[valid])
+        values = durations[valid]
+        # Rang de chaque valeur dans la séquence de sa clé (ordre chronologique)
+        order = np.argsort(ids, kind='stable')
+        counts = np.bincount(ids, minlength=len(state))
+        ends = np.cumsum(counts)
+        rank = np.empty(len(ids), dtype=np.int64)
+        rank[order] = np.arange(len(ids)) - (ends - counts)[ids[order]] + 1
+        last = np.full(len(state), np.nan)
+        has = counts > 0
+        last[has] = values[order[ends[has] - 1]]
+        state.fold(ids, counts[ids] - rank, values, counts, np.where(has, last, 0.0))
+
+    def _fold_volume(self, engins, zones, days):
+        state = self.metrics["volume"]
+        ids = state.ids(engins, zones)
+        size = len(state)
+        first = np.full(size, np.iinfo(np.int64).max)
+        np.minimum.at(first, ids, days)
+        existing = state.pas >= 0
+        # Pas ouvert au début du lot, puis pas final (jour le plus récent)
+        start = np.where(existing, state.pas, first)
+        end = np.maximum(int(days.max()), start)
+        # Comptes par (clé, jour) ; les lignes en retard rejoignent le pas ouvert,
+        # le compte du pas ouvert précédent est repris
+        buckets = pd.DataFrame({
+            'id': np.concatenate([ids, np.flatnonzero(existing)]),
+            'jour': np.concatenate([np.maximum(days, start[ids]), state.pas[existing]]),
+            'compte': np.concatenate([np.ones(len(ids)), state.courant[existing]]),
+        }).groupby(['id', 'jour'], sort=False)['compte'].sum().reset_index()
+        bucket_ids = buckets['id'].to_numpy()
+        bucket_days = buckets['jour'].to_numpy()
+        counts = buckets['compte'].to_numpy()
+        is_open = bucket_days == end[bucket_ids]
+        closed = ~is_open
+        steps = end - start
+        previous_day = closed & (bucket_days == end[bucket_ids] - 1)
+        last = np.bincount(bucket_ids[previous_day], counts[previous_day], minlength=size)
+        state.fold(bucket_ids[closed], end[bucket_ids[closed]] - 1 - bucket_days[closed], counts[closed], steps, last)
+        state.courant = np.bincount(bucket_ids[is_open], counts[is_open], minlength=size)
+        state.pas = end
+
+    def score(self, engin, zone, metric, value):
+        """Score d'une valeur observée, en O(1)"""
+        return self.metrics[metric].score_of(engin, zone, value)
+
+    def frame(self):
+        """État courant, une ligne par (engin, zone, métrique)"""
+        frames = []
+        for name, state in self.metrics.items():
+            mean, std = state.moments()
+            frames.append(pd.DataFrame({
+                'engin': [k[0] for k in state.keys], 'zone': [k[1] for k in state.keys], 'metrique': name,
+                'n': state.n, 'm1': state.m1, 'm2': state.m2, 'pas': state.pas, 'courant': state.courant,
+                'moyenne': mean, 'ecart_type': std, 'dernier': state.dernier, 'score': state.score,
+            }))
+        return pd.concat(frames, ignore_index=True)
+
+    def top(self, limit=10, min_steps=MIN_STEPS):
+        """Clés aux scores les plus élevés en valeur absolue (même forme que TOP_QUERY)"""
+        state = self.frame()
+        state = state[(state['n'] >= min_steps) & state['score'].notna()]
+        state = state.iloc[np.argsort(-state['score'].abs().to_numpy(), kind='stable')].head(limit)
+        return state[['engin', 'zone', 'metrique', 'dernier', 'moyenne', 'ecart_type', 'score']].reset_index(drop=True)
+
+    # ----- Points de reprise -----
+    def save(self, conn, last_rowid=None):
+        """Écrit l'état et le dernier rowid replié (dans la transaction de l'appelant)"""
+        if last_rowid is not None:
+            self.last_rowid = int(last_rowid)
+        rows = self.frame().astype(object).where(lambda f: f.notna(), None)
+        conn.executemany(SAVE_SQL, rows.itertuples(index=False, name=None))
+        conn.execute(
+            "INSERT OR REPLACE INTO anomaly_checkpoint (id, dernier_rowid, updated_at) VALUES (1, ?, ?)",
+            (self.last_rowid, datetime.now().isoformat(timespec='seconds')),
+        )
+
+    @classmethod
+    def load(cls, conn, alpha=ALPHA):
+        """Recharge l'état sauvegardé (état vide si aucun point de reprise)"""
+        scorer = cls(alpha)
+        row = conn.execute("SELECT dernier_rowid FROM anomaly_checkpoint WHERE id = 1").fetchone()
+        if row is None:
+            return scorer
+        scorer.last_rowid = row[0]
+        saved = pd.read_sql_query("SELECT * FROM anomaly_state", conn)
+        for name, state in scorer.metrics.items():
+            rows = saved[saved['metrique'] == name]
+            if rows.empty:
+                continue
+            ids = state.ids(rows['engin'].to_numpy(), rows['zone'].to_numpy())
+            for column in ('m1', 'm2', 'n', 'pas', 'courant', 'dernier', 'score'):
+                values = getattr(state, column)
+                values[ids] = rows[column].astype(values.dtype).to_numpy()
+        return scorer
+
+    def catch_up(self, conn, batch_size=200_000, log=None):
+        """Replie les opérations postérieures au dernier rowid replié, puis sauvegarde"""
+        total = 0
+        while True:
+            batch = pd.read_sql_query(_OPERATIONS_AFTER, conn, params=(self.last_rowid, batch_size))
+            if batch.empty:
+                break
+            self.process(batch)
+            self.last_rowid = int(batch['op_id'].iloc[-1])
+            total += len(batch)
+            if log:
+                log(f"   {total:,} opérations repliées")
+        if total:
+            with conn:
+                self.save(conn)
+        return total
+
+
+def has_anomalies(conn):
+    """Indique si la table d'état des anomalies existe dans la base"""
+    return conn.execute(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'anomaly_state'"
+    ).fetchone() is not None
+
+
+def install(conn):
+    """Crée les tables ; si neuves, replie tout l'historique"""
+    fresh = not has_anomalies(conn)
+    with conn:
+        conn.executescript(SCHEMA)
+    if fresh:
+        rebuild(conn)
+    return fresh
+
+
+def rebuild(conn, log=None):
+    """Recalcule l'état depuis le début de la table operations"""
+    with conn:
+        conn.execute("DELETE FROM anomaly_state")
+        conn.execute("DELETE FROM anomaly_checkpoint")
+    scorer = AnomalyScorer()
+    scorer.catch_up(conn, log=log)
+    return scorer
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Scores d'anomalie PortSec")
+    parser.add_argument("command", choices=["install", "update", "rebuild", "top"])
+    parser.add_argument("--db", default="data/processed/portsec.db", help="Chemin de la base SQLite")
+    args = parser.parse_args(argv)
+
+    conn = sqlite3.connect(args.db)
+    try:
+        started = time.perf_counter()
+        if args.command == "install":
+            fresh = install(conn)
+            print(f"✅ État des anomalies installé ({'recalculé' if fresh else 'déjà présent'})")
+        elif args.command == "update":
+            n = AnomalyScorer.load(conn).catch_up(conn, log=print)
+            print(f"✅ {n:,} nouvelles opérations repliées")
+        elif args.command == "rebuild":
+            scorer = rebuild(conn, log=print)
+            print(f"✅ État recalculé jusqu'au rowid {scorer.last_rowid:,}")
+        else:
+            for row in conn.execute(TOP_QUERY, (MIN_STEPS, 20)):
+                print(f"{row[6]:+6.2f}  {row[2]:<7} {row[0]:<14} {row[1]:<16} "
+                      f"valeur {row[3]:.1f} (moyenne {row[4]:.1f} ± {row[5]:.1f})")
+        print(f"   ({time.perf_counter() - started:.2f}s)")
+        return 0
+    finally:
+        conn.close()
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,29 +1,21 @@
 import logging
-import sys
-import streamlit as st
-import pandas as pd
-import plotly.express as px
-import plotly.graph_objects as go
+import uuid
 from datetime import datetime, timedelta
-import sqlite3
-import json
-import time
-import numpy as np
-import folium
-from streamlit_folium import folium_static
-import random
-from pathlib import Path
+
+import streamlit as st
+
+import event_log
+import import_report
 
 # ========== CONFIGURATION DES LOGS ==========
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-    handlers=[
-        logging.FileHandler('app.log'),
-        logging.StreamHandler(sys.stdout)
-    ]
-)
+# Lignes JSON écrites par un thread dédié (voir event_log.py) : le script
+# ne fait que poser les enregistrements dans une file
+event_log.setup()
 logger = logging.getLogger(__name__)
+if "session_id" not in st.session_state:
+    st.session_state.session_id = uuid.uuid4().hex[:12]
+st.session_state.rerun_id = st.session_state.get("rerun_id", 0) + 1
+event_log.bind(session_id=st.session_state.session_id, rerun_id=st.session_state.rerun_id)
 logger.info("Application démarrée")
 
 # ========== AUTHENTIFICATION OBLIGATOIRE ==========
@@ -49,9 +41,11 @@ if not st.session_state.authenticated:
         
         if st.button("🔓 Se connecter", type="primary", use_container_width=True):
             if password == CORRECT_PASSWORD:
+                logger.info("Connexion réussie", extra=event_log.event("auth", resultat="succes"))
                 st.session_state.authenticated = True
                 st.rerun()
             else:
+                logger.warning("Mot de passe incorrect", extra=event_log.event("auth", resultat="echec"))
                 st.error("❌ Mot de passe incorrect")
     
     st.markdown("---")
@@ -69,6 +63,44 @@ st.set_page_config(
     initial_sidebar_state="expanded"
 )
 
+# ========== IMPORTS APRÈS AUTHENTIFICATION ==========
+# L'écran de connexion ne charge que streamlit : la pile d'analyse est
+# importée ici, les modules propres à une section au début de celle-ci
+# (temps à froid mesurés par import_report, rapport dans les logs)
+with import_report.timed("données (pandas, data_access)"):
+    import pandas as pd
+    import data_access
+    import filters
+    import fleet
+    import metrics
+    import snapshots
+    import synthetic
+
+# ========== BASE DE LA SESSION ==========
+# Le bouton de démonstration rejoue une journée dans une copie de la base
+# (replay.DEMO_DB_PATH), jamais dans la production : la session qui l'a
+# lancé lit cette copie jusqu'à ce qu'elle quitte la démonstration
+DB_PATH = data_access.DB_PATH
+demo_without_db = False
+if st.session_state.get('demo_launched'):
+    st.session_state.demo_launched = False
+    if DB_PATH.exists():
+        import replay
+        with st.spinner("Copie de la base pour la démonstration..."):
+            replay.start_background(DB_PATH)
+        st.session_state.demo_replay = True
+        logger.info("Démonstration lancée", extra=event_log.event("demo", vitesse=replay.DEMO_SPEED))
+    else:
+        demo_without_db = True
+if st.session_state.get('demo_replay'):
+    import replay
+    DB_PATH = replay.DEMO_DB_PATH
+
+# Latences des sections 5 à 13 et des requêtes : p50/p95/p99 exportés au
+# format Prometheus si PORTSEC_METRICS_FILE ou PORTSEC_METRICS_PORT est défini
+metrics.start_exporter()
+metrics.begin_rerun()
+
 # ========== RESTE DE VOTRE CODE ORIGINAL ==========
 # (Tout le code après cette ligne reste exactement comme vous l'aviez)
 
@@ -141,140 +173,340 @@ st.markdown("""
 """, unsafe_allow_html=True)
 
 # ========== 3. FONCTIONS DE DONNÉES ==========
-def create_sample_data(start_date, end_date):
-    """Crée des données simulées pour la démo"""
-    
-    # Dates pour la période
-    dates = pd.date_range(start_date, end_date, freq='D')
-    
-    # Données journalières simulées (128 à 500 camions/jour)
-    daily_data = pd.DataFrame({
-    'date': dates,
-    'nb_operations': [random.randint(128, 500) for _ in dates],  
-    'duree_moyenne': [40 + random.uniform(-8, 12) for _ in dates],  # 32-52 min
-    'urgences': [random.randint(2, 15) for _ in dates],  # Plus d'urgences avec volume élevé
-    'erreurs': [random.randint(2, 10) for _ in dates]  # Plus d'erreurs avec plus de camions
-})
-    
-    # Performance des engins
-    engins = ['TRACTEUR_01', 'TRACTEUR_02', 'TRACTEUR_03', 'CHARIOT_01', 'CHARIOT_02', 'GRUE_01']
-    engins_data = pd.DataFrame({
-    'engin': engins,
-    'total_operations': [random.randint(200, 1000) for _ in engins],  # Augmenté
-    'erreurs': [random.randint(5, 20) for _ in engins],  # Augmenté
-    'duree_moyenne': [random.uniform(35, 60) for _ in engins]
-})
-    
-   # Données horaires
-    hours = list(range(6, 22))
-    hourly_data = pd.DataFrame({
-    'heure': hours,
-    'nb_operations': [random.randint(10, 50) for _ in hours]  # 10-50 opérations/heure
-})
-    
-    # Dernières opérations
-    recent_ops = pd.DataFrame({
-        'timestamp': [datetime.now() - timedelta(minutes=random.randint(1, 120)) for _ in range(20)],
-        'type_operation': random.choices(['CHARGEMENT', 'DÉCHARGEMENT', 'VÉRIFICATION'], k=20),
-        'zone': random.choices(['QUAI_1', 'QUAI_2_ROUTIER', 'ZONE_STOCKAGE', 'CONTROLE_DOUANE'], k=20),
-        'engin': random.choices(engins, k=20),
-        'duree_minutes': [random.uniform(10, 60) for _ in range(20)],
-        'urgence': [random.choice([0, 1]) for _ in range(20)],
-        'erreur': [random.choice([0, 1]) for _ in range(20)]
-    })
-    
-    return daily_data, engins_data, hourly_data, recent_ops
+def create_sample_data(start_date, end_date, active_filters=filters.Filters()):
+    """Crée des données simulées pour la démo (voir synthetic.sample_datasets)"""
+    return synthetic.sample_datasets(start_date, end_date, active_filters)
 
-def load_data(start_date, end_date):
+def load_data(start_date, end_date, active_filters):
     """Charge les données depuis SQLite ou crée des données simulées"""
     try:
-        db_path = Path("data/processed/portsec.db")
-        
-        if db_path.exists():
-            conn = sqlite3.connect(str(db_path))
-            
-            # Chargement des vues
-            daily_data = pd.read_sql_query(f"""
-                SELECT * FROM vue_operations_journalieres 
-                WHERE date BETWEEN '{start_date.date()}' AND '{end_date.date()}'
-            """, conn)
-            
-            engins_data = pd.read_sql_query("SELECT * FROM vue_performance_engins", conn)
-            hourly_data = pd.read_sql_query("SELECT * FROM vue_analyse_horaire", conn)
-            
-            recent_ops = pd.read_sql_query(f"""
-                SELECT timestamp, type_operation, zone, engin, duree_minutes, urgence, erreur
-                FROM operations 
-                WHERE timestamp BETWEEN '{start_date}' AND '{end_date}'
-                ORDER BY timestamp DESC LIMIT 100
-            """, conn)
-            
-            conn.close()
-            
-            # Conversion des dates
-            if not daily_data.empty:
-                daily_data['date'] = pd.to_datetime(daily_data['date'])
-            
-            return daily_data, engins_data, hourly_data, recent_ops
+        if DB_PATH.exists():
+            # Pool partagé + cache de résultats par filtre (voir data_access.py)
+            return data_access.load_data(start_date, end_date, active_filters, DB_PATH)
         else:
             # Fichier inexistant, on crée des données simulées
-            return create_sample_data(start_date, end_date)
+            return create_sample_data(start_date, end_date, active_filters)
             
     except Exception as e:
+        logger.warning(f"Chargement SQLite impossible: {e}")
         st.sidebar.warning(f"Base de données non disponible. Utilisation de données simulées.")
-        return create_sample_data(start_date, end_date)
+        return create_sample_data(start_date, end_date, active_filters)
 
-def create_realtime_map():
-    """Crée une carte interactive simulée"""
-    # Coordonnées de Kasumbalesa, RDC
-    m = folium.Map(location=[-11.664, 27.482], zoom_start=15, control_scale=True)
-    
-    # Zones du port
-    zones = {
-        'QUAI_1': {'lat': -11.664, 'lon': 27.482, 'color': 'blue', 'icon': 'ship'},
-        'QUAI_2_ROUTIER': {'lat': -11.663, 'lon': 27.483, 'color': 'green', 'icon': 'truck'},
-        'ZONE_STOCKAGE': {'lat': -11.665, 'lon': 27.481, 'color': 'orange', 'icon': 'boxes'},
-        'CONTROLE_DOUANE': {'lat': -11.662, 'lon': 27.484, 'color': 'red', 'icon': 'shield-alt'},
-        'MAINTENANCE': {'lat': -11.666, 'lon': 27.485, 'color': 'gray', 'icon': 'tools'}
+def load_snapshot(period_label, active_filters):
+    """Instantané du worker (snapshots.py) et, sans filtre, vue de la période prédéfinie"""
+    # Le worker publie la base de production, pas la copie de démonstration
+    if not DB_PATH.exists() or DB_PATH != data_access.DB_PATH:
+        return None, None
+    try:
+        snapshot = snapshots.current()
+        if snapshot is None or not snapshot.is_fresh():
+            return None, None
+        view = snapshot.view(period_label) if active_filters.aggregates().is_default else None
+        return snapshot, view
+    except Exception as e:
+        logger.warning(f"Instantané illisible: {e}")
+        return None, None
+
+def snapshot_frame(snapshot, name):
+    """Jeu de données partagé de l'instantané (None si absent ou vide)"""
+    if snapshot is None:
+        return None
+    try:
+        frame = snapshot.frame(name)
+    except Exception as e:
+        logger.warning(f"Instantané illisible ({name}): {e}")
+        return None
+    return frame if not frame.empty else None
+
+def load_positions(engin_types, with_tracks):
+    """Dernières positions et trajets récents des engins, depuis SQLite ou simulés"""
+    try:
+        if DB_PATH.exists() and positions.has_positions(DB_PATH):
+            latest = positions.latest_positions(engin_types, DB_PATH)
+            tracks = positions.recent_tracks(engin_types, db_path=DB_PATH) if with_tracks else None
+            return latest, tracks
+    except Exception as e:
+        logger.warning(f"Lecture des positions impossible: {e}")
+
+    # Démo : trajets simulés du jour (graine fixe, stables d'un rerun à l'autre)
+    start = datetime.combine(datetime.now().date(), datetime.min.time()) + timedelta(hours=8)
+    pings = positions.select_types(positions.simulate_pings(120, 20, start=start), engin_types)
+    pings = pings.assign(timestamp=pings['timestamp'].dt.strftime('%Y-%m-%d %H:%M:%S'))
+    return positions.latest_of(pings), pings if with_tracks else None
+
+def kpi_totals(daily_data):
+    """Totaux de la période reconstitués depuis les agrégats journaliers"""
+    if daily_data.empty:
+        return dict.fromkeys(('nb_operations', 'somme_duree', 'nb_durees', 'urgences', 'erreurs'), 0)
+    with_duration = daily_data['duree_moyenne'].notna()
+    return {
+        'nb_operations': int(daily_data['nb_operations'].sum()),
+        'somme_duree': float((daily_data['duree_moyenne'] * daily_data['nb_operations'])[with_duration].sum()),
+        'nb_durees': int(daily_data.loc[with_duration, 'nb_operations'].sum()),
+        'urgences': int(daily_data['urgences'].sum()),
+        'erreurs': int(daily_data['erreurs'].sum()),
     }
-    
-    # Ajout des marqueurs
-    for zone, info in zones.items():
-        folium.Marker(
-            location=[info['lat'], info['lon']],
-            popup=f'<b>{zone}</b><br>Statut: Normal<br>Activité: Élevée',
-            tooltip=zone,
-            icon=folium.Icon(color=info['color'], icon=info['icon'], prefix='fa')
-        ).add_to(m)
-    
-    # Ajout d'un périmètre du port
-    port_perimeter = [
-        [-11.666, 27.480],
-        [-11.661, 27.480],
-        [-11.661, 27.486],
-        [-11.666, 27.486]
+
+def load_kpi_totals(start_date, end_date, daily_data, active_filters, snapshot_view=None):
+    """Totaux des KPIs : instantané, sommes cumulées SQLite (O(1) par période) ou agrégats journaliers"""
+    if snapshot_view is not None and not snapshot_view['totals'].empty:
+        return snapshot_view['totals'].to_dict('records')[0]
+    if DB_PATH.exists():
+        try:
+            totals = data_access.load_totals(start_date, end_date, active_filters, DB_PATH)
+            if totals is not None:
+                return totals
+        except Exception as e:
+            logger.warning(f"Sommes cumulées indisponibles: {e}")
+    return kpi_totals(daily_data)
+
+def render_kpis(placeholders, totals):
+    """Affiche les KPIs principaux (un placeholder par colonne, mis à jour en direct)"""
+    total_ops = totals['nb_operations']
+    placeholders[0].metric(
+        label="📦 Opérations Total",
+        value=f"{total_ops:,}",
+        delta=f"+{int(total_ops * 0.136):,}" if total_ops > 0 else None
+    )
+
+    avg_duration = totals['somme_duree'] / totals['nb_durees'] if totals['nb_durees'] else 0
+    prev_duration = avg_duration * 1.05
+    delta_pct = ((prev_duration - avg_duration) / prev_duration * 100) if prev_duration > 0 else 0
+    placeholders[1].metric(
+        label="⏱️ Durée Moyenne",
+        value=f"{avg_duration:.1f} min",
+        delta=f"-{delta_pct:.1f}%" if delta_pct > 0 else None
+    )
+
+    error_rate = (totals['erreurs'] / total_ops * 100) if total_ops > 0 else 0
+    placeholders[2].metric(
+        label="❌ Taux d'Erreur",
+        value=f"{error_rate:.1f}%",
+        delta="-0.8%" if error_rate < 2.5 else None,
+        delta_color="normal" if error_rate < 2.5 else "inverse"
+    )
+
+    # Calcul des économies potentielles
+    potential_savings = total_ops * 25 * 0.044  # 4.4% d'erreurs évitées à 25$ par erreur
+    placeholders[3].metric(
+        label="💰 Économies Potentielles",
+        value=f"${potential_savings:,.0f}",
+        delta=f"${potential_savings/12:,.0f}/mois"
+    )
+
+def load_alerts(start_date, end_date, active_filters, snapshot=None):
+    """Alertes actives du moteur de règles, depuis l'instantané, SQLite ou rejouées sur la démo"""
+    active = snapshot_frame(snapshot, "alerts")
+    if active is None and DB_PATH.exists():
+        try:
+            active = data_access.load_active_alerts(db_path=DB_PATH)
+        except Exception as e:
+            logger.warning(f"Lecture des alertes impossible: {e}")
+    if active is None:
+        # Démo : moteur en mémoire sur les opérations simulées de la période
+        def compute():
+            engine = alerts.AlertEngine()
+            engine.process(synthetic.sample_operations(start_date, end_date))
+            return engine.active_alerts(data_access.ALERTS_LIMIT)
+        active = data_access.cached(("demo_alerts", start_date.date(), end_date.date()),
+                                    data_access.QUERY_TTL["alerts"], compute)
+    return alerts.matching(active, active_filters)
+
+def render_alerts(placeholder, active):
+    """Affiche les alertes actives dans un placeholder (mis à jour en direct)"""
+    if active.empty:
+        placeholder.info("✅ Aucune alerte active")
+        return
+    cards = []
+    for alert in active.itertuples():
+        rule = alerts.RULES_BY_NAME.get(alert.regle)
+        icon = "❌" if alert.severite == "critique" else "⚠️"
+        title = rule.title if rule else alert.regle
+        cards.append(f'<div class="alert-card">{icon} **{title}** - {alert.message}'
+                     f'<br><small>depuis le {alert.declenchee_a}</small></div>')
+    # Markdown du contenu des cartes, en un seul élément
+    placeholder.markdown("\n\n".join(cards), unsafe_allow_html=True)
+
+def render_watchlist(watchlist, n_flagged, first=1):
+    """Page des engins à surveiller en un seul tableau (défilement virtuel, hauteur bornée)"""
+    if watchlist.empty:
+        st.markdown("""
+        <div class="success-card">
+            ✅ Tous les engins fonctionnent normalement
+        </div>
+        """, unsafe_allow_html=True)
+        return
+    st.dataframe(
+        watchlist,
+        hide_index=True,
+        use_container_width=True,
+        height=min(36 * (len(watchlist) + 1) + 3, 400),
+        column_config={
+            'engin': st.column_config.TextColumn("Engin"),
+            'total_operations': st.column_config.NumberColumn("Opérations", format="%d"),
+            'erreurs': st.column_config.NumberColumn("Erreurs", format="%d"),
+            'taux_erreur': st.column_config.ProgressColumn(
+                "Taux d'erreur", format="%.1f%%", min_value=0,
+                max_value=max(float(watchlist['taux_erreur'].max()), 5.0),
+            ),
+        },
+    )
+    if n_flagged > len(watchlist):
+        st.caption(f"Engins {first} à {first + len(watchlist) - 1} sur {n_flagged} au-dessus du seuil")
+
+def load_anomalies(start_date, end_date, active_filters, snapshot=None, limit=10):
+    """Scores d'anomalie EWMA les plus forts, depuis l'instantané, l'état SQLite ou recalculés sur la démo"""
+    top = snapshot_frame(snapshot, "anomalies")
+    if top is None and DB_PATH.exists():
+        try:
+            top = data_access.load_anomalies(db_path=DB_PATH)
+        except Exception as e:
+            logger.warning(f"Lecture des scores d'anomalie impossible: {e}")
+    if top is None:
+        def compute():
+            scorer = anomalies.AnomalyScorer()
+            scorer.process(synthetic.sample_operations(start_date, end_date))
+            return scorer.top(data_access.ANOMALIES_LIMIT)
+        top = data_access.cached(("demo_anomalies", start_date.date(), end_date.date()),
+                                 data_access.QUERY_TTL["anomalies"], compute).copy()
+    return top[active_filters.keys_mask(top)].head(limit).reset_index(drop=True)
+
+def render_anomalies(top):
+    """Scores d'anomalie en un seul tableau (écart à la moyenne EWMA, en écarts-types)"""
+    if top.empty:
+        st.caption("Pas encore assez d'historique pour noter les anomalies")
+        return
+    n_strong = int((top['score'].abs() >= anomalies.ANOMALY_THRESHOLD).sum())
+    st.dataframe(
+        top,
+        hide_index=True,
+        use_container_width=True,
+        column_config={
+            'engin': st.column_config.TextColumn("Engin"),
+            'zone': st.column_config.TextColumn("Zone"),
+            'metrique': st.column_config.TextColumn("Métrique"),
+            'dernier': st.column_config.NumberColumn("Dernière valeur", format="%.1f"),
+            'moyenne': st.column_config.NumberColumn("Moyenne EWMA", format="%.1f"),
+            'ecart_type': st.column_config.NumberColumn("Écart-type", format="%.1f"),
+            'score': st.column_config.NumberColumn("Score (σ)", format="%+.2f"),
+        },
+    )
+    st.caption(f"{n_strong} score(s) au-delà de ±{anomalies.ANOMALY_THRESHOLD:.0f}σ "
+               "(durée : dernière opération, volume : dernier jour complet)")
+
+def render_recent_ops(placeholder, recent_ops):
+    """Affiche une page d'opérations dans un placeholder (mis à jour en direct)"""
+    if not recent_ops.empty:
+        placeholder.markdown(feed.format_rows(recent_ops))
+    else:
+        placeholder.info("Aucune opération récente")
+
+def render_cache_info(placeholder, stats):
+    """Compteurs du cache partagé entre sessions (bloc INFORMATIONS de la barre latérale)"""
+    lookups = stats['hits'] + stats['misses'] + stats['waits']
+    hit_rate = 100.0 * (stats['hits'] + stats['waits']) / lookups if lookups else 0.0
+    placeholder.markdown(
+        f"**Cache:** {hit_rate:.0f}% de hits ({stats['hits']} hits, {stats['misses']} misses, "
+        f"{stats['waits']} attentes partagées) · {stats['entries']} entrées, "
+        f"{stats['bytes'] / 2**20:.1f} / {stats['max_bytes'] / 2**20:.0f} Mo"
+    )
+
+def render_latencies(rerun_timings, summary):
+    """Panneau de debug : durées de ce rerun et quantiles du processus, en ms"""
+    this_rerun = {}
+    for name, seconds in rerun_timings:
+        this_rerun[name] = this_rerun.get(name, 0.0) + seconds
+    rows = [
+        {
+            'span': name,
+            'ce rerun': this_rerun[name] * 1000 if name in this_rerun else None,
+            'p50': stats['p50'] * 1000, 'p95': stats['p95'] * 1000, 'p99': stats['p99'] * 1000,
+            'mesures': stats['count'],
+        }
+        # Ordre d'exécution de ce rerun, puis les mesures des autres reruns
+        for name, stats in sorted(summary.items(), key=lambda item: list(this_rerun).index(item[0]) if item[0] in this_rerun else len(this_rerun))
     ]
-    folium.Polygon(
-        locations=port_perimeter,
-        color='#1E3A8A',
-        fill=True,
-        fill_color='#1E3A8A',
-        fill_opacity=0.1,
-        weight=2,
-        popup='Périmètre du Port Sec'
-    ).add_to(m)
-    
-    return m
+    with st.expander("⏱️ LATENCES PAR SECTION ET REQUÊTE (ms)", expanded=True):
+        st.dataframe(pd.DataFrame(rows), hide_index=True, use_container_width=True,
+                     column_config={c: st.column_config.NumberColumn(format="%.1f") for c in ('ce rerun', 'p50', 'p95', 'p99')})
+
+def launch_demo():
+    """Bouton de démonstration : rejeu en arrière-plan suivi par l'actualisation automatique"""
+    st.session_state.demo_launched = True
+    st.session_state.auto_refresh = True
+
+def leave_demo():
+    """Retour de la session à la base de production (le rejeu se termine seul)"""
+    st.session_state.demo_replay = False
+
+def render_replay_status(placeholder, session):
+    """Avancement du rejeu de démonstration (débit, retard d'écriture)"""
+    if session is None:
+        return
+    snapshot = session.stats.snapshot()
+    if session.error is not None:
+        placeholder.error(f"❌ Rejeu interrompu : {session.error}")
+    elif snapshot['termine']:
+        placeholder.success(f"✅ **Démonstration terminée** - {replay.describe(snapshot)}")
+    else:
+        placeholder.info(f"▶️ **Démonstration en cours ({snapshot['vitesse']:g}×)** - {replay.describe(snapshot)}")
+
+def feed_page():
+    """Page courante du flux : tampon de session ou page keyset plus ancienne"""
+    cursors = st.session_state.feed_cursors
+    if not cursors:
+        return st.session_state.feed_buffer.head(feed.PAGE_SIZE)
+    return data_access.fetch_older(cursors[-1], start_date.date(), feed.PAGE_SIZE, active_filters, DB_PATH)
+
+def feed_older(last_key):
+    st.session_state.feed_cursors.append(last_key)
+
+def feed_newer():
+    st.session_state.feed_cursors.pop()
+
+def load_top_engins(engins_data, snapshot_view, k=10):
+    """Top k des engins par volume : classement SQL de la période, sinon données en mémoire"""
+    if snapshot_view is None and DB_PATH.exists():
+        try:
+            ranking = data_access.load_ranking(start_date, end_date, active_filters, "volume", k, db_path=DB_PATH)
+            if ranking is not None:
+                return ranking[0]
+        except Exception as e:
+            logger.warning(f"Classement des engins indisponible: {e}")
+    return engins_data.nlargest(k, 'total_operations')
+
+def watchlist_page(engins_data, snapshot_view):
+    """Page courante des engins à surveiller et nombre signalé (keyset en SQL, sans OFFSET)"""
+    cursors = st.session_state.watchlist_cursors
+    after = cursors[-1] if cursors else None
+    if snapshot_view is not None and after is None:
+        watchlist = snapshot_view['watchlist']
+        n_flagged = int(watchlist['nb_signales'].iloc[0]) if not watchlist.empty else 0
+        return watchlist.drop(columns='nb_signales').head(fleet.PAGE_SIZE), n_flagged
+    if DB_PATH.exists():
+        try:
+            return data_access.load_watchlist(start_date, end_date, active_filters, fleet.PAGE_SIZE, after, DB_PATH)
+        except Exception as e:
+            logger.warning(f"Engins à surveiller indisponibles: {e}")
+    watchlist, n_flagged = data_access.watchlist_of(engins_data, k=fleet.PAGE_SIZE)
+    return (watchlist if after is None else watchlist.iloc[:0]), n_flagged
+
+def watchlist_next(cursor):
+    st.session_state.watchlist_cursors.append(cursor)
+
+def watchlist_previous():
+    st.session_state.watchlist_cursors.pop()
 
 # ========== 4. SIDEBAR ==========
 with st.sidebar:
     st.markdown("### 🎯 **PORT SEC INTELLIGENT**")
     st.markdown("---")
     
-    # Bouton démo
-    if st.button("🚀 **Lancer la démonstration complète**", type="primary", use_container_width=True):
-        st.session_state.demo_launched = True
-        st.rerun()
+    # Bouton démo : rejeu accéléré d'une journée dans une copie de la base (voir replay.py)
+    st.button("🚀 **Lancer la démonstration complète**", type="primary", use_container_width=True, on_click=launch_demo)
+    if st.session_state.get('demo_replay'):
+        st.caption("Démonstration : données lues dans la copie de démonstration")
+        st.button("↩️ Revenir aux données réelles", use_container_width=True, on_click=leave_demo)
     
     st.markdown("---")
     st.markdown("### 📅 **PÉRIODE D'ANALYSE**")
@@ -309,13 +541,22 @@ with st.sidebar:
     st.markdown("---")
     st.markdown("### 🔧 **FILTRES**")
     
-    show_errors = st.checkbox("Afficher les erreurs", value=True)
+    selected_zones = st.multiselect("Zones", synthetic.ZONES, placeholder="Toutes les zones")
+    selected_engin_types = st.multiselect(
+        "Types d'engins", list(filters.ENGIN_TYPES), placeholder="Tous les engins", key="sidebar_engin_types"
+    )
+    selected_types = st.multiselect("Types d'opération", synthetic.TYPES_OPERATION, placeholder="Toutes les opérations")
+    urgences_only = st.checkbox("Urgences uniquement", value=False)
+    show_errors = st.checkbox("Afficher les erreurs", value=True,
+                              help="Décoché : masque les opérations en erreur du flux et les alertes d'erreurs ; "
+                                   "les taux d'erreur restent calculés sur toutes les opérations")
     show_alerts = st.checkbox("Afficher les alertes", value=True)  
-    auto_refresh = st.checkbox("🔄 Actualisation automatique", value=False)
+    auto_refresh = st.checkbox("🔄 Actualisation automatique", value=False, key="auto_refresh")
   
     if auto_refresh:
         refresh_rate = st.slider("Intervalle (secondes)", 5, 60, 30)
-        st.info(f"Prochain rafraîchissement dans {refresh_rate}s")
+        refresh_countdown = st.empty()
+        refresh_countdown.info(f"Prochain rafraîchissement dans {refresh_rate}s")
     
     st.markdown("---")
     st.markdown("#### 📊 **INFORMATIONS**")
@@ -323,18 +564,33 @@ with st.sidebar:
     st.markdown("**Statut:** Prototype")
     st.markdown("**Données:** Simulées 2026")
     st.markdown("**Développeur:** ELIE KAYOMB MBUMB")
+    # Cache partagé par les sessions : rempli en fin de script (section 13)
+    cache_info = st.empty()
+    show_latencies = st.checkbox("⏱️ Latences (debug)", value=False)
 
 # ========== 5. CHARGEMENT DES DONNÉES ==========
+metrics.section("section 5 : chargement des données")
+# Forme canonique des filtres : clé de cache et prédicats SQL / cube
+active_filters = filters.Filters.of(
+    zones=selected_zones,
+    engin_types=selected_engin_types,
+    types_operation=selected_types,
+    urgences_only=urgences_only,
+    show_errors=show_errors,
+)
+# Période prédéfinie sans filtre : agrégats lus dans l'instantané publié
+# par le worker ; seules les opérations récentes sont relues dans SQLite
+snapshot, snapshot_view = load_snapshot(selected_period, active_filters)
 with st.spinner("Chargement des données..."):
-    daily_data, engins_data, hourly_data, recent_ops = load_data(start_date, end_date)
+    if snapshot_view is not None:
+        daily_data, engins_data, hourly_data = (snapshot_view[name] for name in ('daily', 'engins', 'hourly'))
+        recent_ops = data_access.run_query("recent", start_date, end_date, DB_PATH, active_filters)
+    else:
+        daily_data, engins_data, hourly_data, recent_ops = load_data(start_date, end_date, active_filters)
 # ========== AUTO-REFRESH ==========
+# Le rafraîchissement ne relance plus tout le script : voir section 14
 if 'auto_refresh_counter' not in st.session_state:
     st.session_state.auto_refresh_counter = 0
-
-if auto_refresh:
-    st.session_state.auto_refresh_counter += 1
-    time.sleep(refresh_rate)
-    st.rerun()
 # Initialisation de session pour la démo
 if 'demo_launched' not in st.session_state:
     st.session_state.demo_launched = False
@@ -349,6 +605,7 @@ USER_ROLES = {
 user_role = "user"
 
 # ========== 6. EN-TÊTE ==========
+metrics.section("section 6 : en-tête")
 col1, col2 = st.columns([1, 5])
 with col1:
    try:
@@ -373,69 +630,31 @@ with col2:
     st.markdown("**Dashboard Opérationnel | Données Simulées 2026 | Kasumbalesa, RDC**")
 st.markdown("---")
 
-# Effet de démo si lancé
-if st.session_state.demo_launched:
-    progress_bar = st.progress(0)
-    status_text = st.empty()
-    
-    for i in range(101):
-        progress_bar.progress(i)
-        status_text.text(f"Analyse des données en cours... {i}%")
-        time.sleep(0.02)
-    
-    progress_bar.empty()
-    status_text.empty()
-    st.balloons()
-    st.success("✅ **Démonstration terminée** - Données analysées avec succès")
-    st.session_state.demo_launched = False
+# Démonstration : une journée d'opérations rejouée en accéléré dans la copie
+# de la base (ingestion, rollups, alertes), suivie en direct par la section 14
+replay_status = st.empty()
+if demo_without_db:
+    st.info("La démonstration rejoue une journée d'opérations dans une copie de la base : "
+            "créez-la d'abord avec `python dashboard/synthetic.py --db data/processed/portsec.db`")
+if st.session_state.get('demo_replay'):
+    import replay
+    render_replay_status(replay_status, replay.current())
 
 # ========== 7. KPIs PRINCIPAUX ==========
+metrics.section("section 7 : KPIs")
 st.markdown('<h2 class="section-title">📊 SYNTHÈSE OPÉRATIONNELLE</h2>', unsafe_allow_html=True)
 
-col1, col2, col3, col4 = st.columns(4)
-
-with col1:
-    total_ops = daily_data['nb_operations'].sum() if not daily_data.empty else 0
-    st.metric(
-        label="📦 Opérations Total",
-        value=f"{total_ops:,}",
-        delta=f"+{int(total_ops * 0.136):,}" if total_ops > 0 else None
-    )
-
-with col2:
-    avg_duration = daily_data['duree_moyenne'].mean() if not daily_data.empty else 0
-    prev_duration = avg_duration * 1.05
-    delta_pct = ((prev_duration - avg_duration) / prev_duration * 100) if prev_duration > 0 else 0
-    st.metric(
-        label="⏱️ Durée Moyenne",
-        value=f"{avg_duration:.1f} min",
-        delta=f"-{delta_pct:.1f}%" if delta_pct > 0 else None
-    )
-
-with col3:
-    if not daily_data.empty and daily_data['nb_operations'].sum() > 0:
-        error_rate = (daily_data['erreurs'].sum() / daily_data['nb_operations'].sum() * 100)
-    else:
-        error_rate = 0
-    st.metric(
-        label="❌ Taux d'Erreur",
-        value=f"{error_rate:.1f}%",
-        delta="-0.8%" if error_rate < 2.5 else None,
-        delta_color="normal" if error_rate < 2.5 else "inverse"
-    )
-
-with col4:
-    # Calcul des économies potentielles
-    potential_savings = total_ops * 25 * 0.044  # 4.4% d'erreurs évitées à 25$ par erreur
-    st.metric(
-        label="💰 Économies Potentielles",
-        value=f"${potential_savings:,.0f}",
-        delta=f"${potential_savings/12:,.0f}/mois"
-    )
+kpi_placeholders = [col.empty() for col in st.columns(4)]
+render_kpis(kpi_placeholders, load_kpi_totals(start_date, end_date, daily_data, active_filters, snapshot_view))
 
 st.markdown("---")
 
 # ========== 8. VISUALISATIONS ==========
+metrics.section("section 8 : graphiques")
+with import_report.timed("section 8 : graphiques (plotly)"):
+    import plotly.graph_objects as go
+    import downsampling
+
 st.markdown('<h2 class="section-title">📈 ANALYSE DES PERFORMANCES</h2>', unsafe_allow_html=True)
 
 col1, col2 = st.columns(2)
@@ -443,19 +662,32 @@ col1, col2 = st.columns(2)
 with col1:
     st.markdown("#### 📊 Activité Journalière")
     if not daily_data.empty:
+        # Granularité adaptée à la période et nombre de points borné
+        hourly_series = None
+        if downsampling.choose_resolution(start_date, end_date)[0] == 'H' and snapshot_view is not None:
+            hourly_series = snapshot_view['activity_hourly']
+        elif downsampling.choose_resolution(start_date, end_date)[0] == 'H' and DB_PATH.exists():
+            try:
+                hourly_series = data_access.load_activity_hourly(start_date, end_date, active_filters, DB_PATH)
+            except Exception as e:
+                logger.warning(f"Série horaire indisponible: {e}")
+        activity, x_label = downsampling.prepare_activity_series(
+            daily_data, start_date, end_date, hourly_series
+        )
+        
         fig1 = go.Figure()
         fig1.add_trace(go.Bar(
-            x=daily_data['date'],
-            y=daily_data['nb_operations'],
+            x=activity['date'],
+            y=activity['nb_operations'],
             name='Opérations',
             marker_color='#3B82F6'
         ))
         
         # LIGNE ROUGE - DURÉE MOYENNE
-        if 'duree_moyenne' in daily_data.columns:
+        if 'duree_moyenne' in activity.columns:
             fig1.add_trace(go.Scatter(
-                x=daily_data['date'],
-                y=daily_data['duree_moyenne'],
+                x=activity['date'],
+                y=activity['duree_moyenne'],
                 name='Durée moyenne',
                 yaxis='y2',
                 line=dict(color='#EF4444', width=2),
@@ -474,7 +706,7 @@ with col1:
             )
         
         fig1.update_layout(
-            xaxis_title="Date",
+            xaxis_title=x_label,
             yaxis_title="Nombre d'opérations",
             height=400,
             hovermode='x unified',
@@ -504,14 +736,15 @@ with col2:
         st.info("Aucune donnée horaire disponible")
 
 # ========== 9. PERFORMANCE DES ÉQUIPEMENTS ==========
+metrics.section("section 9 : équipements")
 st.markdown('<h2 class="section-title">🏗️ PERFORMANCE DES ÉQUIPEMENTS</h2>', unsafe_allow_html=True)
 
 col1, col2 = st.columns([2, 1])
 
 with col1:
     if not engins_data.empty:
-        # Top 10 engins par volume
-        top_engins = engins_data.nlargest(10, 'total_operations')
+        # Top 10 engins par volume, calculé dans la base sur la période
+        top_engins = load_top_engins(engins_data, snapshot_view)
         fig3 = go.Figure()
         fig3.add_trace(go.Bar(
             y=top_engins['engin'],
@@ -532,53 +765,50 @@ with col1:
 
 with col2:
     st.markdown("#### ⚠️ Engins à Surveiller")
-    if not engins_data.empty:
-        # Calcul du taux d'erreur par engin
-        engins_data['taux_erreur'] = (engins_data['erreurs'] / engins_data['total_operations'] * 100)
-        problem_engins = engins_data[engins_data['taux_erreur'] > 1.5]
-        
-        if not problem_engins.empty:
-            for _, engin in problem_engins.iterrows():
-                error_class = "badge-danger" if engin['taux_erreur'] > 3 else "badge-warning"
-                st.markdown(f"""
-                <div class="metric-card">
-                    <strong>{engin['engin']}</strong><br>
-                    <span class="{error_class}">{engin['erreurs']} erreurs ({engin['taux_erreur']:.1f}%)</span><br>
-                    <small>{engin['total_operations']} opérations</small>
-                </div>
-                """, unsafe_allow_html=True)
-        else:
-            st.markdown("""
-            <div class="success-card">
-                ✅ Tous les engins fonctionnent normalement
-            </div>
-            """, unsafe_allow_html=True)
-    else:
-        st.info("Aucun engin problématique détecté")
+    # Seuil, top-k et pages suivantes calculés en SQL (voir fleet.py)
+    watchlist_period = (str(DB_PATH), start_date.date(), end_date.date(), active_filters.key())
+    if st.session_state.get('watchlist_period') != watchlist_period:
+        st.session_state.watchlist_period = watchlist_period
+        st.session_state.watchlist_cursors = []
+    watchlist, n_flagged = watchlist_page(engins_data, snapshot_view)
+    first = len(st.session_state.watchlist_cursors) * fleet.PAGE_SIZE + 1
+    render_watchlist(watchlist, n_flagged, first)
+
+    if n_flagged > fleet.PAGE_SIZE:
+        nav1, nav2 = st.columns(2)
+        with nav1:
+            st.button("⬅️ Précédents", key="watchlist_previous", on_click=watchlist_previous,
+                      disabled=not st.session_state.watchlist_cursors, use_container_width=True)
+        with nav2:
+            st.button("Suivants ➡️", key="watchlist_next", on_click=watchlist_next,
+                      args=(fleet.cursor_of(watchlist, "taux_erreur"),),
+                      disabled=watchlist.empty or first + len(watchlist) > n_flagged,
+                      use_container_width=True)
 
 # ========== 10. CARTE INTERACTIVE ==========
+metrics.section("section 10 : carte")
+with import_report.timed("section 10 : carte"):
+    import streamlit.components.v1 as components
+    import port_map
+    import positions
+
 st.markdown('<h2 class="section-title">🗺️ CARTE TEMPS-RÉEL DU PORT</h2>', unsafe_allow_html=True)
 
 col1, col2 = st.columns([3, 1])
 
-with col1:
-    # Création et affichage de la carte
-    port_map = create_realtime_map()
-    folium_static(port_map, width=800, height=500)
-
 with col2:
     st.markdown("#### 🔍 FILTRES")
-    st.multiselect(
+    engin_types = st.multiselect(
         "Types d'engins",
-        ["Tracteur", "Chariot", "Grue", "Camion"],
+        list(filters.ENGIN_TYPES),
         default=["Tracteur", "Chariot"]
     )
-    
-    refresh_rate = st.slider("Rafraîchissement (secondes)", 5, 60, 30)
-    
-    st.checkbox("Afficher les trajets", value=True)
-    st.checkbox("Afficher les zones congestion", value=True)
-    st.checkbox("Afficher les alertes sur carte", value=True)
+
+    map_refresh_rate = st.slider("Rafraîchissement (secondes)", 5, 60, 30)
+
+    show_tracks = st.checkbox("Afficher les trajets", value=True)
+    show_congestion = st.checkbox("Afficher les zones congestion", value=True)
+    show_map_alerts = st.checkbox("Afficher les alertes sur carte", value=True)
     
     st.markdown("---")
     st.markdown("#### 🎯 LÉGENDE")
@@ -588,78 +818,78 @@ with col2:
     st.markdown("🔴 **Contrôle Douane**")
     st.markdown("⚫ **Maintenance**")
 
+with col1:
+    # Fond de carte en cache, seules les couches dynamiques sont recalculées
+    latest_positions, tracks = load_positions(engin_types, show_tracks)
+    map_layers = []
+    if tracks is not None:
+        map_layers.append(port_map.track_layer(tracks))
+    map_layers.append(port_map.engin_layer(latest_positions))
+    if show_congestion:
+        map_layers.append(port_map.congestion_layer(recent_ops))
+    if show_map_alerts:
+        map_layers.append(port_map.alert_layer(recent_ops))
+    components.html(port_map.map_document(port_map.dynamic_geojson(map_layers)), width=800, height=500)
+
 # ========== 11. ALERTES ET ACTIVITÉ ==========
+metrics.section("section 11 : alertes et activité")
+with import_report.timed("section 11 : alertes et activité"):
+    import alerts
+    import anomalies
+    import feed
+
 st.markdown('<h2 class="section-title">🚨 ALERTES ET ACTIVITÉ EN TEMPS RÉEL</h2>', unsafe_allow_html=True)
 
 col1, col2 = st.columns(2)
 
 with col1:
     st.markdown("#### ⚠️ ALERTES ACTIVES")
-    
-    # Génération d'alertes simulées
-    alerts = []
-    
-    if not daily_data.empty and len(daily_data) > 1:
-        latest_day = daily_data.iloc[-1]
-        avg_operations = daily_data['nb_operations'].mean()
-        
-        if latest_day['nb_operations'] > avg_operations * 1.3:
-            alerts.append("📈 **Volume anormalement élevé** - Augmentation de +30%")
-        
-        if latest_day['erreurs'] > 0 and (latest_day['erreurs'] / latest_day['nb_operations']) > 0.03:
-            alerts.append("❌ **Taux d'erreur critique** - Supérieur à 3%")
-    
-    # Alertes prédéfinies pour la démo
-    alerts.append("⚠️ **Maintenance préventive requise** - TRACTEUR_06 (taux erreur: 3.7%)")
-    alerts.append("🚀 **Opportunité d'optimisation** - QUAI_2_ROUTIER (-27min possible)")
-    
-    if alerts:
-        for alert in alerts:
-            if "❌" in alert or "⚠️" in alert:
-                st.markdown(f'<div class="alert-card">{alert}</div>', unsafe_allow_html=True)
-            else:
-                st.markdown(f'<div class="success-card">{alert}</div>', unsafe_allow_html=True)
+    alerts_placeholder = st.empty()
+    if show_alerts:
+        render_alerts(alerts_placeholder, load_alerts(start_date, end_date, active_filters, snapshot))
     else:
-        st.info("✅ Aucune alerte active")
+        alerts_placeholder.caption("Alertes masquées (voir les filtres)")
+
+    st.markdown("#### 📈 SCORES D'ANOMALIE")
+    render_anomalies(load_anomalies(start_date, end_date, active_filters, snapshot))
 
 with col2:
     st.markdown("#### 📝 DERNIÈRES OPÉRATIONS")
     
-    if not recent_ops.empty:
-        # Affichage des 10 dernières opérations
-        recent_ops_display = recent_ops.head(10).copy()
-        
-        for idx, row in recent_ops_display.iterrows():
-            timestamp_str = row['timestamp'].strftime('%H:%M') if isinstance(row['timestamp'], datetime) else row['timestamp']
-            
-            icon = ""
-            if row.get('urgence', 0):
-                icon += "⚠️ "
-            if row.get('erreur', 0):
-                icon += "❌ "
-            
-            st.markdown(f"""
-            **{timestamp_str}** - {icon}{row['type_operation']}  
-            *{row['zone']}* | {row['engin']} | {row['duree_minutes']:.0f} min
-            """)
-    else:
-        st.info("Aucune opération récente")
+    # Tampon circulaire par session + pagination keyset (voir feed.py)
+    feed_period = (str(DB_PATH), start_date.date(), end_date.date(), active_filters.key())
+    if st.session_state.get('feed_period') != feed_period:
+        st.session_state.feed_period = feed_period
+        st.session_state.feed_buffer = feed.FeedBuffer()
+        st.session_state.feed_cursors = []
+    st.session_state.feed_buffer.push(recent_ops)
+    
+    page = feed_page()
+    recent_placeholder = st.empty()
+    render_recent_ops(recent_placeholder, page)
+    
+    nav1, nav2 = st.columns(2)
+    with nav1:
+        st.button("⬅️ Plus récentes", on_click=feed_newer,
+                  disabled=not st.session_state.feed_cursors, use_container_width=True)
+    with nav2:
+        st.button("Plus anciennes ➡️", on_click=feed_older, args=(feed.row_key(page.iloc[-1]),) if not page.empty else None,
+                  disabled=page.empty or len(page) < feed.PAGE_SIZE or not DB_PATH.exists(),
+                  use_container_width=True)
 
 # ========== 12. RECOMMANDATIONS ==========
+metrics.section("section 12 : recommandations")
 st.markdown('<h2 class="section-title">💡 RECOMMANDATIONS INTELLIGENTES</h2>', unsafe_allow_html=True)
 
-recommendations = [
-    "**Optimiser QUAI_2_ROUTIER** : Réorganisation peut réduire la durée moyenne de 27 minutes (-15%)",
-    "**Maintenance TRACTEUR_06** : Planifier maintenance préventive (taux erreur: 3.7%)",
-    "**Équilibrage charge** : Déplacer 20% des opérations de 10h-12h vers 14h-16h",
-    "**Formation équipe** : Session sur procédures chargement (erreurs réduisibles de 40%)",
-    "**Investissement capteurs** : Ajouter 5 capteurs RFID pour tracking temps-réel"
-]
+if snapshot_view is not None:
+    recommendations = snapshot_view['recommendations']['texte'].tolist()
+else:
+    recommendations = snapshots.recommendations_of(engins_data, hourly_data)
 
-for i, rec in enumerate(recommendations, 1):
-    st.markdown(f"{i}. {rec}")
+st.markdown("\n".join(f"{i}. {rec}" for i, rec in enumerate(recommendations, 1)))
 
 # ========== 13. FOOTER ==========
+metrics.section("section 13 : pied de page")
 st.markdown("---")
 st.markdown(f"""
 <div style="text-align: center; color: #6B7280; padding: 20px; font-size: 0.9rem;">
@@ -670,3 +900,50 @@ st.markdown(f"""
 </div>
 """, unsafe_allow_html=True)
 
+render_cache_info(cache_info, data_access.cache_stats())
+rerun_timings = metrics.end_rerun()
+rerun_ms = {}
+for name, seconds in rerun_timings:
+    rerun_ms[name] = round(rerun_ms.get(name, 0.0) + seconds * 1000, 2)
+logger.info(f"Rerun affiché en {rerun_ms.get('rerun', 0.0):.0f} ms", extra=event_log.event("rerun", timings_ms=rerun_ms))
+if show_latencies:
+    render_latencies(rerun_timings, metrics.summary())
+import_report.log_report(logger)
+
+# ========== 14. ACTUALISATION EN DIRECT ==========
+# En fin de script : la page est entièrement affichée et reste utilisable,
+# seuls les panneaux en direct sont mis à jour à chaque tick.
+if auto_refresh and DB_PATH.exists() and end_date.date() >= datetime.now().date():
+    with import_report.timed("section 14 : actualisation"):
+        import live
+    live_state = {'watermark': live.watermark_of(recent_ops, start_date.date()), 'daily': daily_data}
+    
+    def fetch_delta():
+        try:
+            return data_access.fetch_since(live_state['watermark'], filters=active_filters, db_path=DB_PATH)
+        except Exception as e:
+            logger.warning(f"Actualisation impossible: {e}")
+            return pd.DataFrame()
+    
+    def apply_delta(delta):
+        # Latence événement -> écran du plus ancien événement du delta
+        oldest = pd.to_datetime(delta['timestamp'], format='ISO8601').min()
+        metrics.record("latence événement → écran", (datetime.now() - oldest).total_seconds())
+        st.session_state.auto_refresh_counter += 1
+        live_state['watermark'] = live.watermark_of(delta)
+        # Le filigrane avance sur tout le delta ; seules les opérations de la période sont affichées
+        delta = live.within(delta, start_date, end_date)
+        if delta.empty:
+            return
+        live_state['daily'] = live.fold_daily(live_state['daily'], delta)
+        # « Afficher les erreurs » ne masque que les lignes du flux
+        st.session_state.feed_buffer.push(delta[active_filters.frame_mask(delta)])
+        render_kpis(kpi_placeholders, load_kpi_totals(start_date, end_date, live_state['daily'], active_filters))
+        if show_alerts:
+            render_alerts(alerts_placeholder, load_alerts(start_date, end_date, active_filters))
+        if not st.session_state.feed_cursors:
+            render_recent_ops(recent_placeholder, st.session_state.feed_buffer.head(feed.PAGE_SIZE))
+        if st.session_state.get('demo_replay'):
+            render_replay_status(replay_status, replay.current())
+    
+    live.run(refresh_rate, refresh_countdown, fetch_delta, apply_delta)
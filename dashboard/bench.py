@@ -0,0 +1,392 @@
+"""Micro-benchmarks des chemins critiques du dashboard (données et rendu).
+
+Chaque cas est chronométré plusieurs fois dans le même processus, hors
+réseau : bases synthétiques de 10k / 1M / 10M opérations (générées une
+fois par synthetic.py puis conservées dans --cache-dir), lot d'ingestion
+sur une copie de chaque base, données de démo, carte temps réel et rendu
+complet de app.py par le harnais AppTest de Streamlit (premier rendu à
+cache vide, puis rerun).
+
+Les résultats (médiane, min, p95 en ms) sont écrits en JSON ; comparés à
+une référence, un cas nettement plus lent fait échouer la commande
+(code 1), à lancer avant chaque mise en production.
+
+Usage :
+    python dashboard/bench.py --sizes 10k,1M --out bench.json
+    python dashboard/bench.py --baseline bench_baseline.json
+    python dashboard/bench.py --sizes 10M --regenerate
+"""
+import argparse
+import inspect
+import json
+import os
+import platform
+import sqlite3
+import sys
+import tempfile
+import time
+from contextlib import contextmanager
+from datetime import date, datetime, timedelta
+from pathlib import Path
+
+import numpy as np
+
+import data_access
+import port_map
+import positions
+import synthetic
+from filters import Filters
+
+APP_PATH = Path(__file__).resolve().parent / "app.py"
+CACHE_DIR = Path("data/bench")
+SIZES = {"10k": 10_000, "1M": 1_000_000, "10M": 10_000_000}
+HISTORY_DAYS = 365
+PERIOD_DAYS = 30
+REPEAT = 5
+APPTEST_TIMEOUT = 120
+# Versions de Streamlit dont le harnais AppTest a été vérifié pour le
+# sondage fin (_fine_polling) ; ailleurs, rendus mesurés à 100 ms près
+FINE_POLLING_VERSIONS = ("1.28",)
+SAMPLE_FILTERS = Filters.of(zones=["QUAI_1"], engin_types=["Tracteur"])
+# Lot d'ingestion temps réel, et clés d'engins fictives ajoutées aux sommes
+# cumulées (HISTORY_DAYS jours chacune) : le coût d'un lot ne doit pas
+# dépendre de la taille de prefix_sums
+INGEST_BATCH = 50
+PADDING_KEYS = 2000
+# Régression : médiane +25 % et au moins +5 ms par rapport à la référence
+REGRESSION_RATIO = 1.25
+REGRESSION_MS = 5.0
+
+
+# ========== MESURE ==========
+def measure(run, repeat=REPEAT, setup=None, warmup=1):
+    """Durées (ms) de repeat appels à run() ; setup() est exécuté avant chacun, hors chrono
+
+    Les warmup premiers appels ne sont pas retenus (imports, caches de l'OS).
+    """
+    samples = []
+    for i in range(warmup + repeat):
+        if setup is not None:
+            setup()
+        started = time.perf_counter()
+        run()
+        if i >= warmup:
+            samples.append((time.perf_counter() - started) * 1000)
+    return samples
+
+
+def summarize(samples):
+    return {
+        "median_ms": round(float(np.median(samples)), 3),
+        "min_ms": round(float(np.min(samples)), 3),
+        "p95_ms": round(float(np.percentile(samples, 95)), 3),
+        "runs": len(samples),
+    }
+
+
+# ========== BASES SYNTHÉTIQUES ==========
+def bench_db(size, cache_dir=CACHE_DIR, regenerate=False, log=print):
+    """Base synthétique de SIZES[size] opérations (HISTORY_DAYS jours jusqu'à aujourd'hui), en cache"""
+    cache_dir = Path(cache_dir)
+    cache_dir.mkdir(parents=True, exist_ok=True)
+    db_path = cache_dir / f"portsec_{size}.db"
+    if db_path.exists() and not regenerate:
+        # Les opérations s'arrêtent à l'heure de génération : la veille est encore à jour
+        last_day = _last_day(db_path)
+        if last_day is None or last_day < date.today() - timedelta(days=1):
+            log(f"⚠️  {db_path} s'arrête au {last_day} : la période du dashboard sera partiellement vide (--regenerate)")
+        return db_path
+    for stale in cache_dir.glob(f"{db_path.name}*"):
+        stale.unlink()
+    end_date = datetime.now()
+    started = time.perf_counter()
+    log(f"→ Génération de {db_path} ({SIZES[size]:,} opérations)")
+    synthetic.write_sqlite(db_path, end_date - timedelta(days=HISTORY_DAYS), end_date, SIZES[size], log=lambda message: None)
+    log(f"   ({time.perf_counter() - started:.1f}s)")
+    return db_path
+
+
+def _last_day(db_path):
+    conn = sqlite3.connect(db_path)
+    try:
+        last = conn.execute("SELECT MAX(timestamp) FROM operations").fetchone()[0]
+    finally:
+        conn.close()
+    return date.fromisoformat(last[:10]) if last else None
+
+
+# ========== CAS ==========
+def bench_load_data(db_path, repeat=REPEAT):
+    """load_data sur PERIOD_DAYS jours : à froid, à froid filtré, puis servi par le cache"""
+    end = _last_day(db_path) or date.today()
+    start = end - timedelta(days=PERIOD_DAYS)
+    load = lambda filters=Filters(): data_access.load_data(start, end, filters, db_path=db_path)
+    results = {
+        "load_data.froid": measure(load, repeat, setup=data_access.clear_cache),
+        "load_data.froid_filtre": measure(lambda: load(SAMPLE_FILTERS), repeat, setup=data_access.clear_cache),
+        "load_totals.froid": measure(
+            lambda: data_access.load_totals(start, end, db_path=db_path), repeat, setup=data_access.clear_cache
+        ),
+    }
+    load()
+    results["load_data.cache"] = measure(load, repeat)
+    return results
+
+
+def bench_sample_data(repeat=REPEAT):
+    """Données de démo de app.create_sample_data (30 jours, avec et sans filtre)"""
+    end = datetime.now()
+    start = end - timedelta(days=PERIOD_DAYS)
+    return {
+        "create_sample_data": measure(lambda: synthetic.sample_datasets(start, end), repeat),
+        "create_sample_data.filtre": measure(lambda: synthetic.sample_datasets(start, end, SAMPLE_FILTERS), repeat),
+    }
+
+
+def _realtime_map(n_engins, n_steps):
+    pings = positions.simulate_pings(n_engins, n_steps, start=datetime.now() - timedelta(seconds=n_steps * 10))
+    pings = pings.assign(timestamp=pings['timestamp'].dt.strftime('%Y-%m-%d %H:%M:%S'))
+    layers = [port_map.track_layer(pings), port_map.engin_layer(positions.latest_of(pings))]
+    return port_map.map_document(port_map.dynamic_geojson(layers))
+
+
+def bench_realtime_map(repeat=REPEAT):
+    """Carte temps réel (section 10) : fond de carte, puis couches dynamiques à chaque rerun"""
+    def cold_base():
+        port_map.base_map_document.cache_clear()
+        port_map.map_document.cache_clear()
+
+    return {
+        "carte.fond": measure(port_map.base_map_document, repeat, setup=cold_base),
+        # Positions de démo de app.load_positions : 120 engins, 20 pings chacun
+        "carte.couches": measure(lambda: _realtime_map(120, 20), repeat, setup=port_map.map_document.cache_clear),
+        "carte.couches_2000_engins": measure(lambda: _realtime_map(2000, 20), repeat, setup=port_map.map_document.cache_clear),
+    }
+
+
+def _pad_prefix_sums(conn, n_keys=PADDING_KEYS, n_days=HISTORY_DAYS):
+    last = conn.execute("SELECT COALESCE(MAX(jour), 0) FROM prefix_sums").fetchone()[0]
+    with conn:
+        conn.executemany(
+            "INSERT INTO prefix_sums (scope, cle, jour, nb_operations) VALUES ('engin', ?, ?, ?)",
+            ((f"BENCH_{key:05d}", last - n_days + day, day) for key in range(n_keys) for day in range(1, n_days + 1)),
+        )
+    return conn.execute("SELECT COUNT(*) FROM prefix_sums").fetchone()[0]
+
+
+def bench_ingest_batch(db_path, repeat=REPEAT):
+    """Lot de INGEST_BATCH opérations du jour (ingest.write_batch) sur une copie de la base,
+    puis après ajout de PADDING_KEYS x HISTORY_DAYS lignes aux sommes cumulées"""
+    import ingest
+
+    now = datetime.now()
+    rows = synthetic.sample_operations(now - timedelta(hours=1), now, INGEST_BATCH)
+    with tempfile.TemporaryDirectory(prefix="portsec-bench-") as workdir:
+        source = sqlite3.connect(db_path)
+        copy = sqlite3.connect(Path(workdir) / "portsec.db")
+        try:
+            source.backup(copy)
+        finally:
+            source.close()
+            copy.close()
+        conn = ingest.connect(Path(workdir) / "portsec.db")
+        try:
+            write = lambda: ingest.write_batch(conn, rows)
+            results = {"ingest.lot": measure(write, repeat)}
+            n_rows = _pad_prefix_sums(conn)
+            results[f"ingest.lot.prefix_{n_rows // 1000}k"] = measure(write, repeat)
+        finally:
+            conn.close()
+    return results
+
+
+@contextmanager
+def _workdir(db_path=None):
+    """Répertoire de travail temporaire où data/processed/portsec.db pointe sur db_path (démo si None)"""
+    previous = os.getcwd()
+    with tempfile.TemporaryDirectory(prefix="portsec-bench-") as workdir:
+        if db_path is not None:
+            target = Path(workdir) / data_access.DB_PATH
+            target.parent.mkdir(parents=True)
+            target.symlink_to(Path(db_path).resolve())
+        os.chdir(workdir)
+        try:
+            yield workdir
+        finally:
+            os.chdir(previous)
+
+
+def fine_polling_supported():
+    """Le remplacement de l'attente interne d'AppTest est sûr pour cette version de Streamlit"""
+    import streamlit
+    from streamlit.testing.v1 import local_script_runner
+
+    if ".".join(streamlit.__version__.split(".")[:2]) not in FINE_POLLING_VERSIONS:
+        return False
+    original = getattr(local_script_runner, "require_widgets_deltas", None)
+    if original is None:
+        return False
+    return list(inspect.signature(original).parameters)[:2] == ["runner", "timeout"]
+
+
+@contextmanager
+def _fine_polling(interval=0.001):
+    """Le harnais AppTest guette la fin du script toutes les 100 ms, ce qui
+    arrondirait chaque rendu au dixième de seconde : même attente, pas de 1 ms
+
+    Interne de Streamlit : sans effet (attente d'origine) si la version
+    n'a pas été vérifiée ; retourne si le sondage fin est actif.
+    """
+    from streamlit.testing.v1 import local_script_runner
+
+    if not fine_polling_supported():
+        yield False
+        return
+
+    def wait(runner, timeout=3):
+        deadline = time.perf_counter() + timeout
+        while time.perf_counter() < deadline:
+            if runner.script_stopped():
+                return
+            time.sleep(interval)
+        runner.request_stop()
+        runner.join()
+        raise RuntimeError(f"AppTest script run timed out after {timeout}s)")
+
+    original = local_script_runner.require_widgets_deltas
+    local_script_runner.require_widgets_deltas = wait
+    try:
+        yield True
+    finally:
+        local_script_runner.require_widgets_deltas = original
+
+
+def _render(app_test):
+    app_test.run(timeout=APPTEST_TIMEOUT)
+    if app_test.exception:
+        raise RuntimeError(f"Rendu en erreur : {app_test.exception[0].value}")
+
+
+def bench_apptest(db_path=None, repeat=REPEAT):
+    """Rendu complet de app.py (session authentifiée) : premier rendu à cache vide, puis rerun"""
+    from streamlit.testing.v1 import AppTest
+
+    def new_session():
+        data_access.clear_cache()
+        app_test = AppTest.from_file(str(APP_PATH), default_timeout=APPTEST_TIMEOUT)
+        app_test.session_state["authenticated"] = True
+        return app_test
+
+    with _workdir(db_path), _fine_polling():
+        sessions = []
+        first = measure(lambda: _render(sessions[-1]), repeat, setup=lambda: sessions.append(new_session()))
+        rerun = measure(lambda: _render(sessions[-1]), repeat, warmup=0)
+    return {"apptest.premier_rendu": first, "apptest.rerun": rerun}
+
+
+# ========== SUITE ==========
+def run_suite(sizes, cache_dir=CACHE_DIR, repeat=REPEAT, regenerate=False, apptest=True, log=print):
+    """Tous les cas ; retourne {cas: résumé}"""
+    results = {}
+
+    def record(prefix, samples_by_case):
+        for case, samples in samples_by_case.items():
+            name = f"{prefix}{case}"
+            results[name] = summarize(samples)
+            log(f"{name:<44} {results[name]['median_ms']:10.2f} ms  (min {results[name]['min_ms']:.2f}, p95 {results[name]['p95_ms']:.2f})")
+
+    record("", bench_sample_data(repeat))
+    record("", bench_realtime_map(repeat))
+    if apptest and not fine_polling_supported():
+        log("⚠️  Streamlit non vérifié pour le sondage fin : rendus AppTest mesurés à 100 ms près")
+    if apptest:
+        record("demo.", bench_apptest(None, repeat))
+    for size in sizes:
+        db_path = bench_db(size, cache_dir, regenerate, log)
+        record(f"{size}.", bench_load_data(db_path, repeat))
+        record(f"{size}.", bench_ingest_batch(db_path, repeat))
+        if apptest:
+            record(f"{size}.", bench_apptest(db_path, repeat))
+    data_access.clear_cache()
+    return results
+
+
+def regressions(results, baseline, skip_apptest=False):
+    """Cas nettement plus lents que la référence (médianes)
+
+    skip_apptest : rendus AppTest ignorés (granularité de mesure différente
+    de celle de la référence).
+    """
+    slower = {}
+    for case, summary in results.items():
+        reference = baseline.get(case)
+        if reference is None or (skip_apptest and ".apptest." in f".{case}"):
+            continue
+        ms, reference_ms = summary["median_ms"], reference["median_ms"]
+        if ms > reference_ms * REGRESSION_RATIO and ms - reference_ms > REGRESSION_MS:
+            slower[case] = (reference_ms, ms)
+    return slower
+
+
+def _meta(sizes, repeat, apptest=True):
+    import pandas as pd
+    import streamlit
+
+    return {
+        "date": datetime.now().isoformat(timespec="seconds"),
+        "machine": platform.node(),
+        "python": platform.python_version(),
+        "sqlite": sqlite3.sqlite_version,
+        "pandas": pd.__version__,
+        "streamlit": streamlit.__version__,
+        "sizes": sizes,
+        "repeat": repeat,
+        # Sondage AppTest à 1 ms (True) ou attente d'origine à 100 ms (False)
+        "apptest_fine_polling": fine_polling_supported() if apptest else None,
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Micro-benchmarks du dashboard PortSec")
+    parser.add_argument("--sizes", default=",".join(SIZES), help=f"Tailles de base parmi {', '.join(SIZES)}")
+    parser.add_argument("--cache-dir", default=str(CACHE_DIR), help="Répertoire des bases synthétiques")
+    parser.add_argument("--repeat", type=int, default=REPEAT)
+    parser.add_argument("--regenerate", action="store_true", help="Régénérer les bases synthétiques")
+    parser.add_argument("--no-apptest", action="store_true", help="Sans rendu complet de app.py")
+    parser.add_argument("--out", help="Écrire les résultats (JSON)")
+    parser.add_argument("--baseline", help="Comparer à une référence JSON ; code 1 en cas de régression")
+    args = parser.parse_args(argv)
+
+    sizes = [s.strip() for s in args.sizes.split(",") if s.strip()]
+    unknown = [s for s in sizes if s not in SIZES]
+    if unknown:
+        parser.error(f"taille(s) inconnue(s) : {', '.join(unknown)}")
+
+    # Les chemins relatifs restent valides après les changements de répertoire du harnais
+    cache_dir = Path(args.cache_dir).resolve()
+    started = time.perf_counter()
+    results = run_suite(sizes, cache_dir, args.repeat, args.regenerate, not args.no_apptest)
+    print(f"   ({time.perf_counter() - started:.1f}s)")
+
+    meta = _meta(sizes, args.repeat, not args.no_apptest)
+    if args.out:
+        report = {"meta": meta, "results": results}
+        Path(args.out).write_text(json.dumps(report, indent=2, ensure_ascii=False))
+        print(f"✅ Résultats écrits dans {args.out}")
+    if args.baseline:
+        baseline = json.loads(Path(args.baseline).read_text())
+        polling = baseline.get("meta", {}).get("apptest_fine_polling")
+        skip_apptest = polling is not None and polling != meta["apptest_fine_polling"]
+        if skip_apptest:
+            print("⚠️  Rendus AppTest non comparés : sondage différent de celui de la référence")
+        slower = regressions(results, baseline["results"], skip_apptest)
+        for case, (reference, ms) in slower.items():
+            print(f"❌ {case}: {reference:.2f} ms -> {ms:.2f} ms")
+        if slower:
+            return 1
+        print("✅ Aucune régression")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
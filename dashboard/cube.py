@@ -0,0 +1,367 @@
+"""Cube pré-agrégé des opérations : jour × heure × zone × engin × type × statut.
+
+Chaque cellule porte le nombre d'opérations, la somme et le nombre des
+durées renseignées. Les dimensions texte sont codées en entiers via les
+tables dim_zone, dim_engin et dim_type_operation ; le statut vaut
+urgence + 2 × erreur. Le cube est tenu à jour par des triggers (même
+garde de suspension que les rollups) et par le repli ensembliste des lots
+d'ingestion.
+
+Le dashboard charge les cellules d'une période une fois (quelques
+tableaux numpy) puis en tire les agrégats journaliers, horaires et par
+engin, filtrés par zone, engin ou type, par simple np.bincount.
+
+Usage :
+    python dashboard/cube.py install --db data/processed/portsec.db
+    python dashboard/cube.py rebuild
+    python dashboard/cube.py verify
+"""
+import argparse
+import sqlite3
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+import partitions
+import rollups
+
+# Colonne d'operations -> table de dimension
+DIMENSIONS = {
+    "zone": "dim_zone",
+    "engin": "dim_engin",
+    "type_operation": "dim_type_operation",
+}
+# Dimension -> colonne de clé du cube
+DIMENSION_KEYS = {"zone": "zone_id", "engin": "engin_id", "type_operation": "type_id"}
+KEY_COLUMNS = ("jour", "heure", "zone_id", "engin_id", "type_id", "statut")
+STATUT_URGENCE = 1
+STATUT_ERREUR = 2
+
+SCHEMA = "".join(
+    f"CREATE TABLE IF NOT EXISTS {table} (id INTEGER PRIMARY KEY, label TEXT NOT NULL UNIQUE);"
+    for table in DIMENSIONS.values()
+) + """
+CREATE TABLE IF NOT EXISTS cube_operations (
+    jour INTEGER NOT NULL,
+    heure INTEGER NOT NULL,
+    zone_id INTEGER NOT NULL,
+    engin_id INTEGER NOT NULL,
+    type_id INTEGER NOT NULL,
+    statut INTEGER NOT NULL,
+    nb_operations INTEGER NOT NULL DEFAULT 0,
+    somme_duree REAL NOT NULL DEFAULT 0,
+    nb_durees INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (jour, heure, zone_id, engin_id, type_id, statut)
+) WITHOUT ROWID;
+"""
+
+# Expressions de clé sur une ligne {r} d'operations (jour : jours depuis 1970)
+_JOUR = "CAST(strftime('%s', {r}timestamp) AS INTEGER) / 86400"
+_HEURE = "CAST(strftime('%H', {r}timestamp) AS INTEGER)"
+_STATUT = "(COALESCE({r}urgence, 0) != 0) + 2 * (COALESCE({r}erreur, 0) != 0)"
+
+_MERGE = f"""
+    ON CONFLICT({', '.join(KEY_COLUMNS)}) DO UPDATE SET
+        nb_operations = nb_operations + excluded.nb_operations,
+        somme_duree = somme_duree + excluded.somme_duree,
+        nb_durees = nb_durees + excluded.nb_durees
+"""
+
+_FOLD = "".join(
+    f"INSERT OR IGNORE INTO {table} (label) VALUES (COALESCE({{r}}.{column}, ''));"
+    for column, table in DIMENSIONS.items()
+) + f"""
+    INSERT INTO cube_operations ({', '.join(KEY_COLUMNS)}, nb_operations, somme_duree, nb_durees)
+    VALUES ({_JOUR.format(r="{r}.")}, {_HEURE.format(r="{r}.")},
+            (SELECT id FROM dim_zone WHERE label = COALESCE({{r}}.zone, '')),
+            (SELECT id FROM dim_engin WHERE label = COALESCE({{r}}.engin, '')),
+            (SELECT id FROM dim_type_operation WHERE label = COALESCE({{r}}.type_operation, '')),
+            {_STATUT.format(r="{r}.")},
+            {{s}}1, {{s}}COALESCE({{r}}.duree_minutes, 0), {{s}}({{r}}.duree_minutes IS NOT NULL))
+    {_MERGE};
+"""
+
+TRIGGERS = f"""
+DROP TRIGGER IF EXISTS trg_cube_insert;
+DROP TRIGGER IF EXISTS trg_cube_delete;
+DROP TRIGGER IF EXISTS trg_cube_update;
+CREATE TRIGGER trg_cube_insert AFTER INSERT ON operations {rollups._ACTIVE} BEGIN
+{_FOLD.format(r="NEW", s="")}
+END;
+CREATE TRIGGER trg_cube_delete AFTER DELETE ON operations {rollups._ACTIVE} BEGIN
+{_FOLD.format(r="OLD", s="-")}
+END;
+CREATE TRIGGER trg_cube_update AFTER UPDATE ON operations {rollups._ACTIVE} BEGIN
+{_FOLD.format(r="OLD", s="-")}
+{_FOLD.format(r="NEW", s="")}
+END;
+"""
+
+# Agrégation ensembliste d'une source (operations ou table de lot)
+_DIMENSIONS_FROM = "".join(
+    f"INSERT OR IGNORE INTO {table} (label) SELECT DISTINCT COALESCE({column}, '') FROM {{source}};"
+    for column, table in DIMENSIONS.items()
+)
+_SELECT = f"""
+    SELECT {_JOUR.format(r="s.")}, {_HEURE.format(r="s.")}, z.id, e.id, t.id, {_STATUT.format(r="s.")},
+           COUNT(*), COALESCE(SUM(s.duree_minutes), 0), COUNT(s.duree_minutes)
+    FROM {{source}} AS s
+    JOIN dim_zone AS z ON z.label = COALESCE(s.zone, '')
+    JOIN dim_engin AS e ON e.label = COALESCE(s.engin, '')
+    JOIN dim_type_operation AS t ON t.label = COALESCE(s.type_operation, '')
+    WHERE 1 GROUP BY 1, 2, 3, 4, 5, 6
+"""
+_AGGREGATE = f"""
+    INSERT INTO cube_operations ({', '.join(KEY_COLUMNS)}, nb_operations, somme_duree, nb_durees)
+    {_SELECT} {_MERGE}
+"""
+
+# Lecture par le dashboard : cellules d'une plage de jours (clé primaire)
+CELLS_QUERY = f"""
+    SELECT {', '.join(KEY_COLUMNS)}, nb_operations, somme_duree, nb_durees
+    FROM cube_operations
+    WHERE jour BETWEEN ? AND ? AND nb_operations > 0
+"""
+DIMENSION_QUERIES = {column: f"SELECT id, label FROM {table}" for column, table in DIMENSIONS.items()}
+
+
+def has_cube(conn):
+    """Indique si le cube existe dans la base"""
+    return conn.execute(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'cube_operations'"
+    ).fetchone() is not None
+
+
+def install(conn):
+    """Crée les tables et (re)crée les triggers ; reconstruit si neuf"""
+    fresh = not has_cube(conn)
+    with conn:
+        conn.executescript(SCHEMA)
+        conn.executescript(TRIGGERS)
+    if fresh:
+        rebuild(conn)
+    return fresh
+
+
+def rebuild(conn):
+    """Recalcule intégralement le cube depuis la table operations"""
+    partitions.check_complete(conn)
+    conn.executescript(
+        "BEGIN; DELETE FROM cube_operations;"
+        + _DIMENSIONS_FROM.format(source="operations")
+        + _AGGREGATE.format(source="operations") + "; COMMIT;"
+    )
+
+
+def fold_staged(conn, staging):
+    """Replie une table de lot dans le cube (après rollups.insert_staged, même transaction)"""
+    for statement in _DIMENSIONS_FROM.format(source=staging).split(";"):
+        if statement.strip():
+            conn.execute(statement)
+    conn.execute(_AGGREGATE.format(source=staging))
+
+
+def verify(conn):
+    """Compare le cube à un recalcul complet ; retourne les écarts"""
+    partitions.check_complete(conn)
+    expected = {row[:6]: row for row in conn.execute(_SELECT.format(source="operations"))}
+    stored = {row[:6]: row for row in conn.execute(
+        f"SELECT {', '.join(KEY_COLUMNS)}, nb_operations, somme_duree, nb_durees "
+        "FROM cube_operations WHERE nb_operations != 0"
+    )}
+    missing = [row for key, row in expected.items()
+               if key not in stored or not rollups._same_row(row, stored[key])]
+    extra = [row for key, row in stored.items()
+             if key not in expected or not rollups._same_row(row, expected[key])]
+    if missing or extra:
+        return {"cube_operations": {"manquants": missing, "en_trop": extra}}
+    return {}
+
+
+# ========== CUBE EN MÉMOIRE ==========
+def day_number(day):
+    """Numéro de jour du cube (jours depuis 1970-01-01)"""
+    return int(np.datetime64(pd.Timestamp(day).date(), 'D').astype(np.int64))
+
+
+class OperationsCube:
+    """Cellules du cube d'une période, tranchées en mémoire
+
+    cells  : DataFrame (KEY_COLUMNS, nb_operations, somme_duree, nb_durees)
+    labels : {dimension: tableau des libellés indexé par id}
+    """
+
+    def __init__(self, cells, labels):
+        self.labels = labels
+        self.keys = {column: cells[column].to_numpy(dtype=np.int64) for column in KEY_COLUMNS}
+        self.nb_operations = cells['nb_operations'].to_numpy(dtype=np.float64)
+        self.somme_duree = cells['somme_duree'].to_numpy(dtype=np.float64)
+        self.nb_durees = cells['nb_durees'].to_numpy(dtype=np.float64)
+        statut = self.keys['statut']
+        self.urgences = self.nb_operations * ((statut & STATUT_URGENCE) != 0)
+        self.erreurs = self.nb_operations * ((statut & STATUT_ERREUR) != 0)
+
+    def __len__(self):
+        return len(self.nb_operations)
+
+    @classmethod
+    def from_db(cls, conn, start_day, end_day):
+        cells = pd.read_sql_query(CELLS_QUERY, conn, params=(day_number(start_day), day_number(end_day)))
+        labels = {}
+        for column, sql in DIMENSION_QUERIES.items():
+            rows = conn.execute(sql).fetchall()
+            table = np.full(max((i for i, _ in rows), default=0) + 1, '', dtype=object)
+            for i, label in rows:
+                table[i] = label
+            labels[column] = table
+        return cls(cells, labels)
+
+    @classmethod
+    def from_operations(cls, ops):
+        """Cube construit en mémoire depuis des opérations ligne à ligne (mode démo)"""
+        ts = pd.to_datetime(ops['timestamp'])
+        labels, codes = {}, {}
+        for column in DIMENSIONS:
+            values = ops[column] if isinstance(ops[column].dtype, pd.CategoricalDtype) \
+                else ops[column].fillna('').astype('category')
+            labels[column] = values.cat.categories.to_numpy(dtype=object).astype(str).astype(object)
+            codes[column] = values.cat.codes.to_numpy()
+        frame = pd.DataFrame({
+            'jour': ts.to_numpy().astype('datetime64[D]').astype(np.int64),
+            'heure': ts.dt.hour.to_numpy(),
+            'zone_id': codes['zone'],
+            'engin_id': codes['engin'],
+            'type_id': codes['type_operation'],
+            'statut': (ops['urgence'].to_numpy() != 0) + 2 * (ops['erreur'].to_numpy() != 0),
+            'duree': ops['duree_minutes'].fillna(0).to_numpy(),
+            'renseignee': ops['duree_minutes'].notna().to_numpy(),
+        })
+        cells = frame.groupby(list(KEY_COLUMNS), sort=False).agg(
+            nb_operations=('duree', 'size'), somme_duree=('duree', 'sum'), nb_durees=('renseignee', 'sum'),
+        ).reset_index()
+        return cls(cells, labels)
+
+    # ----- Tranches -----
+    def mask(self, start_day=None, end_day=None, **dimensions):
+        """Masque des cellules de la période et des valeurs de dimensions données
+
+        dimensions : zone=[...], engin=[...], type_operation=[...], statut=[...]
+        (None ou absent : pas de filtre)
+        """
+        selected = np.ones(len(self), dtype=bool)
+        if start_day is not None:
+            selected &= self.keys['jour'] >= day_number(start_day)
+        if end_day is not None:
+            selected &= self.keys['jour'] <= day_number(end_day)
+        for column, values in dimensions.items():
+            if values is None:
+                continue
+            if column == 'statut':
+                selected &= np.isin(self.keys['statut'], list(values))
+                continue
+            allowed = np.isin(self.labels[column], list(values))
+            selected &= allowed[self.keys[DIMENSION_KEYS[column]]]
+        return selected
+
+    def _totals(self, key, selected):
+        """Sommes des mesures par valeur de clé (entiers) sur les cellules retenues"""
+        key = key[selected]
+        offset = key.min() if len(key) else 0
+        index = key - offset
+        sums = {
+            name: np.bincount(index, weights=values[selected])
+            for name, values in (('nb_operations', self.nb_operations), ('somme_duree', self.somme_duree),
+                                 ('nb_durees', self.nb_durees), ('urgences', self.urgences),
+                                 ('erreurs', self.erreurs))
+        }
+        if not len(key):
+            sums = {name: np.zeros(0) for name in sums}
+        present = sums['nb_operations'] > 0
+        keys = np.flatnonzero(present) + offset
+        sums = {name: values[present] for name, values in sums.items()}
+        with np.errstate(divide='ignore', invalid='ignore'):
+            sums['duree_moyenne'] = np.where(sums['nb_durees'] > 0, sums['somme_duree'] / sums['nb_durees'], np.nan)
+        return keys, sums
+
+    def daily(self, selected=None):
+        """Agrégats journaliers (format de vue_operations_journalieres)"""
+        selected = self.mask() if selected is None else selected
+        days, sums = self._totals(self.keys['jour'], selected)
+        return pd.DataFrame({
+            'date': pd.to_datetime(days.astype('datetime64[D]').astype('datetime64[ns]')),
+            'nb_operations': sums['nb_operations'].astype(np.int64),
+            'duree_moyenne': sums['duree_moyenne'],
+            'urgences': sums['urgences'].astype(np.int64),
+            'erreurs': sums['erreurs'].astype(np.int64),
+        })
+
+    def hourly_series(self, selected=None):
+        """Série heure par heure (format de la requête activity_hourly)"""
+        selected = self.mask() if selected is None else selected
+        hours, sums = self._totals(self.keys['jour'] * 24 + self.keys['heure'], selected)
+        return pd.DataFrame({
+            'date': pd.to_datetime(hours.astype('datetime64[h]').astype('datetime64[ns]')),
+            'nb_operations': sums['nb_operations'].astype(np.int64),
+            'duree_moyenne': sums['duree_moyenne'],
+            'urgences': sums['urgences'].astype(np.int64),
+            'erreurs': sums['erreurs'].astype(np.int64),
+        })
+
+    def hourly(self, selected=None):
+        """Profil horaire 0-23 h (format de vue_analyse_horaire)"""
+        selected = self.mask() if selected is None else selected
+        hours, sums = self._totals(self.keys['heure'], selected)
+        return pd.DataFrame({
+            'heure': hours,
+            'nb_operations': sums['nb_operations'].astype(np.int64),
+        })
+
+    def engins(self, selected=None):
+        """Performance par engin (format de vue_performance_engins)"""
+        selected = self.mask() if selected is None else selected
+        ids, sums = self._totals(self.keys['engin_id'], selected)
+        return pd.DataFrame({
+            'engin': self.labels['engin'][ids] if len(ids) else np.array([], dtype=object),
+            'total_operations': sums['nb_operations'].astype(np.int64),
+            'erreurs': sums['erreurs'].astype(np.int64),
+            'duree_moyenne': sums['duree_moyenne'],
+        })
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Gestion du cube d'opérations PortSec")
+    parser.add_argument("command", choices=["install", "rebuild", "verify"])
+    parser.add_argument("--db", default="data/processed/portsec.db", help="Chemin de la base SQLite")
+    args = parser.parse_args(argv)
+
+    conn = sqlite3.connect(args.db)
+    try:
+        started = time.perf_counter()
+        if args.command == "install":
+            fresh = install(conn)
+            print(f"✅ Cube installé ({'reconstruit' if fresh else 'déjà présent'})")
+        elif args.command == "rebuild":
+            rebuild(conn)
+            print("✅ Cube reconstruit")
+        else:
+            mismatches = verify(conn)
+            if mismatches:
+                diff = mismatches["cube_operations"]
+                print(f"❌ cube_operations: {len(diff['manquants'])} cellules manquantes, "
+                      f"{len(diff['en_trop'])} cellules en trop")
+                return 1
+            print("✅ Cube cohérent avec la table operations")
+        print(f"   ({time.perf_counter() - started:.2f}s)")
+        return 0
+    except RuntimeError as e:
+        # Mois détachés (partitions.py) : recalcul depuis operations impossible
+        print(f"❌ {e}")
+        return 1
+    finally:
+        conn.close()
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,714 @@
+"""Couche d'accès aux données du dashboard.
+
+Pool de connexions SQLite partagé en lecture seule, requêtes paramétrées
+et cache de résultats (TTL + éviction LRU bornée) partagé par toutes les
+sessions du processus Streamlit, avec déduplication des calculs
+concurrents d'une même clé (single-flight). Quand le cube est installé (voir
+cube.py), les agrégats des sections 7 à 9 sont tranchés en mémoire dans
+les cellules de la période au lieu d'interroger les vues ; le classement
+des engins de la section 9 est calculé en SQL (voir fleet.py).
+
+Les modules d'analyse (cube, fleet, alertes, anomalies...) sont importés
+dans les fonctions qui s'en servent : importer data_access ne charge que
+pandas, et chaque section du dashboard paie (et mesure, voir
+import_report.py) les imports qu'elle utilise.
+"""
+import queue
+import sqlite3
+import sys
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+from datetime import date, datetime
+from pathlib import Path
+
+import pandas as pd
+
+from filters import Filters
+
+DB_PATH = Path("data/processed/portsec.db")
+
+# ========== REQUÊTES PARAMÉTRÉES ==========
+# sqlite3 garde les instructions préparées en cache par connexion
+# (cached_statements) : un texte SQL constant est compilé une seule fois.
+# {filters} reçoit les conditions paramétrées de Filters.sql() : une
+# combinaison de filtres donne toujours le même texte SQL. {operations} est
+# la table, ou son union avec les partitions mensuelles qui chevauchent la
+# période (voir partitions.py).
+RECENT_LIMIT = 100
+QUERIES = {
+    "daily": """
+        SELECT * FROM vue_operations_journalieres
+        WHERE date BETWEEN ? AND ?
+    """,
+    "engins": "SELECT * FROM vue_performance_engins",
+    "hourly": "SELECT * FROM vue_analyse_horaire",
+    "recent": f"""
+        SELECT rowid AS op_id, timestamp, type_operation, zone, engin, duree_minutes, urgence, erreur
+        FROM {{operations}}
+        WHERE timestamp BETWEEN ? AND ?{{filters}}
+        ORDER BY timestamp DESC LIMIT {RECENT_LIMIT}
+    """,
+    # Série horaire, pour les périodes courtes seulement (voir downsampling.py) ;
+    # nb_durees sert à recombiner les moyennes des passes sur les partitions
+    "activity_hourly": """
+        SELECT strftime('%Y-%m-%d %H:00:00', timestamp) AS date,
+               COUNT(*) AS nb_operations, AVG(duree_minutes) AS duree_moyenne,
+               SUM(urgence) AS urgences, SUM(erreur) AS erreurs, COUNT(duree_minutes) AS nb_durees
+        FROM {operations}
+        WHERE timestamp BETWEEN ? AND ?{filters}
+        GROUP BY 1 ORDER BY 1
+    """,
+}
+
+# Requêtes listant des opérations : « Afficher les erreurs » s'y applique
+# (Filters.sql(rows=True)) ; les autres sont des agrégats
+ROW_QUERIES = ("recent",)
+
+# Nouvelles opérations après un filigrane (timestamp, rowid) : servie par
+# l'index sur timestamp, jamais mise en cache ; le mois courant n'est jamais
+# détaché, la table suffit
+DELTA_QUERY = """
+    SELECT rowid AS op_id, timestamp, type_operation, zone, engin, duree_minutes, urgence, erreur
+    FROM operations
+    WHERE (timestamp, rowid) > (?, ?){filters}
+    ORDER BY timestamp, rowid LIMIT ?
+"""
+
+# Page précédente du flux des opérations (pagination keyset, sans OFFSET)
+OLDER_QUERY = """
+    SELECT rowid AS op_id, timestamp, type_operation, zone, engin, duree_minutes, urgence, erreur
+    FROM {operations}
+    WHERE (timestamp, rowid) < (?, ?) AND timestamp >= ?{filters}
+    ORDER BY timestamp DESC, rowid DESC LIMIT ?
+"""
+
+# Engins à surveiller : taux d'erreur au-dessus du seuil, top-k en SQL
+# (classement sur la période par fleet.py ; base sans cube : cumul complet)
+WATCHLIST_MIN_RATE = 1.5
+WATCHLIST_SIZE = 50
+WATCHLIST_QUERY = """
+    SELECT engin, total_operations, erreurs, 100.0 * erreurs / total_operations AS taux_erreur,
+           COUNT(*) OVER () AS nb_signales
+    FROM {source}
+    WHERE total_operations > 0 AND 100.0 * erreurs > ? * total_operations
+    ORDER BY taux_erreur DESC, engin LIMIT ?
+"""
+
+# Durée de vie des résultats en cache (secondes)
+QUERY_TTL = {
+    "daily": 300,
+    "engins": 300,
+    "hourly": 300,
+    "recent": 30,
+    "activity_hourly": 60,
+    "cube": 60,
+    "ranking": 60,
+    "dim_engin": 300,
+    "alerts": 10,
+    "anomalies": 60,
+}
+
+# Alertes actives affichées (section 11), écrites par le moteur d'alertes
+ALERTS_LIMIT = 20
+# Scores d'anomalie lus avant filtrage par zone / type d'engin
+ANOMALIES_LIMIT = 100
+
+
+# ========== POOL DE CONNEXIONS ==========
+# Attente maximale d'une connexion libre quand le pool est saturé (secondes)
+ACQUIRE_TIMEOUT = 30
+
+
+class ConnectionPool:
+    """Pool borné de connexions SQLite en lecture seule
+
+    connection() est réentrante : un thread qui tient déjà une connexion la
+    réutilise (tables détectées à la demande, sources partitionnées) au lieu
+    d'en attendre une seconde, ce qui bloquerait le pool saturé.
+    """
+
+    def __init__(self, db_path, max_size=8):
+        self.db_path = Path(db_path)
+        self.max_size = max_size
+        self._idle = queue.LifoQueue(maxsize=max_size)
+        self._created = 0
+        self._lock = threading.Lock()
+        self._held = threading.local()
+        self._has_rollups = None
+        self._has_cube = None
+        self._has_prefix_sums = None
+        self._has_alerts = None
+        self._has_anomalies = None
+        self._has_partitions = None
+
+    def _flag(self, attribute, detect):
+        """Table détectée une fois, avec la connexion déjà tenue par le thread s'il y en a une"""
+        value = getattr(self, attribute)
+        if value is None:
+            with self.connection() as conn:
+                value = detect(conn)
+            with self._lock:
+                setattr(self, attribute, value)
+        return value
+
+    @property
+    def has_rollups(self):
+        import rollups
+        return self._flag("_has_rollups", rollups.has_rollups)
+
+    @property
+    def has_cube(self):
+        import cube
+        return self._flag("_has_cube", cube.has_cube)
+
+    @property
+    def has_prefix_sums(self):
+        import prefix_sums
+        return self._flag("_has_prefix_sums", prefix_sums.has_prefix_sums)
+
+    @property
+    def has_alerts(self):
+        import alerts
+        return self._flag("_has_alerts", alerts.has_alerts)
+
+    @property
+    def has_anomalies(self):
+        import anomalies
+        return self._flag("_has_anomalies", anomalies.has_anomalies)
+
+    @property
+    def has_partitions(self):
+        import partitions
+        return self._flag("_has_partitions", partitions.has_partitions)
+
+    def operations(self, conn, start, end):
+        """Sources operations de la période : partitions chevauchantes attachées par lots (partitions.sources)"""
+        if not self.has_partitions:
+            yield "operations"
+            return
+        import partitions
+        yield from partitions.sources(conn, start, end)
+
+    def _connect(self):
+        uri = f"{self.db_path.resolve().as_uri()}?mode=ro"
+        conn = sqlite3.connect(uri, uri=True, check_same_thread=False, cached_statements=64)
+        conn.execute("PRAGMA query_only = ON")
+        return conn
+
+    def _acquire(self):
+        try:
+            return self._idle.get_nowait()
+        except queue.Empty:
+            pass
+        with self._lock:
+            if self._created < self.max_size:
+                self._created += 1
+                create = True
+            else:
+                create = False
+        if create:
+            try:
+                return self._connect()
+            except Exception:
+                with self._lock:
+                    self._created -= 1
+                raise
+        # Pool saturé : on attend qu'une connexion se libère, sans bloquer indéfiniment
+        try:
+            return self._idle.get(timeout=ACQUIRE_TIMEOUT)
+        except queue.Empty:
+            raise TimeoutError(f"Aucune connexion libre vers {self.db_path} après {ACQUIRE_TIMEOUT}s") from None
+
+    @contextmanager
+    def connection(self):
+        held = getattr(self._held, "conn", None)
+        if held is not None:
+            yield held
+            return
+        conn = self._acquire()
+        self._held.conn = conn
+        try:
+            yield conn
+        finally:
+            self._held.conn = None
+            self._idle.put(conn)
+
+    def reset_flags(self):
+        """Oublie les tables détectées (après ingestion, migration ou fermeture)"""
+        with self._lock:
+            self._has_rollups = None
+            self._has_cube = None
+            self._has_prefix_sums = None
+            self._has_alerts = None
+            self._has_anomalies = None
+            self._has_partitions = None
+
+    def close(self):
+        while True:
+            try:
+                self._idle.get_nowait().close()
+            except queue.Empty:
+                break
+        with self._lock:
+            self._created = 0
+        self.reset_flags()
+
+
+# ========== CACHE DE RÉSULTATS ==========
+def _sizeof(value):
+    """Taille approximative en octets d'un résultat (DataFrame, tableaux numpy, cube...)"""
+    if isinstance(value, pd.DataFrame):
+        return int(value.memory_usage(index=True, deep=True).sum())
+    if isinstance(value, pd.Series):
+        return int(value.memory_usage(index=True, deep=True))
+    if hasattr(value, "nbytes"):
+        return int(value.nbytes)
+    if isinstance(value, (list, tuple)):
+        return sys.getsizeof(value) + sum(_sizeof(item) for item in value)
+    if isinstance(value, dict):
+        return sys.getsizeof(value) + sum(_sizeof(item) for item in value.values())
+    if hasattr(value, "__dict__"):
+        return sys.getsizeof(value) + _sizeof(vars(value))
+    return sys.getsizeof(value)
+
+
+class _Flight:
+    """Calcul en cours pour une clé, attendu par les requêtes concurrentes"""
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.value = None
+        self.error = None
+
+
+class ResultCache:
+    """Cache LRU borné (entrées et octets) avec expiration par entrée
+
+    Partagé par toutes les sessions du processus. get_or_compute est
+    « single-flight » : pendant qu'une session calcule une clé, les autres
+    sessions qui demandent la même clé attendent ce calcul au lieu de
+    relancer la même requête sur SQLite.
+    """
+
+    def __init__(self, max_entries=128, max_bytes=256 * 1024 * 1024):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()
+        self._flights = {}
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self._stats = dict.fromkeys(("hits", "misses", "waits", "evictions"), 0)
+
+    def _lookup(self, key):
+        # Appelé sous self._lock
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        expires_at, size, value = entry
+        if expires_at < time.monotonic():
+            del self._entries[key]
+            self._bytes -= size
+            return None
+        self._entries.move_to_end(key)
+        return value
+
+    def get(self, key):
+        with self._lock:
+            return self._lookup(key)
+
+    def put(self, key, value, ttl):
+        size = _sizeof(value)
+        with self._lock:
+            previous = self._entries.pop(key, None)
+            if previous is not None:
+                self._bytes -= previous[1]
+            if size > self.max_bytes:
+                return
+            self._entries[key] = (time.monotonic() + ttl, size, value)
+            self._bytes += size
+            while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+                _, (_, evicted_size, _) = self._entries.popitem(last=False)
+                self._bytes -= evicted_size
+                self._stats["evictions"] += 1
+
+    def get_or_compute(self, key, ttl, compute):
+        """Valeur en cache, sinon calculée une seule fois même sous requêtes concurrentes"""
+        with self._lock:
+            value = self._lookup(key)
+            if value is not None:
+                self._stats["hits"] += 1
+                return value
+            flight = self._flights.get(key)
+            leader = flight is None
+            if leader:
+                flight = self._flights[key] = _Flight()
+                self._stats["misses"] += 1
+            else:
+                self._stats["waits"] += 1
+        if not leader:
+            flight.done.wait()
+            if flight.error is not None:
+                raise flight.error
+            return flight.value
+        try:
+            flight.value = compute()
+            self.put(key, flight.value, ttl)
+            return flight.value
+        except Exception as e:
+            # Erreur transmise aux requêtes en attente, jamais mise en cache
+            flight.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._flights[key]
+            flight.done.set()
+
+    def stats(self):
+        """Compteurs (hits, misses, waits, evictions), nombre d'entrées et octets"""
+        with self._lock:
+            return {**self._stats, "entries": len(self._entries), "bytes": self._bytes,
+                    "max_bytes": self.max_bytes}
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+
+_pools = {}
+_pools_lock = threading.Lock()
+_cache = ResultCache()
+
+
+def cached(key, ttl, compute):
+    """Valeur en cache pour key, sinon calculée par compute() et mise en cache"""
+    return _cache.get_or_compute(key, ttl, compute)
+
+
+def cache_stats():
+    """Statistiques du cache partagé du processus"""
+    return _cache.stats()
+
+
+def get_pool(db_path=DB_PATH):
+    """Retourne le pool partagé associé au fichier de base"""
+    key = str(Path(db_path).resolve())
+    with _pools_lock:
+        pool = _pools.get(key)
+        if pool is None:
+            pool = _pools[key] = ConnectionPool(db_path)
+        return pool
+
+
+def normalize_range(start_date, end_date):
+    """Ramène une période à des bornes journalières stables (clé de cache)"""
+    start_day = start_date.date() if isinstance(start_date, datetime) else start_date
+    end_day = end_date.date() if isinstance(end_date, datetime) else end_date
+    if not isinstance(start_day, date) or not isinstance(end_day, date):
+        raise TypeError("Les bornes de période doivent être des dates")
+    return start_day, end_day
+
+
+def _range_params(name, start_day, end_day):
+    if name == "daily":
+        return (start_day.isoformat(), end_day.isoformat())
+    if name in ("recent", "activity_hourly"):
+        start = datetime.combine(start_day, datetime.min.time())
+        end = datetime.combine(end_day, datetime.max.time())
+        return (str(start), str(end))
+    return ()
+
+
+def _combine(name, frames):
+    """Recombine les résultats des passes sur les partitions (partitions.sources)
+
+    recent : lignes retriées puis tronquées ; activity_hourly : heures
+    ressommées, durée moyenne pondérée par nb_durees (colonne retirée).
+    """
+    merged = pd.concat(frames, ignore_index=True) if len(frames) > 1 else frames[0]
+    if name == "recent" and len(frames) > 1:
+        merged = merged.sort_values(['timestamp', 'op_id'], ascending=False, kind='stable')
+        return merged.head(RECENT_LIMIT).reset_index(drop=True)
+    if name == "activity_hourly":
+        if len(frames) > 1:
+            merged = merged.assign(somme=merged['duree_moyenne'].fillna(0) * merged['nb_durees']).groupby(
+                'date', as_index=False
+            )[['nb_operations', 'somme', 'nb_durees', 'urgences', 'erreurs']].sum()
+            merged['duree_moyenne'] = merged['somme'] / merged['nb_durees'].where(merged['nb_durees'] > 0)
+        return merged[['date', 'nb_operations', 'duree_moyenne', 'urgences', 'erreurs']]
+    return merged
+
+
+def run_query(name, start_day=None, end_day=None, db_path=DB_PATH, filters=Filters()):
+    """Exécute une requête nommée en passant par le cache de résultats
+
+    Les filtres ne s'appliquent qu'aux requêtes sur operations (recent,
+    activity_hourly) ; la clé de cache inclut leur forme canonique.
+    """
+    import metrics
+    import rollups
+
+    rows = name in ROW_QUERIES
+    if not rows:
+        filters = filters.aggregates()
+
+    def compute():
+        pool = get_pool(db_path)
+        sql = QUERIES[name]
+        # Tables de rollup installées : coût proportionnel aux jours, pas aux lignes
+        if name in rollups.QUERIES and pool.has_rollups:
+            sql = rollups.QUERIES[name]
+        conditions, filter_params = filters.sql(rows) if "{filters}" in sql else ("", [])
+        range_params = _range_params(name, start_day, end_day)
+        params = (*range_params, *filter_params)
+        with metrics.span(f"requête {name}"), pool.connection() as conn:
+            if "{operations}" not in sql:
+                return pd.read_sql_query(sql.format(filters=conditions), conn, params=params)
+            return _combine(name, [
+                pd.read_sql_query(sql.format(filters=conditions, operations=source), conn, params=params)
+                for source in pool.operations(conn, *range_params)
+            ])
+
+    result = cached((str(db_path), name, start_day, end_day, filters.key()), QUERY_TTL[name], compute)
+    # Copie : les appelants enrichissent les DataFrames (taux_erreur, ...)
+    return result.copy()
+
+
+def load_cube(start_date, end_date, db_path=DB_PATH):
+    """Cellules du cube de la période (partagées, en lecture seule)"""
+    import cube
+    import metrics
+
+    start_day, end_day = normalize_range(start_date, end_date)
+
+    def compute():
+        with metrics.span("requête cube"), get_pool(db_path).connection() as conn:
+            return cube.OperationsCube.from_db(conn, start_day, end_day)
+
+    return cached((str(db_path), "cube", start_day, end_day), QUERY_TTL["cube"], compute)
+
+
+def load_aggregates(start_date, end_date, filters=Filters(), db_path=DB_PATH):
+    """Agrégats journaliers, par engin et horaires tranchés dans le cube, en cache par filtre"""
+    import metrics
+
+    start_day, end_day = normalize_range(start_date, end_date)
+    filters = filters.aggregates()
+
+    def compute():
+        cells = load_cube(start_day, end_day, db_path)
+        with metrics.span("cube (agrégats)"):
+            selected = filters.cube_mask(cells)
+            return cells.daily(selected), cells.engins(selected), cells.hourly(selected)
+
+    key = (str(db_path), "aggregates", start_day, end_day, filters.key())
+    return tuple(frame.copy() for frame in cached(key, QUERY_TTL["cube"], compute))
+
+
+def load_data(start_date, end_date, filters=Filters(), db_path=DB_PATH):
+    """Charge les quatre jeux de données du dashboard pour une période et des filtres
+
+    Sans cube (base non migrée), les agrégats viennent des vues et ignorent
+    les filtres ; les opérations récentes sont toujours filtrées en SQL.
+    """
+    start_day, end_day = normalize_range(start_date, end_date)
+
+    if get_pool(db_path).has_cube:
+        daily_data, engins_data, hourly_data = load_aggregates(start_day, end_day, filters, db_path)
+        recent_ops = run_query("recent", start_day, end_day, db_path, filters)
+        return daily_data, engins_data, hourly_data, recent_ops
+
+    daily_data = run_query("daily", start_day, end_day, db_path)
+    engins_data = run_query("engins", db_path=db_path)
+    hourly_data = run_query("hourly", db_path=db_path)
+    recent_ops = run_query("recent", start_day, end_day, db_path, filters)
+
+    # Conversion des dates
+    if not daily_data.empty:
+        daily_data['date'] = pd.to_datetime(daily_data['date'])
+
+    return daily_data, engins_data, hourly_data, recent_ops
+
+
+def watchlist_of(engins_data, min_rate=WATCHLIST_MIN_RATE, k=WATCHLIST_SIZE):
+    """Top-k des engins par taux d'erreur au-dessus du seuil, et nombre d'engins signalés"""
+    rates = 100.0 * engins_data['erreurs'] / engins_data['total_operations'].where(engins_data['total_operations'] > 0)
+    flagged = engins_data.assign(taux_erreur=rates)[rates > min_rate]
+    top = flagged.nlargest(k, 'taux_erreur')[['engin', 'total_operations', 'erreurs', 'taux_erreur']]
+    return top.reset_index(drop=True), len(flagged)
+
+
+def load_ranking(start_date, end_date, filters=Filters(), order="volume", k=None,
+                 min_rate=None, after=None, db_path=DB_PATH):
+    """Page du classement des engins calculée en SQL : (page, nombre d'engins classés)
+
+    k : taille de page (fleet.PAGE_SIZE par défaut). after : curseur keyset
+    de la page précédente (fleet.cursor_of). Retourne None si la base n'a
+    pas de cube.
+    """
+    import fleet
+    import metrics
+
+    k = fleet.PAGE_SIZE if k is None else k
+    start_day, end_day = normalize_range(start_date, end_date)
+    filters = filters.aggregates()
+    pool = get_pool(db_path)
+    if not pool.has_cube:
+        return None
+
+    def compute():
+        with metrics.span(f"requête classement {order}"), pool.connection() as conn:
+            return fleet.rank(conn, start_day, end_day, filters, order, k, min_rate, after, pool.has_prefix_sums)
+
+    key = (str(db_path), "ranking", start_day, end_day, filters.key(), order, k, min_rate, after)
+    page, total = cached(key, QUERY_TTL["ranking"], compute)
+    return page.copy(), total
+
+
+def load_watchlist(start_date, end_date, filters=Filters(), k=WATCHLIST_SIZE, after=None, db_path=DB_PATH):
+    """Engins à surveiller de la période : (top-k, nombre total signalé)
+
+    Sans cube, le seuil porte sur le cumul complet, sans période ni
+    pagination (page vide après la première).
+    """
+    start_day, end_day = normalize_range(start_date, end_date)
+    ranking = load_ranking(start_day, end_day, filters, "taux_erreur", k, WATCHLIST_MIN_RATE, after, db_path)
+    if ranking is not None:
+        page, total = ranking
+        return page[['engin', 'total_operations', 'erreurs', 'taux_erreur']], total
+
+    pool = get_pool(db_path)
+
+    def compute():
+        source = "rollup_engins" if pool.has_rollups else "vue_performance_engins"
+        with pool.connection() as conn:
+            return pd.read_sql_query(WATCHLIST_QUERY.format(source=source), conn, params=(WATCHLIST_MIN_RATE, k))
+
+    top = cached((str(db_path), "watchlist", k), QUERY_TTL["engins"], compute).copy()
+    total = int(top['nb_signales'].iloc[0]) if not top.empty else 0
+    top = top.drop(columns='nb_signales')
+    return (top if after is None else top.iloc[:0]), total
+
+
+def load_activity_hourly(start_date, end_date, filters=Filters(), db_path=DB_PATH):
+    """Série d'activité heure par heure sur la période"""
+    start_day, end_day = normalize_range(start_date, end_date)
+    filters = filters.aggregates()
+    if get_pool(db_path).has_cube:
+        cells = load_cube(start_day, end_day, db_path)
+        return cells.hourly_series(filters.cube_mask(cells))
+    series = run_query("activity_hourly", start_day, end_day, db_path, filters)
+    series['date'] = pd.to_datetime(series['date'])
+    return series
+
+
+def _engin_labels(db_path):
+    import cube
+
+    def compute():
+        with get_pool(db_path).connection() as conn:
+            return [label for _, label in conn.execute(cube.DIMENSION_QUERIES["engin"])]
+    return cached((str(db_path), "dim_engin"), QUERY_TTL["dim_engin"], compute)
+
+
+def load_totals(start_date, end_date, filters=Filters(), db_path=DB_PATH):
+    """Totaux d'une période par sommes cumulées (deux recherches par clé, sans cache)
+
+    Servis pour l'absence de filtre (portée globale), un filtre de zones
+    seul ou de types d'engins seul ; retourne None sinon, ou si la base n'a
+    pas de table prefix_sums.
+    """
+    import metrics
+    import prefix_sums
+
+    start_day, end_day = normalize_range(start_date, end_date)
+    filters = filters.aggregates()
+    pool = get_pool(db_path)
+    if not pool.has_prefix_sums:
+        return None
+    if filters.is_default:
+        scope, keys = "global", ("",)
+    elif filters == Filters(zones=filters.zones):
+        scope, keys = "zone", filters.zones
+    elif filters == Filters(engin_types=filters.engin_types) and pool.has_cube:
+        scope, keys = "engin", filters.engins_of(_engin_labels(db_path))
+    else:
+        return None
+    with metrics.span("requête prefix_sums"), pool.connection() as conn:
+        return prefix_sums.range_totals(conn, start_day, end_day, scope, keys)
+
+
+def load_active_alerts(limit=ALERTS_LIMIT, db_path=DB_PATH):
+    """Alertes actives, plus récentes d'abord ; None si la base n'a pas de table alerts"""
+    import alerts
+
+    pool = get_pool(db_path)
+    if not pool.has_alerts:
+        return None
+
+    def compute():
+        with pool.connection() as conn:
+            return pd.read_sql_query(alerts.ACTIVE_QUERY, conn, params=(limit,))
+    return cached((str(db_path), "alerts", limit), QUERY_TTL["alerts"], compute).copy()
+
+
+def load_anomalies(limit=ANOMALIES_LIMIT, db_path=DB_PATH):
+    """Scores d'anomalie EWMA les plus forts en valeur absolue ; None sans table d'état"""
+    import anomalies
+
+    pool = get_pool(db_path)
+    if not pool.has_anomalies:
+        return None
+
+    def compute():
+        with pool.connection() as conn:
+            return pd.read_sql_query(anomalies.TOP_QUERY, conn, params=(anomalies.MIN_STEPS, limit))
+    return cached((str(db_path), "anomalies", limit), QUERY_TTL["anomalies"], compute).copy()
+
+
+def fetch_since(watermark, limit=5000, filters=Filters(), db_path=DB_PATH):
+    """Opérations postérieures au filigrane (timestamp, op_id), par ordre croissant
+
+    Erreurs comprises quel que soit show_errors : le delta alimente aussi
+    les KPIs ; le flux les masque à l'affichage (Filters.frame_mask).
+    """
+    timestamp, op_id = watermark
+    conditions, params = filters.sql()
+    with get_pool(db_path).connection() as conn:
+        return pd.read_sql_query(
+            DELTA_QUERY.format(filters=conditions), conn,
+            params=(str(timestamp), int(op_id), *params, limit),
+        )
+
+
+def fetch_older(cursor, start_day, limit=10, filters=Filters(), db_path=DB_PATH):
+    """Opérations antérieures au curseur (timestamp, op_id), plus récentes d'abord"""
+    timestamp, op_id = cursor
+    conditions, params = filters.sql(rows=True)
+    pool = get_pool(db_path)
+    with pool.connection() as conn:
+        frames = [
+            pd.read_sql_query(
+                OLDER_QUERY.format(filters=conditions, operations=source), conn,
+                params=(str(timestamp), int(op_id), str(start_day), *params, limit),
+            )
+            for source in pool.operations(conn, str(start_day), str(timestamp))
+        ]
+    if len(frames) == 1:
+        return frames[0]
+    older = pd.concat(frames, ignore_index=True).sort_values(['timestamp', 'op_id'], ascending=False, kind='stable')
+    return older.head(limit).reset_index(drop=True)
+
+
+def clear_cache():
+    """Vide le cache de résultats (après ingestion ou migration)"""
+    _cache.clear()
+    with _pools_lock:
+        pools = list(_pools.values())
+    for pool in pools:
+        pool.reset_flags()
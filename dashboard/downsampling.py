@@ -0,0 +1,129 @@
+"""Résolution adaptative et sous-échantillonnage des séries temporelles.
+
+Le graphique "Activité Journalière" choisit sa granularité (heure, jour,
+semaine, mois) selon la durée de la période, puis, si la série dépasse
+encore MAX_POINTS, la réduit en conservant sa forme (LTTB ou min/max par
+seau). La charge utile envoyée à Plotly reste bornée quelle que soit la
+période sélectionnée.
+"""
+import numpy as np
+import pandas as pd
+
+MAX_POINTS = 500
+
+# (durée maximale en jours, fréquence pandas, libellé d'axe)
+RESOLUTIONS = [
+    (3, 'H', "Heure"),
+    (400, 'D', "Date"),
+    (5 * 366, 'W-MON', "Semaine"),
+    (None, 'MS', "Mois"),
+]
+
+
+def choose_resolution(start_date, end_date):
+    """Fréquence et libellé adaptés à la durée de la période"""
+    span_days = (pd.Timestamp(end_date) - pd.Timestamp(start_date)).total_seconds() / 86400
+    for max_days, freq, label in RESOLUTIONS:
+        if max_days is None or span_days <= max_days:
+            return freq, label
+
+
+def resample(series, freq):
+    """Regroupe une série (date, nb_operations, duree_moyenne, urgences, erreurs) par seau
+
+    La durée moyenne est pondérée par le nombre d'opérations du seau.
+    """
+    if series.empty:
+        return series
+    frame = series.set_index('date')
+    weighted = frame['duree_moyenne'] * frame['nb_operations']
+    grouped = pd.DataFrame({
+        'nb_operations': frame['nb_operations'],
+        'somme_duree': weighted,
+        'poids': frame['nb_operations'].where(frame['duree_moyenne'].notna(), 0),
+        'urgences': frame['urgences'],
+        'erreurs': frame['erreurs'],
+    }).resample(freq, label='left', closed='left').sum()
+    grouped = grouped[grouped['nb_operations'] > 0]
+    grouped['duree_moyenne'] = grouped['somme_duree'] / grouped['poids'].where(grouped['poids'] > 0)
+    return grouped[['nb_operations', 'duree_moyenne', 'urgences', 'erreurs']].rename_axis('date').reset_index()
+
+
+# ========== SOUS-ÉCHANTILLONNAGE ==========
+def lttb_indices(x, y, n_out):
+    """Indices retenus par Largest-Triangle-Three-Buckets
+
+    Une itération par seau de sortie ; le calcul des aires de chaque seau
+    est vectorisé.
+    """
+    n = len(x)
+    if n_out >= n or n_out < 3:
+        return np.arange(n)
+    x = np.asarray(x, dtype=float)
+    y = np.asarray(y, dtype=float)
+    edges = np.linspace(1, n - 1, n_out - 1).astype(int)
+    selected = np.empty(n_out, dtype=int)
+    selected[0], selected[-1] = 0, n - 1
+    prev = 0
+    for i in range(n_out - 2):
+        lo, hi = edges[i], edges[i + 1]
+        next_lo, next_hi = hi, edges[i + 2] if i + 2 < len(edges) else n
+        avg_x = x[next_lo:next_hi].mean()
+        avg_y = y[next_lo:next_hi].mean()
+        areas = np.abs(
+            (x[prev] - avg_x) * (y[lo:hi] - y[prev]) - (x[prev] - x[lo:hi]) * (avg_y - y[prev])
+        )
+        prev = lo + int(np.argmax(areas))
+        selected[i + 1] = prev
+    return selected
+
+
+def minmax_indices(y, n_out):
+    """Indices des minima et maxima de chaque seau (entièrement vectorisé)"""
+    n = len(y)
+    n_buckets = n_out // 2
+    if n_buckets < 1 or n_out >= n:
+        return np.arange(n)
+    y = np.asarray(y, dtype=float)
+    starts = np.linspace(0, n, n_buckets + 1).astype(int)[:-1]
+    bucket_of = np.repeat(np.arange(n_buckets), np.diff(np.append(starts, n)))
+    mins = np.minimum.reduceat(y, starts)
+    maxs = np.maximum.reduceat(y, starts)
+    # Premier indice de chaque seau atteignant son min / son max
+    is_min = y == mins[bucket_of]
+    is_max = y == maxs[bucket_of]
+    first_min = np.full(n_buckets, n)
+    first_max = np.full(n_buckets, n)
+    np.minimum.at(first_min, bucket_of[is_min], np.flatnonzero(is_min))
+    np.minimum.at(first_max, bucket_of[is_max], np.flatnonzero(is_max))
+    return np.unique(np.concatenate([first_min, first_max]))
+
+
+def downsample(series, max_points=MAX_POINTS, method='lttb', column='nb_operations'):
+    """Réduit une série à max_points lignes en préservant sa forme"""
+    if len(series) <= max_points:
+        return series
+    if method == 'minmax':
+        idx = minmax_indices(series[column].to_numpy(), max_points)
+    else:
+        x = series['date'].to_numpy().astype('datetime64[s]').astype(np.int64)
+        idx = lttb_indices(x, series[column].to_numpy(), max_points)
+    return series.iloc[idx].reset_index(drop=True)
+
+
+def prepare_activity_series(daily_data, start_date, end_date, hourly_series=None, max_points=MAX_POINTS):
+    """Série prête pour le graphique d'activité et libellé de l'axe des x
+
+    hourly_series : série horaire de la période, utilisée si la résolution
+    retenue est l'heure (sinon la série journalière est agrégée).
+    """
+    freq, label = choose_resolution(start_date, end_date)
+    if freq == 'H':
+        if hourly_series is None or hourly_series.empty:
+            freq, label = 'D', "Date"
+            series = daily_data
+        else:
+            series = hourly_series
+    else:
+        series = daily_data if freq == 'D' else resample(daily_data, freq)
+    return downsample(series, max_points), label
@@ -0,0 +1,148 @@
+"""Journal structuré du dashboard, écrit hors du thread du script.
+
+Les handlers de la racine sont remplacés par un QueueHandler : le thread
+du script ne fait que poser l'enregistrement dans une file non bornée
+(jamais bloquante). Un QueueListener la vide dans un thread dédié vers :
+- logs/app.jsonl, une ligne JSON par événement (horodatage, niveau,
+  message, session, rerun, type d'événement et données associées),
+  tourné à chaque changement de jour ou au-delà de MAX_BYTES, les
+  archives étant compressées en gzip (BACKUP_COUNT gardées) ;
+- la sortie standard, au format texte habituel.
+
+Le contexte (session, rerun) est lié au thread du script par bind() en
+début de rerun et ajouté à chaque enregistrement au moment de l'appel.
+"""
+import atexit
+import gzip
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import shutil
+import sys
+import threading
+from datetime import date, datetime
+from pathlib import Path
+
+LOG_PATH = Path("logs/app.jsonl")
+MAX_BYTES = 10 * 2**20
+BACKUP_COUNT = 14
+TEXT_FORMAT = '%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+
+_context = threading.local()
+_listener = None
+_setup_lock = threading.Lock()
+
+
+# ========== CONTEXTE ==========
+def bind(**context):
+    """Contexte ajouté aux enregistrements émis par ce thread (session_id, rerun_id)"""
+    _context.values = context
+
+
+def event(name, **data):
+    """Argument extra= d'un événement typé : logger.info(..., extra=event("auth", resultat="succes"))"""
+    return {'event': name, 'data': data}
+
+
+class _ContextFilter(logging.Filter):
+    """Copie le contexte du thread émetteur dans l'enregistrement (avant la file)"""
+
+    def filter(self, record):
+        for key, value in getattr(_context, "values", {}).items():
+            if not hasattr(record, key):
+                setattr(record, key, value)
+        return True
+
+
+# ========== FORMAT ==========
+class JsonFormatter(logging.Formatter):
+    """Une ligne JSON par enregistrement"""
+
+    def format(self, record):
+        entry = {
+            'ts': datetime.fromtimestamp(record.created).isoformat(timespec='milliseconds'),
+            'niveau': record.levelname,
+            'logger': record.name,
+            'message': record.getMessage(),
+            'session': getattr(record, 'session_id', None),
+            'rerun': getattr(record, 'rerun_id', None),
+        }
+        if getattr(record, 'event', None):
+            entry['evenement'] = record.event
+            entry['donnees'] = record.data
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+
+# ========== ROTATION ==========
+class RotatingJsonFileHandler(logging.handlers.BaseRotatingHandler):
+    """Fichier tourné au changement de jour ou au-delà de max_bytes ; archives gzip"""
+
+    def __init__(self, filename, max_bytes=MAX_BYTES, backup_count=BACKUP_COUNT):
+        Path(filename).parent.mkdir(parents=True, exist_ok=True)
+        super().__init__(filename, 'a', encoding='utf-8')
+        self.max_bytes = max_bytes
+        self.backup_count = backup_count
+        self._day = self._file_day()
+
+    def _file_day(self):
+        try:
+            return date.fromtimestamp(os.stat(self.baseFilename).st_mtime)
+        except FileNotFoundError:
+            return date.today()
+
+    def shouldRollover(self, record):
+        if self.stream is None:
+            self.stream = self._open()
+        if self.stream.tell() == 0:
+            return False
+        if date.fromtimestamp(record.created) != self._day:
+            return True
+        return self.stream.tell() + len(self.format(record)) + 1 > self.max_bytes
+
+    def doRollover(self):
+        self.stream.close()
+        self.stream = None
+        # Nommée par l'instant de rotation : l'ordre des noms est l'ordre chronologique
+        archive = f"{self.baseFilename}.{datetime.now():%Y%m%d-%H%M%S%f}.gz"
+        with open(self.baseFilename, 'rb') as source, gzip.open(archive, 'wb') as target:
+            shutil.copyfileobj(source, target)
+        os.remove(self.baseFilename)
+        self._prune()
+        self._day = date.today()
+        self.stream = self._open()
+
+    def _prune(self):
+        base = Path(self.baseFilename)
+        archives = sorted(base.parent.glob(f"{base.name}.*.gz"))
+        for old in archives[:max(len(archives) - self.backup_count, 0)]:
+            old.unlink(missing_ok=True)
+
+
+# ========== INSTALLATION ==========
+def setup(path=LOG_PATH, level=logging.INFO):
+    """Branche la racine sur la file d'écriture (une fois par processus, idempotent entre reruns)"""
+    global _listener
+    with _setup_lock:
+        if _listener is not None:
+            return _listener
+        file_handler = RotatingJsonFileHandler(path)
+        file_handler.setFormatter(JsonFormatter())
+        stream_handler = logging.StreamHandler(sys.stdout)
+        stream_handler.setFormatter(logging.Formatter(TEXT_FORMAT))
+
+        records = queue.SimpleQueue()
+        queue_handler = logging.handlers.QueueHandler(records)
+        queue_handler.addFilter(_ContextFilter())
+        root = logging.getLogger()
+        for handler in list(root.handlers):
+            root.removeHandler(handler)
+        root.addHandler(queue_handler)
+        root.setLevel(level)
+
+        _listener = logging.handlers.QueueListener(records, file_handler, stream_handler, respect_handler_level=True)
+        _listener.start()
+        # Vide la file à l'arrêt du serveur
+        atexit.register(_listener.stop)
+        return _listener
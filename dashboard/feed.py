@@ -0,0 +1,72 @@
+"""Flux "DERNIÈRES OPÉRATIONS" : tampon circulaire et pagination keyset.
+
+Chaque session garde les RING_SIZE opérations les plus récentes dans un
+tampon borné alimenté par le chargement initial et par les deltas de
+l'actualisation en direct. Les pages plus anciennes sont lues par
+pagination keyset sur (timestamp, rowid) — jamais par OFFSET — si bien
+qu'afficher la page 500 coûte autant que la page 2. Une page est rendue
+en un seul appel st.markdown.
+"""
+from collections import deque
+from datetime import datetime
+
+import pandas as pd
+
+RING_SIZE = 500
+PAGE_SIZE = 10
+
+
+def row_key(row):
+    """Clé keyset (timestamp, op_id) d'une opération"""
+    return (str(row['timestamp']), int(row.get('op_id', 0) or 0))
+
+
+class FeedBuffer:
+    """Tampon circulaire borné des opérations les plus récentes, plus récente en tête"""
+
+    def __init__(self, maxlen=RING_SIZE):
+        self._rows = deque(maxlen=maxlen)
+
+    def __len__(self):
+        return len(self._rows)
+
+    @property
+    def newest_key(self):
+        return row_key(self._rows[0]) if self._rows else None
+
+    def push(self, frame):
+        """Ajoute les opérations plus récentes que la tête ; retourne le nombre ajouté"""
+        if frame.empty:
+            return 0
+        records = frame.to_dict('records')
+        newest = self.newest_key
+        if newest is not None:
+            records = [r for r in records if row_key(r) > newest]
+        records.sort(key=row_key)
+        # appendleft : la plus ancienne sort du tampon quand il est plein
+        self._rows.extendleft(records)
+        return len(records)
+
+    def head(self, n=PAGE_SIZE):
+        rows = [self._rows[i] for i in range(min(n, len(self._rows)))]
+        return pd.DataFrame(rows)
+
+
+def format_rows(frame):
+    """Markdown d'une page d'opérations (un seul élément à rendre)"""
+    lines = []
+    for row in frame.to_dict('records'):
+        timestamp = row['timestamp']
+        timestamp_str = timestamp.strftime('%H:%M') if isinstance(timestamp, datetime) else timestamp
+
+        icon = ""
+        if row.get('urgence', 0):
+            icon += "⚠️ "
+        if row.get('erreur', 0):
+            icon += "❌ "
+
+        lines.append(
+            f"**{timestamp_str}** - {icon}{row['type_operation']}  \n"
+            f"*{row['zone']}* | {row['engin']} | {row['duree_minutes']:.0f} min"
+        )
+    return "\n\n".join(lines)
@@ -0,0 +1,146 @@
+"""Filtres du dashboard, poussés jusqu'au SQL ou au cube.
+
+Filters regroupe les sélections de la barre latérale (zones, types
+d'engins, types d'opérations, urgences seulement, erreurs affichées) sous
+une forme canonique : listes triées et dédupliquées, sélection vide = pas
+de filtre. key() sert de clé de cache ; deux combinaisons équivalentes
+partagent donc la même entrée.
+
+Le même filtre s'exprime en prédicat SQL paramétré (requêtes sur
+operations), en masque de cellules du cube (agrégats) ou en masque pandas
+(données de démo).
+
+« Afficher les erreurs » ne concerne que les listes (flux des opérations,
+alertes) : les agrégats comptent toujours les erreurs, sans quoi le taux
+d'erreur de la période tomberait à 0 %.
+"""
+from dataclasses import dataclass, replace
+
+import numpy as np
+
+# Libellé du filtre -> préfixe des identifiants d'engins
+ENGIN_TYPES = {
+    "Tracteur": "TRACTEUR_",
+    "Chariot": "CHARIOT_",
+    "Grue": "GRUE_",
+    "Camion": "CAMION_",
+}
+
+
+def _canonical(values):
+    return tuple(sorted(set(values))) if values else ()
+
+
+def engin_type_predicate(engin_types, column="engin"):
+    """Prédicat SQL (et paramètres) retenant les engins des types donnés ; aucun type : rien
+
+    Comparaison exacte du préfixe, sensible à la casse comme startswith
+    (cube, pandas) : avec LIKE, « _ » serait un joker et la casse ignorée.
+    """
+    prefixes = [ENGIN_TYPES[t] for t in engin_types if t in ENGIN_TYPES]
+    if not prefixes:
+        return "0", []
+    predicate = " OR ".join(f"substr({column}, 1, length(?)) = ?" for _ in prefixes)
+    return "(" + predicate + ")", [value for p in prefixes for value in (p, p)]
+
+
+@dataclass(frozen=True)
+class Filters:
+    zones: tuple = ()
+    engin_types: tuple = ()
+    types_operation: tuple = ()
+    urgences_only: bool = False
+    show_errors: bool = True
+
+    @classmethod
+    def of(cls, zones=(), engin_types=(), types_operation=(), urgences_only=False, show_errors=True):
+        """Forme canonique des sélections (ordre et doublons ignorés)"""
+        return cls(_canonical(zones), _canonical(t for t in engin_types if t in ENGIN_TYPES),
+                   _canonical(types_operation), bool(urgences_only), bool(show_errors))
+
+    def key(self):
+        return (self.zones, self.engin_types, self.types_operation, self.urgences_only, self.show_errors)
+
+    @property
+    def is_default(self):
+        return self == Filters()
+
+    def aggregates(self):
+        """Le filtre des agrégats : erreurs toujours comptées (clé de cache commune)"""
+        return replace(self, show_errors=True)
+
+    def statuts(self):
+        """Statuts du cube retenus (urgence + 2 × erreur), None si tous"""
+        import cube
+
+        allowed = [s for s in range(4) if not self.urgences_only or s & cube.STATUT_URGENCE]
+        return None if len(allowed) == 4 else allowed
+
+    # ----- SQL -----
+    def sql(self, rows=False):
+        """Conditions 'AND ...' à ajouter au WHERE d'une requête sur operations, et paramètres
+
+        rows : requête listant des opérations (flux), où les erreurs peuvent
+        être masquées ; sinon agrégat.
+        """
+        clauses, params = [], []
+        if self.zones:
+            clauses.append(f"zone IN ({', '.join('?' * len(self.zones))})")
+            params += self.zones
+        if self.engin_types:
+            predicate, prefix_params = engin_type_predicate(self.engin_types)
+            clauses.append(predicate)
+            params += prefix_params
+        if self.types_operation:
+            clauses.append(f"type_operation IN ({', '.join('?' * len(self.types_operation))})")
+            params += self.types_operation
+        if self.urgences_only:
+            clauses.append("urgence != 0")
+        if rows and not self.show_errors:
+            clauses.append("COALESCE(erreur, 0) = 0")
+        return "".join(f" AND {c}" for c in clauses), params
+
+    # ----- Cube -----
+    def engins_of(self, labels):
+        """Libellés d'engins correspondant aux types sélectionnés, None si pas de filtre"""
+        if not self.engin_types:
+            return None
+        prefixes = tuple(ENGIN_TYPES[t] for t in self.engin_types)
+        return [label for label in labels if str(label).startswith(prefixes)]
+
+    def cube_mask(self, cells, start_day=None, end_day=None):
+        """Masque des cellules du cube pour la période et ce filtre"""
+        return cells.mask(
+            start_day, end_day,
+            zone=self.zones or None,
+            engin=self.engins_of(cells.labels['engin']),
+            type_operation=self.types_operation or None,
+            statut=self.statuts(),
+        )
+
+    # ----- pandas -----
+    def keys_mask(self, frame):
+        """Masque des lignes d'un DataFrame indexé par engin et zone (zones et types d'engins seuls)"""
+        selected = np.ones(len(frame), dtype=bool)
+        if self.zones:
+            selected &= frame['zone'].astype(str).isin(self.zones).to_numpy()
+        if self.engin_types:
+            prefixes = tuple(ENGIN_TYPES[t] for t in self.engin_types)
+            selected &= frame['engin'].astype(str).str.startswith(prefixes).to_numpy()
+        return selected
+
+    def frame_mask(self, ops):
+        """Masque des lignes d'un DataFrame d'opérations listées (erreurs masquables)"""
+        selected = np.ones(len(ops), dtype=bool)
+        if self.zones:
+            selected &= ops['zone'].astype(str).isin(self.zones).to_numpy()
+        if self.engin_types:
+            prefixes = tuple(ENGIN_TYPES[t] for t in self.engin_types)
+            selected &= ops['engin'].astype(str).str.startswith(prefixes).to_numpy()
+        if self.types_operation:
+            selected &= ops['type_operation'].astype(str).isin(self.types_operation).to_numpy()
+        if self.urgences_only:
+            selected &= ops['urgence'].to_numpy() != 0
+        if not self.show_errors:
+            selected &= ops['erreur'].fillna(0).to_numpy() == 0
+        return selected
@@ -0,0 +1,196 @@
+"""Classement de la flotte calculé dans la base : top-k, seuils et pagination.
+
+Le classement des engins (par volume ou par taux d'erreur) et la liste
+des engins à surveiller sont calculés en SQL sur la période demandée ;
+seules les lignes affichées quittent la base, quelle que soit la taille
+de la flotte. Deux sources :
+- sans filtre, ou un filtre de types d'engins seul : sommes cumulées
+  (prefix_sums), deux recherches dans la clé primaire par engin, quelle
+  que soit la longueur de la période ;
+- sinon : cellules du cube de la période, groupées par engin, avec les
+  filtres poussés en sous-requêtes sur les tables de dimensions.
+
+Les pages suivantes sont lues par pagination keyset sur (valeur de tri,
+engin) — jamais par OFFSET. Le nombre total d'engins classés est compté
+dans la même requête (COUNT(*) OVER ()).
+
+Usage :
+    python dashboard/fleet.py --days 30 --order volume -k 10
+    python dashboard/fleet.py --days 7 --order taux_erreur --min-rate 1.5
+"""
+import argparse
+import sqlite3
+import sys
+from datetime import date, timedelta
+
+import pandas as pd
+
+import cube
+import prefix_sums
+from filters import Filters, engin_type_predicate
+
+PAGE_SIZE = 20
+# Critère de tri -> colonne (décroissante, puis engin croissant)
+ORDERS = {"volume": "total_operations", "taux_erreur": "taux_erreur"}
+
+# ========== SOURCES ==========
+# Totaux par engin sur la période : P(dernier jour) - P(veille du premier),
+# la ligne P(j) étant la dernière de jour <= j (clé primaire). CROSS JOIN
+# fixe l'ordre : on parcourt les engins, jamais toutes les lignes cumulées.
+_PREFIX_STATS = """
+    SELECT d.label AS engin,
+           h.nb_operations - COALESCE(l.nb_operations, 0) AS total_operations,
+           h.erreurs - COALESCE(l.erreurs, 0) AS erreurs,
+           h.somme_duree - COALESCE(l.somme_duree, 0) AS somme_duree,
+           h.nb_durees - COALESCE(l.nb_durees, 0) AS nb_durees
+    FROM dim_engin AS d
+    CROSS JOIN prefix_sums AS h ON h.scope = 'engin' AND h.cle = d.label AND h.jour = (
+        SELECT MAX(p.jour) FROM prefix_sums AS p WHERE p.scope = 'engin' AND p.cle = d.label AND p.jour <= ?)
+    LEFT JOIN prefix_sums AS l ON l.scope = 'engin' AND l.cle = d.label AND l.jour = (
+        SELECT MAX(p.jour) FROM prefix_sums AS p WHERE p.scope = 'engin' AND p.cle = d.label AND p.jour < ?)
+    WHERE 1{engins}
+"""
+
+# Cellules de la période (clé primaire sur jour), groupées par engin
+_CUBE_STATS = f"""
+    SELECT e.label AS engin, SUM(c.nb_operations) AS total_operations,
+           SUM(CASE WHEN c.statut & {cube.STATUT_ERREUR} THEN c.nb_operations ELSE 0 END) AS erreurs,
+           SUM(c.somme_duree) AS somme_duree, SUM(c.nb_durees) AS nb_durees
+    FROM cube_operations AS c
+    JOIN dim_engin AS e ON e.id = c.engin_id
+    WHERE c.jour BETWEEN ? AND ?{{conditions}}
+    GROUP BY c.engin_id
+"""
+
+RANKING_QUERY = """
+    WITH stats AS ({stats}),
+    classes AS (
+        SELECT engin, total_operations, erreurs,
+               somme_duree / NULLIF(nb_durees, 0) AS duree_moyenne,
+               100.0 * erreurs / total_operations AS taux_erreur
+        FROM stats
+        WHERE total_operations > 0{threshold}
+    )
+    SELECT * FROM (SELECT *, COUNT(*) OVER () AS nb_classes FROM classes)
+    WHERE 1{after}
+    ORDER BY {key} DESC, engin LIMIT ?
+"""
+
+
+def uses_prefix_sums(filters):
+    """Le filtre se résout par engin (aucun, ou types d'engins seuls)"""
+    return filters.aggregates() == Filters(engin_types=filters.engin_types)
+
+
+def _in(column, table, labels):
+    return f" AND {column} IN (SELECT id FROM {table} WHERE label IN ({', '.join('?' * len(labels))}))", list(labels)
+
+
+def _cube_conditions(filters):
+    """Conditions 'AND ...' du filtre sur les cellules c du cube, et paramètres"""
+    clauses, params = [], []
+    if filters.zones:
+        clause, values = _in("c.zone_id", "dim_zone", filters.zones)
+        clauses.append(clause)
+        params += values
+    if filters.engin_types:
+        predicate, prefixes = engin_type_predicate(filters.engin_types, "e.label")
+        clauses.append(f" AND {predicate}")
+        params += prefixes
+    if filters.types_operation:
+        clause, values = _in("c.type_id", "dim_type_operation", filters.types_operation)
+        clauses.append(clause)
+        params += values
+    statuts = filters.statuts()
+    if statuts is not None:
+        clauses.append(f" AND c.statut IN ({', '.join(str(s) for s in statuts)})")
+    return "".join(clauses), params
+
+
+def ranking_query(start_day, end_day, filters=Filters(), order="volume", k=PAGE_SIZE,
+                  min_rate=None, after=None, use_prefix_sums=True):
+    """Texte SQL et paramètres d'une page du classement
+
+    after : curseur (valeur de tri, engin) de la dernière ligne de la page
+    précédente. Le texte ne dépend que de la forme du filtre (instruction
+    préparée réutilisée).
+    """
+    key = ORDERS[order]
+    first, last = cube.day_number(start_day), cube.day_number(end_day)
+    if use_prefix_sums and uses_prefix_sums(filters):
+        engins, params = "", [last, first]
+        if filters.engin_types:
+            predicate, prefixes = engin_type_predicate(filters.engin_types, "d.label")
+            engins = f" AND {predicate}"
+            params += prefixes
+        stats = _PREFIX_STATS.format(engins=engins)
+    else:
+        conditions, filter_params = _cube_conditions(filters)
+        stats = _CUBE_STATS.format(conditions=conditions)
+        params = [first, last, *filter_params]
+    threshold = ""
+    if min_rate is not None:
+        threshold = " AND 100.0 * erreurs > ? * total_operations"
+        params.append(min_rate)
+    keyset = ""
+    if after is not None:
+        keyset = f" AND ({key} < ? OR ({key} = ? AND engin > ?))"
+        params += [after[0], after[0], after[1]]
+    params.append(k)
+    sql = RANKING_QUERY.format(stats=stats, threshold=threshold, after=keyset, key=key)
+    return sql, tuple(params)
+
+
+def rank(conn, start_day, end_day, filters=Filters(), order="volume", k=PAGE_SIZE,
+         min_rate=None, after=None, use_prefix_sums=None):
+    """Page du classement : (DataFrame des k engins, nombre total d'engins classés)"""
+    if use_prefix_sums is None:
+        use_prefix_sums = prefix_sums.has_prefix_sums(conn)
+    sql, params = ranking_query(start_day, end_day, filters, order, k, min_rate, after, use_prefix_sums)
+    page = pd.read_sql_query(sql, conn, params=params)
+    total = int(page['nb_classes'].iloc[0]) if not page.empty else 0
+    return page.drop(columns='nb_classes'), total
+
+
+def cursor_of(page, order="volume"):
+    """Curseur keyset de la page suivante (None si la page est vide)"""
+    if page.empty:
+        return None
+    last = page.iloc[-1]
+    value = last[ORDERS[order]]
+    return (int(value) if order == "volume" else float(value), str(last['engin']))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Classement des engins PortSec")
+    parser.add_argument("--db", default="data/processed/portsec.db", help="Chemin de la base SQLite")
+    parser.add_argument("--days", type=int, default=30, help="Période : les N derniers jours")
+    parser.add_argument("--order", choices=list(ORDERS), default="volume")
+    parser.add_argument("-k", type=int, default=PAGE_SIZE, help="Taille de page")
+    parser.add_argument("--min-rate", type=float, help="Seuil de taux d'erreur (%%)")
+    parser.add_argument("--pages", type=int, default=1, help="Nombre de pages affichées")
+    args = parser.parse_args(argv)
+
+    conn = sqlite3.connect(f"file:{args.db}?mode=ro", uri=True)
+    try:
+        if not cube.has_cube(conn):
+            print("❌ Base sans cube : lancer python dashboard/migrate.py")
+            return 1
+        end_day = date.today()
+        start_day = end_day - timedelta(days=args.days)
+        after = None
+        for number in range(1, args.pages + 1):
+            page, total = rank(conn, start_day, end_day, order=args.order, k=args.k,
+                               min_rate=args.min_rate, after=after)
+            if page.empty:
+                break
+            print(f"Page {number} ({total} engins classés du {start_day} au {end_day}) :")
+            print(page.to_string(index=False))
+            after = cursor_of(page, args.order)
+        return 0
+    finally:
+        conn.close()
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,147 @@
+"""Temps d'import du dashboard (démarrage à froid).
+
+Dans app.py, seul streamlit est importé avant l'écran de connexion ; la
+pile d'analyse et les modules des sections sont importés après
+l'authentification, section par section, dans des blocs timed(). Chaque
+bloc est mesuré une fois par processus (premier import, à froid) et le
+rapport est écrit dans les logs à la fin du premier rendu authentifié.
+
+En ligne de commande, chaque module est importé dans un interpréteur
+neuf (python -X importtime) après streamlit, qui est toujours chargé en
+premier : on obtient le coût propre de chaque dépendance, à comparer à une
+référence pour suivre les régressions.
+
+Usage :
+    python dashboard/import_report.py
+    python dashboard/import_report.py --save import_baseline.json
+    python dashboard/import_report.py --baseline import_baseline.json
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from pathlib import Path
+
+# Dépendances du dashboard, dans l'ordre où app.py les charge
+MODULES = (
+    "pandas", "numpy", "pyarrow", "plotly.graph_objects", "streamlit.components.v1",
+    "event_log", "data_access", "filters", "fleet", "metrics", "partitions", "synthetic", "cube", "snapshots", "downsampling",
+    "port_map", "positions", "alerts", "anomalies", "feed", "live", "replay",
+)
+BASE_MODULE = "streamlit"
+REPEAT = 3
+# Régression : +20 % et au moins +10 ms par rapport à la référence
+REGRESSION_RATIO = 1.2
+REGRESSION_MS = 10.0
+
+_timings = {}
+_reported = False
+_lock = threading.Lock()
+
+
+# ========== MESURE DANS L'APPLICATION ==========
+@contextmanager
+def timed(label):
+    """Mesure un bloc d'imports ; seule la première exécution du processus est retenue"""
+    started = time.perf_counter()
+    yield
+    elapsed = (time.perf_counter() - started) * 1000
+    with _lock:
+        _timings.setdefault(label, elapsed)
+
+
+def timings():
+    """Blocs mesurés (libellé -> ms), dans l'ordre d'exécution"""
+    with _lock:
+        return dict(_timings)
+
+
+def log_report(logger):
+    """Écrit le rapport une seule fois par processus"""
+    global _reported
+    with _lock:
+        if _reported or not _timings:
+            return
+        _reported = True
+        lines = [f"{label:<32} {ms:8.1f} ms" for label, ms in _timings.items()]
+        total = sum(_timings.values())
+    logger.info("Imports à froid (%.1f ms) :\n%s", total, "\n".join(lines))
+
+
+# ========== MESURE À FROID (LIGNE DE COMMANDE) ==========
+def _import_time(module, cwd):
+    """Coût cumulé (ms) de l'import de module après streamlit, dans un interpréteur neuf"""
+    statement = f"import {BASE_MODULE}" if module == BASE_MODULE else f"import {BASE_MODULE}; import {module}"
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", statement],
+        capture_output=True, text=True, cwd=cwd, env={**os.environ, "PYTHONPATH": str(cwd)},
+    )
+    if result.returncode != 0:
+        return None
+    # Lignes « self | cumulé | nom » ; après streamlit seulement, un module
+    # déjà chargé par streamlit ne coûte rien de plus
+    rows = [[p.strip() for p in line.split("|")] for line in result.stderr.splitlines()]
+    rows = [(int(r[1]), r[2]) for r in rows if len(r) == 3 and r[1].isdigit()]
+    if module != BASE_MODULE:
+        base_end = max(i for i, (_, name) in enumerate(rows) if name == BASE_MODULE)
+        rows = rows[base_end + 1:]
+    return sum(cumulative for cumulative, name in rows if name == module) / 1000
+
+
+def measure(modules=MODULES, repeat=REPEAT, cwd=None):
+    """Meilleur temps sur repeat interpréteurs neufs, par module (None si import impossible)"""
+    cwd = Path(cwd or Path(__file__).resolve().parent)
+    results = {}
+    for module in (BASE_MODULE, *modules):
+        samples = [_import_time(module, cwd) for _ in range(repeat)]
+        samples = [s for s in samples if s is not None]
+        results[module] = min(samples) if samples else None
+    return results
+
+
+def regressions(results, baseline):
+    """Modules nettement plus lents que la référence"""
+    slower = {}
+    for module, ms in results.items():
+        reference = baseline.get(module)
+        if ms is None or reference is None:
+            continue
+        if ms > reference * REGRESSION_RATIO and ms - reference > REGRESSION_MS:
+            slower[module] = (reference, ms)
+    return slower
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Temps d'import à froid du dashboard PortSec")
+    parser.add_argument("--repeat", type=int, default=REPEAT)
+    parser.add_argument("--save", help="Écrire les résultats (JSON) comme référence")
+    parser.add_argument("--baseline", help="Comparer à une référence JSON ; code 1 en cas de régression")
+    args = parser.parse_args(argv)
+
+    results = measure(repeat=args.repeat)
+    baseline = json.loads(Path(args.baseline).read_text()) if args.baseline else {}
+    for module, ms in results.items():
+        shown = "indisponible" if ms is None else f"{ms:8.1f} ms"
+        reference = baseline.get(module)
+        suffix = f"   (référence {reference:.1f} ms)" if reference is not None and ms is not None else ""
+        print(f"{module:<26} {shown}{suffix}")
+
+    if args.save:
+        Path(args.save).write_text(json.dumps(results, indent=2))
+        print(f"✅ Référence écrite dans {args.save}")
+    if baseline:
+        slower = regressions(results, baseline)
+        for module, (reference, ms) in slower.items():
+            print(f"❌ {module}: {reference:.1f} ms -> {ms:.1f} ms")
+        if slower:
+            return 1
+        print("✅ Aucune régression")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
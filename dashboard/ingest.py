@@ -0,0 +1,247 @@
+"""Ingestion en masse d'événements d'opérations dans portsec.db.
+
+Lit des fichiers CSV, JSON-lines ou Parquet par morceaux, valide les
+colonnes attendues et écrit par gros lots executemany, un lot par
+transaction. Le nombre de lignes source consommées est enregistré dans
+la même transaction (table ingest_checkpoints) : après un arrêt brutal,
+la relance reprend exactement après le dernier lot validé. Chaque lot
+passe aussi par le moteur d'alertes et le scoreur d'anomalies, dont les
+alertes et l'état sont écrits dans la même transaction.
+
+Usage :
+    python dashboard/ingest.py events_2026_01.csv events_2026_02.jsonl
+    python dashboard/ingest.py --restart export.parquet
+"""
+import argparse
+import sqlite3
+import sys
+import time
+from contextlib import ExitStack
+from datetime import datetime
+from pathlib import Path
+
+import pandas as pd
+
+import alerts
+import anomalies
+import cube
+import data_access
+import migrate
+import prefix_sums
+import rollups
+import synthetic
+
+REQUIRED_COLUMNS = synthetic.COLUMNS
+BATCH_SIZE = 50_000
+
+# Les lots transitent par une table temporaire : insert_staged les copie
+# dans operations et les replie dans les rollups en une seule passe,
+# au lieu de trois UPSERT par ligne via les triggers ; le cube et les
+# sommes cumulées sont repliés de la même façon depuis la table de lot.
+STAGING_TABLE = "temp.ingest_lot"
+STAGING_SCHEMA = f"""
+CREATE TABLE IF NOT EXISTS {STAGING_TABLE} (
+    timestamp TEXT NOT NULL,
+    type_operation TEXT,
+    zone TEXT,
+    engin TEXT,
+    duree_minutes REAL,
+    urgence INTEGER,
+    erreur INTEGER
+);
+"""
+STAGE_SQL = (
+    f"INSERT INTO {STAGING_TABLE} (timestamp, type_operation, zone, engin, "
+    "duree_minutes, urgence, erreur) VALUES (?, ?, ?, ?, ?, ?, ?)"
+)
+
+CHECKPOINT_SCHEMA = """
+CREATE TABLE IF NOT EXISTS ingest_checkpoints (
+    source TEXT PRIMARY KEY,
+    rows_done INTEGER NOT NULL,
+    updated_at TEXT NOT NULL
+);
+"""
+
+
+def connect(db_path=data_access.DB_PATH):
+    """Connexion en écriture réglée pour l'ingestion, schéma à jour"""
+    Path(db_path).parent.mkdir(parents=True, exist_ok=True)
+    conn = sqlite3.connect(str(db_path), timeout=30)
+    conn.execute("PRAGMA journal_mode = WAL")
+    conn.execute("PRAGMA synchronous = NORMAL")
+    conn.execute("PRAGMA temp_store = MEMORY")
+    conn.execute("PRAGMA cache_size = -131072")
+    conn.execute("PRAGMA wal_autocheckpoint = 10000")
+    migrate.migrate(conn, log=lambda message: None)
+    conn.executescript(CHECKPOINT_SCHEMA)
+    conn.executescript(STAGING_SCHEMA)
+    return conn
+
+
+# ========== LECTURE DES SOURCES ==========
+def _read_parquet(path, batch_size):
+    try:
+        import pyarrow.parquet as pq
+    except ImportError as e:
+        raise RuntimeError("La lecture Parquet nécessite pyarrow (pip install pyarrow)") from e
+    for record_batch in pq.ParquetFile(path).iter_batches(batch_size=batch_size):
+        yield record_batch.to_pandas()
+
+
+def read_chunks(path, batch_size=BATCH_SIZE):
+    """Itère sur un fichier d'événements par DataFrames de batch_size lignes"""
+    path = Path(path)
+    suffix = path.suffix.lower()
+    if suffix == ".csv":
+        return pd.read_csv(path, chunksize=batch_size)
+    if suffix in (".jsonl", ".ndjson", ".json"):
+        return pd.read_json(path, lines=True, chunksize=batch_size)
+    if suffix == ".parquet":
+        return _read_parquet(path, batch_size)
+    raise ValueError(f"Format non supporté : {path.name} (csv, jsonl ou parquet)")
+
+
+# ========== VALIDATION ==========
+def validate(chunk):
+    """Normalise un morceau ; retourne (lignes valides, nombre de rejets)
+
+    Une colonne manquante lève ValueError : le fichier entier est refusé.
+    """
+    missing = [c for c in REQUIRED_COLUMNS if c not in chunk.columns]
+    if missing:
+        raise ValueError(f"Colonnes manquantes : {', '.join(missing)}")
+
+    chunk = chunk[REQUIRED_COLUMNS].copy()
+    chunk['timestamp'] = pd.to_datetime(chunk['timestamp'], errors='coerce', format='ISO8601')
+    chunk['duree_minutes'] = pd.to_numeric(chunk['duree_minutes'], errors='coerce')
+    for flag in ('urgence', 'erreur'):
+        chunk[flag] = pd.to_numeric(chunk[flag], errors='coerce')
+
+    valid = (
+        chunk['timestamp'].notna()
+        & chunk['engin'].notna()
+        & chunk['zone'].notna()
+        & chunk['type_operation'].notna()
+        & (chunk['duree_minutes'].isna() | (chunk['duree_minutes'] >= 0))
+        & chunk['urgence'].isin([0, 1])
+        & chunk['erreur'].isin([0, 1])
+    )
+    rows = chunk[valid]
+    rows = rows.astype({'urgence': 'int8', 'erreur': 'int8'})
+    if rows['timestamp'].dt.tz is not None:
+        rows['timestamp'] = rows['timestamp'].dt.tz_convert(None)
+    return rows, int((~valid).sum())
+
+
+# ========== ÉCRITURE ==========
+def get_checkpoint(conn, source):
+    row = conn.execute(
+        "SELECT rows_done FROM ingest_checkpoints WHERE source = ?", (source,)
+    ).fetchone()
+    return row[0] if row else 0
+
+
+def write_batch(conn, rows, source=None, rows_done=None, alert_engine=None, scorer=None):
+    """Insère un lot validé et avance le checkpoint dans la même transaction
+
+    Si la transaction échoue, l'état en mémoire du moteur d'alertes et du
+    scoreur revient à celui d'avant le lot : un nouvel essai ne compte pas
+    le lot deux fois.
+    """
+    with ExitStack() as stack:
+        for state in (alert_engine, scorer):
+            if state is not None:
+                stack.enter_context(state.transaction())
+        with conn:
+            conn.execute(f"DELETE FROM {STAGING_TABLE}")
+            conn.executemany(STAGE_SQL, synthetic.to_sql_rows(rows))
+            rollups.insert_staged(conn, STAGING_TABLE)
+            cube.fold_staged(conn, STAGING_TABLE)
+            prefix_sums.fold_staged(conn, STAGING_TABLE)
+            if alert_engine is not None:
+                alert_engine.process(rows)
+            if scorer is not None:
+                scorer.process(rows)
+                scorer.save(conn, conn.execute("SELECT MAX(rowid) FROM operations").fetchone()[0])
+            if source is not None:
+                conn.execute(
+                    "INSERT INTO ingest_checkpoints (source, rows_done, updated_at) VALUES (?, ?, ?) "
+                    "ON CONFLICT(source) DO UPDATE SET rows_done = excluded.rows_done, "
+                    "updated_at = excluded.updated_at",
+                    (source, rows_done, datetime.now().isoformat(timespec='seconds')),
+                )
+    return len(rows)
+
+
+def load_scorer(conn):
+    """Scoreur d'anomalies rechargé et rattrapé sur les lignes écrites hors ingestion"""
+    scorer = anomalies.AnomalyScorer.load(conn)
+    scorer.catch_up(conn)
+    return scorer
+
+
+def ingest_file(conn, path, batch_size=BATCH_SIZE, restart=False, log=print, alert_engine=None, scorer=None):
+    """Ingère un fichier en reprenant après le dernier lot validé"""
+    if alert_engine is None:
+        alert_engine = alerts.AlertEngine.for_connection(conn)
+    if scorer is None:
+        scorer = load_scorer(conn)
+    source = str(Path(path).resolve())
+    skip = 0 if restart else get_checkpoint(conn, source)
+    if skip:
+        log(f"↪ Reprise de {Path(path).name} après {skip:,} lignes")
+
+    stats = {"source": source, "lus": 0, "inseres": 0, "rejetes": 0, "ignores": skip}
+    rows_done = 0
+    started = time.perf_counter()
+    for chunk in read_chunks(path, batch_size):
+        n = len(chunk)
+        if rows_done + n <= skip:
+            rows_done += n
+            continue
+        if rows_done < skip:
+            chunk = chunk.iloc[skip - rows_done:]
+            rows_done = skip
+        rows, rejected = validate(chunk)
+        rows_done += len(chunk)
+        stats["inseres"] += write_batch(conn, rows, source, rows_done, alert_engine, scorer)
+        stats["lus"] += len(chunk)
+        stats["rejetes"] += rejected
+        elapsed = time.perf_counter() - started
+        log(f"   {Path(path).name}: {rows_done:,} lignes "
+            f"({stats['lus'] / max(elapsed, 1e-9):,.0f} lignes/s, {stats['rejetes']:,} rejets)")
+    stats["secondes"] = time.perf_counter() - started
+    return stats
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Ingestion d'opérations dans PortSec")
+    parser.add_argument("files", nargs="+", help="Fichiers CSV, JSON-lines ou Parquet")
+    parser.add_argument("--db", default=str(data_access.DB_PATH), help="Chemin de la base SQLite")
+    parser.add_argument("--batch-size", type=int, default=BATCH_SIZE)
+    parser.add_argument("--restart", action="store_true", help="Ignorer les checkpoints existants")
+    args = parser.parse_args(argv)
+
+    conn = connect(args.db)
+    try:
+        total_rows, total_seconds = 0, 0.0
+        alert_engine = alerts.AlertEngine.for_connection(conn)
+        scorer = load_scorer(conn)
+        for path in args.files:
+            stats = ingest_file(conn, path, args.batch_size, args.restart,
+                                alert_engine=alert_engine, scorer=scorer)
+            total_rows += stats["inseres"]
+            total_seconds += stats["secondes"]
+            print(f"✅ {Path(path).name}: {stats['inseres']:,} insérées, "
+                  f"{stats['rejetes']:,} rejetées en {stats['secondes']:.1f}s")
+        if total_seconds > 0:
+            print(f"📈 Débit global : {total_rows / total_seconds:,.0f} lignes/s")
+        print(f"🚨 {len(alert_engine.active)} alertes actives")
+        return 0
+    finally:
+        conn.close()
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,78 @@
+"""Actualisation en direct des panneaux temps réel du dashboard.
+
+Au lieu de bloquer le script (time.sleep) puis de tout recalculer via
+st.rerun(), la page est rendue une fois en entier ; la boucle de fin de
+script ne met ensuite à jour que les placeholders des panneaux en direct
+(KPIs, dernières opérations, alertes). Chaque tick ne lit que les
+opérations postérieures au filigrane (timestamp, rowid) et les replie
+dans l'état déjà chargé (agrégats journaliers, tampon du flux).
+
+Toute interaction utilisateur interrompt la boucle : Streamlit lève
+l'exception de rerun au prochain appel st.* — ici le compte à rebours
+mis à jour chaque seconde.
+"""
+import time
+
+import pandas as pd
+
+
+def watermark_of(recent_ops, start_day=None):
+    """Filigrane (timestamp, op_id) de l'opération la plus récente
+
+    Sans opération, le filigrane part du début de la période (jamais du
+    début de l'historique).
+    """
+    if recent_ops.empty:
+        return (str(start_day) if start_day is not None else "", 0)
+    ordered = recent_ops.sort_values(['timestamp', 'op_id'] if 'op_id' in recent_ops else 'timestamp')
+    last = ordered.iloc[-1]
+    return (str(last['timestamp']), int(last.get('op_id', 0)))
+
+
+def within(delta, start, end):
+    """Opérations du delta comprises dans la période [start, end]"""
+    if delta.empty:
+        return delta
+    timestamps = pd.to_datetime(delta['timestamp'], format='ISO8601')
+    return delta[(timestamps >= start) & (timestamps <= end)]
+
+
+def fold_daily(daily_data, delta):
+    """Ajoute les nouvelles opérations aux agrégats journaliers"""
+    if delta.empty:
+        return daily_data
+    dates = pd.to_datetime(delta['timestamp'], format='ISO8601').dt.normalize()
+    grouped = delta.assign(date=dates).groupby('date').agg(
+        nb=('timestamp', 'size'), somme=('duree_minutes', 'sum'), nb_durees=('duree_minutes', 'count'),
+        urg=('urgence', 'sum'), err=('erreur', 'sum'),
+    )
+    current = daily_data.set_index('date') if not daily_data.empty else pd.DataFrame(
+        columns=['nb_operations', 'duree_moyenne', 'urgences', 'erreurs']
+    )
+    merged = current.join(grouped, how='outer')
+    old_nb = merged['nb_operations'].fillna(0)
+    old_sum = merged['duree_moyenne'].fillna(0) * old_nb
+    merged['nb_operations'] = (old_nb + merged['nb'].fillna(0)).astype(int)
+    # Moyenne pondérée ; les durées manquantes du delta ne comptent pas
+    weight = old_nb + merged['nb_durees'].fillna(0)
+    merged['duree_moyenne'] = ((old_sum + merged['somme'].fillna(0)) / weight.where(weight > 0))
+    merged['urgences'] = (merged['urgences'].fillna(0) + merged['urg'].fillna(0)).astype(int)
+    merged['erreurs'] = (merged['erreurs'].fillna(0) + merged['err'].fillna(0)).astype(int)
+    return merged[['nb_operations', 'duree_moyenne', 'urgences', 'erreurs']].rename_axis('date').reset_index()
+
+
+def run(refresh_rate, countdown, fetch, on_delta):
+    """Boucle d'actualisation ; ne rend jamais la main (interrompue par rerun)
+
+    countdown : placeholder mis à jour chaque seconde (point d'interruption)
+    fetch     : fonction retournant le DataFrame des nouvelles opérations
+    on_delta  : rappel appliquant un delta non vide aux panneaux en direct
+    """
+    while True:
+        for remaining in range(int(refresh_rate), 0, -1):
+            countdown.info(f"Prochain rafraîchissement dans {remaining}s")
+            time.sleep(1)
+        countdown.info("Actualisation…")
+        delta = fetch()
+        if not delta.empty:
+            on_delta(delta)
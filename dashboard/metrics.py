@@ -0,0 +1,207 @@
+"""Latences des sections du dashboard et des requêtes, exportées au format Prometheus.
+
+Deux façons de mesurer :
+- span(nom), gestionnaire de contexte autour d'un bloc (requêtes de
+  data_access) ;
+- section(nom), pour les sections de app.py écrites au niveau du module :
+  chaque appel clôt la section précédente du même rerun et ouvre la
+  suivante, end_rerun() clôt la dernière et mesure le rerun entier.
+
+Chaque mesure coûte deux lectures d'horloge et un ajout dans une file
+bornée (quelques microsecondes) : l'instrumentation reste active en
+production. Les quantiles (p50, p95, p99) sont calculés à l'export, sur
+les WINDOW dernières mesures de chaque nom.
+
+Export (un seul par processus, threads démon) :
+- PORTSEC_METRICS_FILE : fichier texte réécrit atomiquement toutes les
+  EXPORT_INTERVAL secondes (collecteur textfile de node_exporter) ;
+- PORTSEC_METRICS_PORT : endpoint HTTP /metrics.
+"""
+import os
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+
+WINDOW = 1024
+QUANTILES = (0.5, 0.95, 0.99)
+EXPORT_INTERVAL = 15
+METRIC = "portsec_span_seconds"
+
+
+class _Series:
+    """Dernières durées d'un nom (secondes), compteur et somme depuis le démarrage"""
+
+    __slots__ = ("samples", "count", "total")
+
+    def __init__(self):
+        self.samples = deque(maxlen=WINDOW)
+        self.count = 0
+        self.total = 0.0
+
+
+_series = {}
+_lock = threading.Lock()
+_local = threading.local()
+
+
+def record(name, seconds):
+    with _lock:
+        series = _series.get(name)
+        if series is None:
+            series = _series[name] = _Series()
+        series.samples.append(seconds)
+        series.count += 1
+        series.total += seconds
+    timings = getattr(_local, "timings", None)
+    if timings is not None:
+        timings.append((name, seconds))
+
+
+@contextmanager
+def span(name):
+    """Mesure le bloc, y compris s'il lève une exception"""
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        record(name, time.perf_counter() - started)
+
+
+# ========== SECTIONS D'UN RERUN ==========
+def begin_rerun():
+    """Début du script : les mesures du thread sont aussi gardées pour ce rerun"""
+    _local.timings = []
+    _local.section = None
+    _local.rerun_started = time.perf_counter()
+
+
+def section(name):
+    """Clôt la section en cours du rerun et ouvre la suivante"""
+    now = time.perf_counter()
+    current = getattr(_local, "section", None)
+    if current is not None:
+        record(current[0], now - current[1])
+    _local.section = (name, now)
+
+
+def end_rerun():
+    """Clôt la dernière section et mesure le rerun ; retourne les mesures du rerun"""
+    section(None)
+    _local.section = None
+    started = getattr(_local, "rerun_started", None)
+    if started is not None:
+        record("rerun", time.perf_counter() - started)
+        _local.rerun_started = None
+    return rerun_timings()
+
+
+def rerun_timings():
+    """Mesures (nom, secondes) du rerun en cours sur ce thread, dans l'ordre"""
+    return list(getattr(_local, "timings", None) or [])
+
+
+# ========== AGRÉGATS ==========
+def _quantile(ordered, q):
+    return ordered[min(int(q * len(ordered)), len(ordered) - 1)]
+
+
+def summary():
+    """{nom: {'p50', 'p95', 'p99', 'count', 'sum'}} en secondes, noms triés"""
+    with _lock:
+        snapshot = {name: (sorted(s.samples), s.count, s.total) for name, s in _series.items()}
+    result = {}
+    for name, (ordered, count, total) in sorted(snapshot.items()):
+        if not ordered:
+            continue
+        stats = {f"p{round(q * 100)}": _quantile(ordered, q) for q in QUANTILES}
+        stats.update(count=count, sum=total)
+        result[name] = stats
+    return result
+
+
+def reset():
+    with _lock:
+        _series.clear()
+
+
+# ========== EXPORT PROMETHEUS ==========
+def _label(value):
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def prometheus_text():
+    """Exposition texte Prometheus : un summary par span, quantiles sur la fenêtre glissante"""
+    lines = [
+        f"# HELP {METRIC} Durée des sections et requêtes du dashboard (fenêtre des {WINDOW} dernières mesures).",
+        f"# TYPE {METRIC} summary",
+    ]
+    for name, stats in summary().items():
+        label = _label(name)
+        for q in QUANTILES:
+            lines.append(f'{METRIC}{{span="{label}",quantile="{q}"}} {stats[f"p{round(q * 100)}"]:.6f}')
+        lines.append(f'{METRIC}_sum{{span="{label}"}} {stats["sum"]:.6f}')
+        lines.append(f'{METRIC}_count{{span="{label}"}} {stats["count"]}')
+    return "\n".join(lines) + "\n"
+
+
+def write_textfile(path):
+    """Réécrit le fichier atomiquement (un collecteur ne lit jamais un fichier partiel)"""
+    tmp = f"{path}.{os.getpid()}.tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        f.write(prometheus_text())
+    os.replace(tmp, path)
+
+
+def _serve(port):
+    """Endpoint /metrics dans un thread démon (http.server importé à la demande)"""
+    import http.server
+
+    class Handler(http.server.BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path.split("?")[0] != "/metrics":
+                self.send_error(404)
+                return
+            body = prometheus_text().encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass
+
+    server = http.server.ThreadingHTTPServer(("", int(port)), Handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name="metrics-http", daemon=True).start()
+    return server
+
+
+_exporter_started = False
+
+
+def start_exporter(path=None, port=None, interval=EXPORT_INTERVAL):
+    """Démarre l'export (une fois par processus) ; par défaut selon
+    PORTSEC_METRICS_FILE et PORTSEC_METRICS_PORT, rien si aucun n'est défini"""
+    global _exporter_started
+    path = path or os.environ.get("PORTSEC_METRICS_FILE")
+    port = port or os.environ.get("PORTSEC_METRICS_PORT")
+    with _lock:
+        if _exporter_started or not (path or port):
+            return False
+        _exporter_started = True
+
+    if path:
+        def export_loop():
+            while True:
+                time.sleep(interval)
+                try:
+                    write_textfile(path)
+                except OSError:
+                    pass  # répertoire indisponible : nouvel essai au tour suivant
+
+        threading.Thread(target=export_loop, name="metrics-textfile", daemon=True).start()
+    if port:
+        _serve(port)
+    return True
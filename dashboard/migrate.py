@@ -0,0 +1,196 @@
+"""Migrations versionnées de la base data/processed/portsec.db.
+
+La version courante est stockée dans PRAGMA user_version ; chaque
+migration n'est appliquée qu'une fois, dans l'ordre. Après migration, le
+journal passe en WAL (les lecteurs du dashboard ne bloquent plus
+l'ingestion) et chaque requête du dashboard est contrôlée par
+EXPLAIN QUERY PLAN.
+
+Usage :
+    python dashboard/migrate.py --db data/processed/portsec.db
+    python dashboard/migrate.py --check      # plans de requêtes seulement
+"""
+import argparse
+import re
+import sqlite3
+import sys
+from datetime import date, timedelta
+
+import alerts
+import anomalies
+import cube
+import data_access
+import fleet
+import partitions
+import positions
+import prefix_sums
+import rollups
+from filters import Filters
+
+# ========== MIGRATIONS ==========
+BASE_SCHEMA = """
+CREATE TABLE IF NOT EXISTS operations (
+    timestamp TEXT NOT NULL,
+    type_operation TEXT,
+    zone TEXT,
+    engin TEXT,
+    duree_minutes REAL,
+    urgence INTEGER DEFAULT 0,
+    erreur INTEGER DEFAULT 0
+);
+CREATE VIEW IF NOT EXISTS vue_operations_journalieres AS
+    SELECT DATE(timestamp) AS date, COUNT(*) AS nb_operations,
+           AVG(duree_minutes) AS duree_moyenne,
+           SUM(urgence) AS urgences, SUM(erreur) AS erreurs
+    FROM operations GROUP BY DATE(timestamp);
+CREATE VIEW IF NOT EXISTS vue_performance_engins AS
+    SELECT engin, COUNT(*) AS total_operations, SUM(erreur) AS erreurs,
+           AVG(duree_minutes) AS duree_moyenne
+    FROM operations GROUP BY engin;
+CREATE VIEW IF NOT EXISTS vue_analyse_horaire AS
+    SELECT CAST(strftime('%H', timestamp) AS INTEGER) AS heure,
+           COUNT(*) AS nb_operations
+    FROM operations GROUP BY 1;
+"""
+
+OPERATIONS_INDEXES = """
+CREATE INDEX IF NOT EXISTS idx_operations_timestamp ON operations (timestamp);
+CREATE INDEX IF NOT EXISTS idx_operations_engin_timestamp ON operations (engin, timestamp);
+CREATE INDEX IF NOT EXISTS idx_operations_zone_timestamp ON operations (zone, timestamp);
+"""
+
+
+def _script(sql):
+    def apply(conn):
+        conn.executescript(sql)
+    return apply
+
+
+# (version, description, fonction d'application) — ne jamais réordonner,
+# toujours ajouter à la fin.
+MIGRATIONS = [
+    (1, "Schéma de base (operations + vues)", _script(BASE_SCHEMA)),
+    (2, "Index timestamp, (engin, timestamp), (zone, timestamp)", _script(OPERATIONS_INDEXES)),
+    (3, "Tables de rollup et triggers", rollups.install),
+    (4, "Triggers de rollup suspendables pour l'ingestion en masse", rollups.install),
+    (5, "Positions des engins (historique + dernière position)", positions.install),
+    (6, "Cube jour × heure × zone × engin × type × statut", cube.install),
+    (7, "Sommes cumulées par jour (global, engin, zone)", prefix_sums.install),
+    (8, "Alertes déclenchées par le moteur de règles", alerts.install),
+    (9, "État EWMA des scores d'anomalie et point de reprise", anomalies.install),
+    (10, "Catalogue des partitions mensuelles d'operations", partitions.install),
+]
+
+
+def current_version(conn):
+    return conn.execute("PRAGMA user_version").fetchone()[0]
+
+
+def migrate(conn, log=print):
+    """Applique les migrations manquantes ; retourne la version finale"""
+    version = current_version(conn)
+    for target, description, apply in MIGRATIONS:
+        if target <= version:
+            continue
+        log(f"→ Migration {target} : {description}")
+        apply(conn)
+        # PRAGMA n'accepte pas de paramètre lié ; target est un entier interne
+        conn.execute(f"PRAGMA user_version = {int(target)}")
+        conn.commit()
+        version = target
+    return version
+
+
+def enable_wal(conn):
+    """Passe la base en journal WAL (persistant dans le fichier)"""
+    mode = conn.execute("PRAGMA journal_mode = WAL").fetchone()[0]
+    conn.execute("PRAGMA synchronous = NORMAL")
+    return mode
+
+
+# ========== CONTRÔLE DES PLANS DE REQUÊTE ==========
+# Un balayage complet de operations (sans index) fait échouer le contrôle ;
+# les tables de rollup sont de taille bornée et peuvent être parcourues.
+_FULL_SCAN = re.compile(r"\bSCAN (TABLE )?operations\b(?!.*INDEX)")
+_TEMP_SORT = re.compile(r"USE TEMP B-TREE FOR ORDER BY")
+_OPERATIONS = re.compile(r"\boperations\b")
+
+
+_SAMPLE_FILTERS = Filters.of(zones=["QUAI_1"], engin_types=["Tracteur"], urgences_only=True, show_errors=False)
+
+
+def _sample_params(name):
+    end_day = date.today()
+    return data_access._range_params(name, end_day - timedelta(days=30), end_day)
+
+
+def dashboard_queries(conn):
+    """Requêtes effectivement exécutées par le dashboard sur cette base"""
+    use_rollups = rollups.has_rollups(conn)
+    for name, sql in data_access.QUERIES.items():
+        if use_rollups and name in rollups.QUERIES:
+            sql = rollups.QUERIES[name]
+        yield name, sql.format(filters="", operations="operations"), _sample_params(name)
+    yield "delta", data_access.DELTA_QUERY.format(filters=""), (str(date.today()), 0, 5000)
+    yield "older", data_access.OLDER_QUERY.format(filters="", operations="operations"), (str(date.today()), 0, str(date.today() - timedelta(days=30)), 10)
+    # Variante filtrée : les prédicats poussés ne doivent pas casser l'usage des index
+    conditions, params = _SAMPLE_FILTERS.sql(rows=True)
+    yield "recent (filtré)", data_access.QUERIES["recent"].format(filters=conditions, operations="operations"), (*_sample_params("recent"), *params)
+    if use_rollups:
+        yield "watchlist", data_access.WATCHLIST_QUERY.format(source="rollup_engins"), (data_access.WATCHLIST_MIN_RATE, data_access.WATCHLIST_SIZE)
+    if cube.has_cube(conn):
+        yield "cube", cube.CELLS_QUERY, (cube.day_number(date.today() - timedelta(days=30)), cube.day_number(date.today()))
+        # Classement des engins (section 9) : sommes cumulées et cube filtré, page keyset
+        use_prefix_sums = prefix_sums.has_prefix_sums(conn)
+        period = (date.today() - timedelta(days=30), date.today())
+        yield ("classement", *fleet.ranking_query(*period, use_prefix_sums=use_prefix_sums))
+        yield ("classement (filtré)", *fleet.ranking_query(
+            *period, _SAMPLE_FILTERS, "taux_erreur", min_rate=data_access.WATCHLIST_MIN_RATE,
+            after=(5.0, "TRACTEUR_01"), use_prefix_sums=use_prefix_sums))
+    if prefix_sums.has_prefix_sums(conn):
+        yield "prefix_sums", prefix_sums.LOOKUP_QUERY, ("global", "", cube.day_number(date.today()))
+    if alerts.has_alerts(conn):
+        yield "alertes actives", alerts.ACTIVE_QUERY, (data_access.ALERTS_LIMIT,)
+    if anomalies.has_anomalies(conn):
+        yield "anomalies", anomalies.TOP_QUERY, (anomalies.MIN_STEPS, data_access.ANOMALIES_LIMIT)
+    if conn.execute("SELECT 1 FROM sqlite_master WHERE name = 'positions_latest'").fetchone():
+        yield ("positions_latest", *positions.latest_query(list(positions.ENGIN_TYPES)))
+        yield ("positions_tracks", *positions.tracks_query(list(positions.ENGIN_TYPES), str(date.today()), 200))
+
+
+def check_query_plans(conn, log=print):
+    """Affiche EXPLAIN QUERY PLAN de chaque requête ; True si toutes indexées"""
+    all_ok = True
+    for name, sql, params in dashboard_queries(conn):
+        plan = [row[-1] for row in conn.execute(f"EXPLAIN QUERY PLAN {sql}", params)]
+        ok = not any(_FULL_SCAN.search(line) for line in plan)
+        if _OPERATIONS.search(sql) and any(_TEMP_SORT.search(line) for line in plan):
+            ok = False
+        all_ok &= ok
+        log(f"{'✅' if ok else '❌'} {name}")
+        for line in plan:
+            log(f"     {line}")
+    return all_ok
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Migrations de la base PortSec")
+    parser.add_argument("--db", default=str(data_access.DB_PATH), help="Chemin de la base SQLite")
+    parser.add_argument("--check", action="store_true", help="Contrôler les plans sans migrer")
+    args = parser.parse_args(argv)
+
+    conn = sqlite3.connect(args.db)
+    try:
+        if not args.check:
+            before = current_version(conn)
+            after = migrate(conn)
+            mode = enable_wal(conn)
+            print(f"✅ Base en version {after} (était {before}), journal {mode}")
+        print("📋 Plans des requêtes du dashboard :")
+        return 0 if check_query_plans(conn) else 1
+    finally:
+        conn.close()
+
+
+if __name__ == "__main__":
+    sys.exit(main())
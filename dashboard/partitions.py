@@ -0,0 +1,366 @@
+"""Partitions mensuelles de la table operations, attachées à la demande.
+
+Les mois clos sont déplacés de portsec.db vers un fichier SQLite par mois
+(data/processed/partitions/operations_AAAA_MM.db, même schéma, rowid
+conservés). La table partitions de la base principale les catalogue avec
+leurs bornes de timestamp. Le déplacement se fait avec les triggers
+suspendus : rollups, cube et sommes cumulées gardent les totaux des mois
+détachés, les graphiques longue période continuent de les montrer sans
+jamais ouvrir les partitions.
+
+Les requêtes sur les lignes brutes (opérations récentes, pages du flux,
+série horaire sans cube) n'attachent, en lecture seule, que les
+partitions qui chevauchent la période demandée ; la source devient
+une union de main.operations et de leurs tables operations, dans
+laquelle SQLite pousse les prédicats (index sur timestamp de chaque
+fichier). Les partitions anciennes peuvent être compressées (gzip) puis
+archivées : elles ne sont alors plus lues, jusqu'à restauration.
+
+Le mois de la dernière opération reste toujours dans la base principale :
+les rowid ne sont jamais réutilisés.
+
+Usage :
+    python dashboard/partitions.py list
+    python dashboard/partitions.py detach                  # mois clos hors des HOT_MONTHS derniers
+    python dashboard/partitions.py detach --month 2026-03 --vacuum
+    python dashboard/partitions.py archive                 # partitions de plus de ARCHIVE_AFTER mois
+    python dashboard/partitions.py restore --month 2025-11
+    python dashboard/partitions.py merge --month 2026-03   # réintègre le mois dans la base
+"""
+import argparse
+import gzip
+import os
+import shutil
+import sqlite3
+import sys
+from contextlib import contextmanager
+from datetime import date
+from pathlib import Path
+
+HOT_MONTHS = 2
+ARCHIVE_AFTER = 12
+DIRECTORY = "partitions"
+# Limite de SQLite (SQLITE_MAX_ATTACHED) par connexion
+MAX_ATTACHED = 10
+COLUMNS = "timestamp, type_operation, zone, engin, duree_minutes, urgence, erreur"
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS partitions (
+    mois TEXT PRIMARY KEY,
+    fichier TEXT NOT NULL,
+    debut TEXT NOT NULL,
+    fin TEXT NOT NULL,
+    nb_operations INTEGER NOT NULL,
+    archivee INTEGER NOT NULL DEFAULT 0
+);
+"""
+
+# Schéma d'un fichier de partition (schéma {schema} attaché)
+PARTITION_SCHEMA = """
+CREATE TABLE IF NOT EXISTS {schema}.operations (
+    timestamp TEXT NOT NULL,
+    type_operation TEXT,
+    zone TEXT,
+    engin TEXT,
+    duree_minutes REAL,
+    urgence INTEGER DEFAULT 0,
+    erreur INTEGER DEFAULT 0
+);
+CREATE INDEX IF NOT EXISTS {schema}.idx_operations_timestamp ON operations (timestamp);
+CREATE INDEX IF NOT EXISTS {schema}.idx_operations_engin_timestamp ON operations (engin, timestamp);
+CREATE INDEX IF NOT EXISTS {schema}.idx_operations_zone_timestamp ON operations (zone, timestamp);
+"""
+
+# Partitions lisibles qui chevauchent [début, fin], plus récentes d'abord
+OVERLAP_QUERY = """
+    SELECT mois, fichier FROM partitions
+    WHERE archivee = 0 AND debut <= ? AND fin >= ?
+    ORDER BY mois DESC
+"""
+
+
+def has_partitions(conn):
+    """Indique si le catalogue des partitions existe dans la base"""
+    return conn.execute(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'partitions'"
+    ).fetchone() is not None
+
+
+def partitioned(conn):
+    """Des mois ont été détachés : operations ne contient plus tout l'historique"""
+    return has_partitions(conn) and conn.execute("SELECT 1 FROM partitions LIMIT 1").fetchone() is not None
+
+
+def check_complete(conn):
+    """Refuse un recalcul depuis operations quand des mois sont détachés"""
+    if partitioned(conn):
+        raise RuntimeError("Des mois sont détachés de operations (partitions.py merge avant tout recalcul)")
+
+
+def install(conn):
+    """Crée le catalogue des partitions"""
+    with conn:
+        conn.executescript(SCHEMA)
+
+
+# ========== MOIS ==========
+def _month_start(month):
+    return f"{month}-01"
+
+
+def _next_month(month):
+    year, number = int(month[:4]), int(month[5:7])
+    return f"{year + number // 12:04d}-{number % 12 + 1:02d}"
+
+
+def _months_before(month, count):
+    year, number = int(month[:4]), int(month[5:7]) - count
+    while number < 1:
+        year, number = year - 1, number + 12
+    return f"{year:04d}-{number:02d}"
+
+
+def _schema(month):
+    return f"part_{month.replace('-', '_')}"
+
+
+def partition_path(db_path, month):
+    return Path(db_path).parent / DIRECTORY / f"operations_{month.replace('-', '_')}.db"
+
+
+def _db_path(conn):
+    return Path(conn.execute("PRAGMA database_list").fetchone()[2])
+
+
+def main_months(conn):
+    """Mois présents dans la base principale (une recherche d'index par mois)"""
+    months = []
+    row = conn.execute("SELECT MIN(timestamp) FROM operations").fetchone()
+    while row[0] is not None:
+        month = str(row[0])[:7]
+        months.append(month)
+        row = conn.execute("SELECT MIN(timestamp) FROM operations WHERE timestamp >= ?",
+                           (_month_start(_next_month(month)),)).fetchone()
+    return months
+
+
+def _current_month(conn):
+    """Mois de la dernière opération insérée (jamais détaché)"""
+    row = conn.execute("SELECT timestamp FROM operations ORDER BY rowid DESC LIMIT 1").fetchone()
+    return str(row[0])[:7] if row else None
+
+
+# ========== DÉPLACEMENTS ==========
+@contextmanager
+def _suspended(conn):
+    """Triggers d'agrégats suspendus : les totaux ne bougent pas (même garde que l'ingestion)"""
+    suspend = conn.execute("SELECT 1 FROM sqlite_master WHERE name = 'rollup_suspension'").fetchone() is not None
+    if suspend:
+        conn.execute("UPDATE rollup_suspension SET actif = 1 WHERE id = 1")
+    try:
+        yield
+    finally:
+        if suspend:
+            conn.execute("UPDATE rollup_suspension SET actif = 0 WHERE id = 1")
+
+
+def detach(conn, month):
+    """Déplace les opérations du mois dans leur fichier de partition ; retourne leur nombre"""
+    if month == _current_month(conn):
+        raise ValueError(f"{month} contient la dernière opération : il reste dans la base")
+    if conn.execute("SELECT 1 FROM partitions WHERE mois = ?", (month,)).fetchone():
+        raise ValueError(f"{month} est déjà détaché (merge pour le réintégrer)")
+    bounds = (_month_start(month), _month_start(_next_month(month)))
+    where = "timestamp >= ? AND timestamp < ?"
+    path = partition_path(_db_path(conn), month)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    # Fichier absent du catalogue : reste d'un déplacement interrompu
+    path.unlink(missing_ok=True)
+
+    schema = _schema(month)
+    conn.execute("ATTACH DATABASE ? AS " + schema, (str(path),))
+    try:
+        # 1. Copie validée dans la partition ; 2. suppression et catalogue dans la base
+        with conn:
+            conn.executescript(PARTITION_SCHEMA.format(schema=schema))
+            copied = conn.execute(
+                f"INSERT INTO {schema}.operations (rowid, {COLUMNS}) "
+                f"SELECT rowid, {COLUMNS} FROM main.operations WHERE {where} ORDER BY rowid", bounds
+            ).rowcount
+        first, last = conn.execute(f"SELECT MIN(timestamp), MAX(timestamp) FROM {schema}.operations").fetchone()
+    finally:
+        conn.execute(f"DETACH DATABASE {schema}")
+    if not copied:
+        path.unlink()
+        return 0
+    with conn:
+        with _suspended(conn):
+            conn.execute(f"DELETE FROM operations WHERE {where}", bounds)
+        conn.execute(
+            "INSERT INTO partitions (mois, fichier, debut, fin, nb_operations) VALUES (?, ?, ?, ?, ?)",
+            (month, f"{DIRECTORY}/{path.name}", str(first), str(last), copied),
+        )
+    return copied
+
+
+def merge(conn, month):
+    """Réintègre une partition (non archivée) dans la base principale"""
+    row = conn.execute("SELECT fichier, archivee FROM partitions WHERE mois = ?", (month,)).fetchone()
+    if row is None:
+        raise ValueError(f"{month} n'est pas détaché")
+    if row[1]:
+        raise ValueError(f"{month} est archivé (restore d'abord)")
+    path = _db_path(conn).parent / row[0]
+    schema = _schema(month)
+    conn.execute("ATTACH DATABASE ? AS " + schema, (str(path),))
+    try:
+        with conn:
+            with _suspended(conn):
+                moved = conn.execute(
+                    f"INSERT INTO main.operations (rowid, {COLUMNS}) SELECT rowid, {COLUMNS} FROM {schema}.operations"
+                ).rowcount
+            conn.execute("DELETE FROM partitions WHERE mois = ?", (month,))
+    finally:
+        conn.execute(f"DETACH DATABASE {schema}")
+    path.unlink()
+    return moved
+
+
+def archive(conn, month):
+    """Compresse une partition (gzip) ; elle n'est plus lue jusqu'à restore"""
+    fichier, archivee = _catalogued(conn, month)
+    if archivee:
+        return False
+    path = _db_path(conn).parent / fichier
+    with open(path, 'rb') as source, gzip.open(f"{path}.gz", 'wb') as target:
+        shutil.copyfileobj(source, target)
+    with conn:
+        conn.execute("UPDATE partitions SET archivee = 1 WHERE mois = ?", (month,))
+    os.remove(path)
+    return True
+
+
+def restore(conn, month):
+    """Décompresse une partition archivée ; elle est de nouveau lue"""
+    fichier, archivee = _catalogued(conn, month)
+    if not archivee:
+        return False
+    path = _db_path(conn).parent / fichier
+    with gzip.open(f"{path}.gz", 'rb') as source, open(path, 'wb') as target:
+        shutil.copyfileobj(source, target)
+    with conn:
+        conn.execute("UPDATE partitions SET archivee = 0 WHERE mois = ?", (month,))
+    os.remove(f"{path}.gz")
+    return True
+
+
+def _catalogued(conn, month):
+    row = conn.execute("SELECT fichier, archivee FROM partitions WHERE mois = ?", (month,)).fetchone()
+    if row is None:
+        raise ValueError(f"{month} n'est pas détaché")
+    return row
+
+
+# ========== LECTURE ==========
+def overlapping(conn, start, end):
+    """Partitions lisibles chevauchant [start, end] (timestamps texte), plus récentes d'abord"""
+    return conn.execute(OVERLAP_QUERY, (end, start)).fetchall()
+
+
+def source_sql(schemas, main=True):
+    """Source 'operations' : la table, ou son union avec les partitions attachées"""
+    if not schemas:
+        return "operations"
+    # rowid AS rowid : les requêtes lisent rowid sur la source comme sur la table
+    tables = (["main"] if main else []) + list(schemas)
+    branches = [f"SELECT rowid{' AS rowid' if i == 0 else ''}, {COLUMNS} FROM {table}.operations"
+                for i, table in enumerate(tables)]
+    return f"({' UNION ALL '.join(branches)}) AS operations"
+
+
+def sources(conn, start, end):
+    """Sources 'operations' de la période, partitions attachées en lecture seule
+
+    Une connexion n'attache que MAX_ATTACHED bases : au-delà, la période est
+    lue en plusieurs passes de MAX_ATTACHED partitions (plus récentes
+    d'abord), main.operations dans la première seulement. L'appelant lance
+    sa requête sur chaque source et combine les résultats ; les partitions
+    d'une passe sont détachées avant la suivante.
+    """
+    parts = overlapping(conn, start, end) if has_partitions(conn) else []
+    base = _db_path(conn).parent
+    for first in range(0, max(len(parts), 1), MAX_ATTACHED):
+        schemas = []
+        try:
+            for month, fichier in parts[first:first + MAX_ATTACHED]:
+                schema = _schema(month)
+                conn.execute("ATTACH DATABASE ? AS " + schema, (f"{(base / fichier).resolve().as_uri()}?mode=ro",))
+                schemas.append(schema)
+            yield source_sql(schemas, main=first == 0)
+        finally:
+            for schema in schemas:
+                conn.execute(f"DETACH DATABASE {schema}")
+
+
+# ========== LIGNE DE COMMANDE ==========
+def _detach_candidates(conn, hot_months):
+    today = date.today().strftime("%Y-%m")
+    limit = _months_before(today, hot_months - 1)
+    current = _current_month(conn)
+    return [m for m in main_months(conn) if m < limit and m != current]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Partitions mensuelles des opérations PortSec")
+    parser.add_argument("command", choices=["list", "detach", "archive", "restore", "merge"])
+    parser.add_argument("--db", default="data/processed/portsec.db", help="Chemin de la base SQLite")
+    parser.add_argument("--month", help="Mois visé (AAAA-MM) ; sinon selon la politique de rétention")
+    parser.add_argument("--hot-months", type=int, default=HOT_MONTHS, help="Mois gardés dans la base (detach)")
+    parser.add_argument("--archive-after", type=int, default=ARCHIVE_AFTER, help="Âge en mois des partitions archivées")
+    parser.add_argument("--vacuum", action="store_true", help="VACUUM de la base après detach")
+    args = parser.parse_args(argv)
+
+    conn = sqlite3.connect(args.db)
+    try:
+        install(conn)
+        if args.command == "list":
+            for month in main_months(conn):
+                print(f"   {month}  base principale")
+            for month, fichier, first, last, count, archivee in conn.execute("SELECT * FROM partitions ORDER BY mois"):
+                state = "archivée (gzip)" if archivee else "attachable"
+                print(f"   {month}  {fichier} : {count:,} opérations, {state}")
+            return 0
+        if args.command in ("restore", "merge") and not args.month:
+            parser.error(f"{args.command} nécessite --month")
+
+        if args.command == "detach":
+            months = [args.month] if args.month else _detach_candidates(conn, args.hot_months)
+            for month in months:
+                print(f"✅ {month} : {detach(conn, month):,} opérations détachées")
+            if args.vacuum and months:
+                conn.execute("VACUUM")
+                print("✅ Base compactée (VACUUM)")
+        elif args.command == "archive":
+            if args.month:
+                months = [args.month]
+            else:
+                limit = _months_before(date.today().strftime("%Y-%m"), args.archive_after)
+                months = [m for (m,) in conn.execute("SELECT mois FROM partitions WHERE archivee = 0 AND mois < ?", (limit,))]
+            for month in months:
+                if archive(conn, month):
+                    print(f"✅ {month} archivé")
+        elif args.command == "restore":
+            if restore(conn, args.month):
+                print(f"✅ {args.month} restauré")
+        else:
+            print(f"✅ {args.month} : {merge(conn, args.month):,} opérations réintégrées")
+        return 0
+    except ValueError as e:
+        print(f"❌ {e}")
+        return 1
+    finally:
+        conn.close()
+
+
+if __name__ == "__main__":
+    sys.exit(main())
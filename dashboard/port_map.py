@@ -0,0 +1,228 @@
+"""Carte temps réel du port : fond statique en cache, couches dynamiques GeoJSON.
+
+Le fond (tuiles, périmètre, marqueurs de zones) est construit et sérialisé
+une seule fois par processus. Les couches qui changent (positions des
+engins, alertes, congestion) sont transmises sous forme de GeoJSON compact
+et ajoutées par un court script au document du fond. Le HTML final est
+mis en cache par contenu : tant que les couches ne changent pas, le rerun
+renvoie exactement le même document et le navigateur ne recharge pas
+l'iframe.
+"""
+import json
+from functools import lru_cache
+
+import numpy as np
+
+# Coordonnées de Kasumbalesa, RDC
+CENTER = [-11.664, 27.482]
+
+# Zones du port
+ZONES = {
+    'QUAI_1': {'lat': -11.664, 'lon': 27.482, 'color': 'blue', 'icon': 'ship'},
+    'QUAI_2_ROUTIER': {'lat': -11.663, 'lon': 27.483, 'color': 'green', 'icon': 'truck'},
+    'ZONE_STOCKAGE': {'lat': -11.665, 'lon': 27.481, 'color': 'orange', 'icon': 'boxes'},
+    'CONTROLE_DOUANE': {'lat': -11.662, 'lon': 27.484, 'color': 'red', 'icon': 'shield-alt'},
+    'MAINTENANCE': {'lat': -11.666, 'lon': 27.485, 'color': 'gray', 'icon': 'tools'}
+}
+
+# Périmètre du port
+PORT_PERIMETER = [
+    [-11.666, 27.480],
+    [-11.661, 27.480],
+    [-11.661, 27.486],
+    [-11.666, 27.486]
+]
+
+
+def _rectangle(lat, lon, half_lat=0.00045, half_lon=0.00045):
+    return [
+        [lat - half_lat, lon - half_lon],
+        [lat + half_lat, lon - half_lon],
+        [lat + half_lat, lon + half_lon],
+        [lat - half_lat, lon + half_lon],
+    ]
+
+
+# Emprise de chaque zone (polygone [lat, lon]) ; l'ordre fixe la priorité en cas de recouvrement
+ZONE_POLYGONS = {zone: _rectangle(info['lat'], info['lon']) for zone, info in ZONES.items()}
+
+
+def create_base_map():
+    """Crée la carte folium statique (fond, zones, périmètre)"""
+    import folium
+    from folium.plugins import MarkerCluster
+
+    m = folium.Map(location=CENTER, zoom_start=15, control_scale=True)
+
+    # Emprise des zones
+    for zone, polygon in ZONE_POLYGONS.items():
+        folium.Polygon(
+            locations=polygon,
+            color=ZONES[zone]['color'],
+            fill=True,
+            fill_opacity=0.05,
+            weight=1,
+            tooltip=zone
+        ).add_to(m)
+
+    # Ajout des marqueurs
+    for zone, info in ZONES.items():
+        folium.Marker(
+            location=[info['lat'], info['lon']],
+            popup=f'<b>{zone}</b><br>Statut: Normal<br>Activité: Élevée',
+            tooltip=zone,
+            icon=folium.Icon(color=info['color'], icon=info['icon'], prefix='fa')
+        ).add_to(m)
+
+    # Ajout d'un périmètre du port
+    folium.Polygon(
+        locations=PORT_PERIMETER,
+        color='#1E3A8A',
+        fill=True,
+        fill_color='#1E3A8A',
+        fill_opacity=0.1,
+        weight=2,
+        popup='Périmètre du Port Sec'
+    ).add_to(m)
+
+    # Groupe vide : charge le plugin Leaflet.markercluster utilisé par la couche des engins
+    MarkerCluster(name='Engins').add_to(m)
+
+    return m
+
+
+@lru_cache(maxsize=1)
+def base_map_document():
+    """HTML du fond de carte et nom de la variable JS de la carte (une fois par processus)"""
+    m = create_base_map()
+    return m.get_root().render(), m.get_name()
+
+
+# ========== COUCHES DYNAMIQUES ==========
+def _point(lat, lon, **properties):
+    return {
+        'type': 'Feature',
+        'geometry': {'type': 'Point', 'coordinates': [round(lon, 6), round(lat, 6)]},
+        'properties': properties,
+    }
+
+
+def congestion_layer(recent_ops):
+    """Cercles d'activité par zone, proportionnels aux opérations récentes"""
+    if recent_ops.empty:
+        return []
+    counts = recent_ops['zone'].astype(str).value_counts()
+    peak = counts.max()
+    features = []
+    for zone, count in counts.items():
+        info = ZONES.get(zone)
+        if info is None:
+            continue
+        level = count / peak
+        color = '#DC2626' if level > 0.66 else '#F59E0B' if level > 0.33 else '#10B981'
+        features.append(_point(info['lat'], info['lon'], kind='congestion', radius=int(40 + 80 * level),
+                               color=color, label=f"{zone}: {count} opérations récentes"))
+    return features
+
+
+def alert_layer(recent_ops):
+    """Zones ayant des urgences ou erreurs parmi les opérations récentes"""
+    if recent_ops.empty:
+        return []
+    flagged = recent_ops.groupby(recent_ops['zone'].astype(str))[['urgence', 'erreur']].sum()
+    flagged = flagged[(flagged['urgence'] > 0) | (flagged['erreur'] > 0)]
+    features = []
+    for zone, row in flagged.iterrows():
+        info = ZONES.get(zone)
+        if info is None:
+            continue
+        features.append(_point(info['lat'] + 0.0003, info['lon'], kind='alert',
+                               label=f"⚠️ {zone}: {int(row['urgence'])} urgences, {int(row['erreur'])} erreurs"))
+    return features
+
+
+ENGIN_COLORS = {'TRACTEUR': '#2563EB', 'CHARIOT': '#F59E0B', 'GRUE': '#7C3AED', 'CAMION': '#059669'}
+
+
+def _engin_color(engin):
+    return ENGIN_COLORS.get(str(engin).split('_')[0], '#1E3A8A')
+
+
+def engin_layer(positions):
+    """Dernière position de chaque engin (regroupées en clusters côté navigateur)"""
+    return [
+        _point(lat, lon, kind='engin', color=_engin_color(engin), label=f"{engin} · {zone} · {timestamp[11:16]}")
+        for engin, timestamp, lat, lon, zone in positions[['engin', 'timestamp', 'lat', 'lon', 'zone']].itertuples(index=False)
+    ]
+
+
+def track_layer(tracks):
+    """Trajets récents : une polyligne par engin"""
+    features = []
+    for engin, group in tracks.groupby('engin', sort=False):
+        if len(group) < 2:
+            continue
+        coordinates = np.round(group[['lon', 'lat']].to_numpy(), 6).tolist()
+        features.append({
+            'type': 'Feature',
+            'geometry': {'type': 'LineString', 'coordinates': coordinates},
+            'properties': {'kind': 'track', 'color': _engin_color(engin), 'label': engin},
+        })
+    return features
+
+
+def dynamic_geojson(layers):
+    """Sérialisation compacte et stable (clé de cache) des couches dynamiques"""
+    collection = {'type': 'FeatureCollection', 'features': [f for layer in layers for f in layer]}
+    return json.dumps(collection, separators=(',', ':'), ensure_ascii=False, sort_keys=True)
+
+
+_LAYER_SCRIPT = """
+<script>
+(function() {
+    var map = %(map)s;
+    var data = %(data)s;
+    var engins = {type: 'FeatureCollection', features: data.features.filter(function(f) { return f.properties.kind === 'engin'; })};
+    var others = {type: 'FeatureCollection', features: data.features.filter(function(f) { return f.properties.kind !== 'engin'; })};
+    var tooltip = function(feature, layer) {
+        if (feature.properties.label) { layer.bindTooltip(feature.properties.label); }
+    };
+    if (engins.features.length) {
+        var cluster = L.markerClusterGroup({chunkedLoading: true, disableClusteringAtZoom: 19});
+        cluster.addLayer(L.geoJSON(engins, {
+            pointToLayer: function(feature, latlng) {
+                return L.circleMarker(latlng, {radius: 5, color: feature.properties.color, fillOpacity: 0.9, weight: 1});
+            },
+            onEachFeature: tooltip
+        }));
+        map.addLayer(cluster);
+    }
+    L.geoJSON(others, {
+        style: function(feature) {
+            return {color: feature.properties.color || '#1E3A8A', weight: 2, opacity: 0.7};
+        },
+        pointToLayer: function(feature, latlng) {
+            var p = feature.properties;
+            if (p.kind === 'congestion') {
+                return L.circle(latlng, {radius: p.radius, color: p.color, fillColor: p.color, fillOpacity: 0.25, weight: 1});
+            }
+            if (p.kind === 'alert') {
+                return L.circleMarker(latlng, {radius: 7, color: '#DC2626', fillColor: '#EF4444', fillOpacity: 0.9});
+            }
+            return L.circleMarker(latlng, {radius: 4, color: p.color || '#1E3A8A', fillOpacity: 0.8});
+        },
+        onEachFeature: tooltip
+    }).addTo(map);
+})();
+</script>
+"""
+
+
+@lru_cache(maxsize=32)
+def map_document(geojson):
+    """Document HTML complet : fond en cache + script des couches dynamiques"""
+    html, map_name = base_map_document()
+    # '</' échappé : le GeoJSON ne peut pas fermer la balise <script>
+    script = _LAYER_SCRIPT % {'map': map_name, 'data': geojson.replace('</', '<\\/')}
+    head, sep, tail = html.rpartition('</html>')
+    return head + script + sep + tail if sep else html + script
@@ -0,0 +1,289 @@
+"""Suivi des positions des engins et index spatial des zones du port.
+
+Les pings (engin, timestamp, lat, lon) sont reçus par lots via
+ingest_pings : chaque lot est affecté aux zones en une passe vectorisée
+grâce à une grille régulière qui ne teste, pour chaque point, que les
+polygones recoupant sa cellule. Les pings sont historisés dans la table
+positions et la dernière position de chaque engin est tenue à jour dans
+positions_latest, que la carte lit directement.
+
+Usage :
+    python dashboard/positions.py ingest pings.csv
+    python dashboard/positions.py simulate --engins 2000 --steps 30
+"""
+import argparse
+import sys
+import time
+from datetime import datetime, timedelta
+
+import numpy as np
+import pandas as pd
+
+import data_access
+import port_map
+from filters import ENGIN_TYPES, engin_type_predicate
+
+PING_COLUMNS = ['engin', 'timestamp', 'lat', 'lon']
+HORS_ZONE = 'CIRCULATION'
+HORS_PORT = 'HORS_PORT'
+# Les positions bougent en continu : cache de quelques secondes seulement
+POSITIONS_TTL = 5
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS positions (
+    engin TEXT NOT NULL,
+    timestamp TEXT NOT NULL,
+    lat REAL NOT NULL,
+    lon REAL NOT NULL,
+    zone TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_positions_engin_timestamp ON positions (engin, timestamp);
+CREATE INDEX IF NOT EXISTS idx_positions_timestamp ON positions (timestamp);
+CREATE TABLE IF NOT EXISTS positions_latest (
+    engin TEXT PRIMARY KEY,
+    timestamp TEXT NOT NULL,
+    lat REAL NOT NULL,
+    lon REAL NOT NULL,
+    zone TEXT
+);
+"""
+
+def install(conn):
+    conn.executescript(SCHEMA)
+
+
+# ========== INDEX SPATIAL ==========
+def points_in_polygon(lat, lon, polygon):
+    """Test du rayon (ray casting) vectorisé sur tous les points"""
+    inside = np.zeros(len(lat), dtype=bool)
+    vertices = np.asarray(polygon, dtype=float)
+    for (lat1, lon1), (lat2, lon2) in zip(vertices, np.roll(vertices, -1, axis=0)):
+        crosses = (lat1 > lat) != (lat2 > lat)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            lon_cross = lon1 + (lat - lat1) * (lon2 - lon1) / (lat2 - lat1)
+        inside ^= crosses & (lon < lon_cross)
+    return inside
+
+
+class ZoneIndex:
+    """Grille régulière sur l'emprise du port ; chaque cellule liste ses polygones candidats"""
+
+    def __init__(self, zones, perimeter, grid_size=32):
+        self.names = list(zones)
+        self.polygons = [np.asarray(zones[name], dtype=float) for name in self.names]
+        self.perimeter = np.asarray(perimeter, dtype=float)
+        self.grid_size = grid_size
+        all_vertices = np.vstack(self.polygons + [self.perimeter])
+        self.lat_min, self.lon_min = all_vertices.min(axis=0)
+        lat_max, lon_max = all_vertices.max(axis=0)
+        self.lat_step = (lat_max - self.lat_min) / grid_size
+        self.lon_step = (lon_max - self.lon_min) / grid_size
+        # candidates[cellule, polygone] : la boîte du polygone recoupe la cellule
+        self.candidates = np.zeros((grid_size * grid_size, len(self.polygons)), dtype=bool)
+        for p, polygon in enumerate(self.polygons):
+            (r0, c0), (r1, c1) = self._cell(polygon.min(axis=0)), self._cell(polygon.max(axis=0))
+            rows, cols = np.meshgrid(np.arange(r0, r1 + 1), np.arange(c0, c1 + 1), indexing='ij')
+            self.candidates[(rows * grid_size + cols).ravel(), p] = True
+
+    def _cell(self, point):
+        row = int(np.clip((point[0] - self.lat_min) // self.lat_step, 0, self.grid_size - 1))
+        col = int(np.clip((point[1] - self.lon_min) // self.lon_step, 0, self.grid_size - 1))
+        return row, col
+
+    def assign(self, lat, lon):
+        """Nom de zone de chaque point (premier polygone englobant, sinon hors zone)"""
+        lat = np.asarray(lat, dtype=float)
+        lon = np.asarray(lon, dtype=float)
+        rows = np.floor((lat - self.lat_min) / self.lat_step).astype(int)
+        cols = np.floor((lon - self.lon_min) / self.lon_step).astype(int)
+        in_grid = (rows >= 0) & (rows < self.grid_size) & (cols >= 0) & (cols < self.grid_size)
+        cells = np.where(in_grid, rows * self.grid_size + cols, 0)
+
+        labels = np.full(len(lat), len(self.names), dtype=int)
+        unassigned = in_grid.copy()
+        for p, polygon in enumerate(self.polygons):
+            idx = np.flatnonzero(unassigned & self.candidates[cells, p])
+            if len(idx) == 0:
+                continue
+            hit = idx[points_in_polygon(lat[idx], lon[idx], polygon)]
+            labels[hit] = p
+            unassigned[hit] = False
+
+        names = np.array(self.names + [HORS_ZONE], dtype=object)[labels]
+        outside = labels == len(self.names)
+        if outside.any():
+            idx = np.flatnonzero(outside)
+            off_site = idx[~points_in_polygon(lat[idx], lon[idx], self.perimeter)]
+            names[off_site] = HORS_PORT
+        return names
+
+
+_zone_index = None
+
+
+def zone_index():
+    """Index des zones du port (construit une fois par processus)"""
+    global _zone_index
+    if _zone_index is None:
+        _zone_index = ZoneIndex(port_map.ZONE_POLYGONS, port_map.PORT_PERIMETER)
+    return _zone_index
+
+
+# ========== INGESTION DES PINGS ==========
+def ingest_pings(conn, pings):
+    """Affecte un lot de pings aux zones, l'historise et met à jour les dernières positions"""
+    missing = [c for c in PING_COLUMNS if c not in pings.columns]
+    if missing:
+        raise ValueError(f"Colonnes manquantes : {', '.join(missing)}")
+    if pings.empty:
+        return 0
+    pings = pings[PING_COLUMNS].dropna()
+    stamps = pd.to_datetime(pings['timestamp'], format='ISO8601').dt.strftime('%Y-%m-%d %H:%M:%S')
+    zones = zone_index().assign(pings['lat'].to_numpy(), pings['lon'].to_numpy())
+    rows = list(zip(pings['engin'].astype(str), stamps, pings['lat'].astype(float),
+                    pings['lon'].astype(float), zones))
+
+    # Dernier ping de chaque engin dans le lot
+    order = np.lexsort((stamps.to_numpy(), pings['engin'].astype(str).to_numpy()))
+    engins_sorted = pings['engin'].astype(str).to_numpy()[order]
+    last = order[np.append(engins_sorted[1:] != engins_sorted[:-1], True)]
+    latest = [rows[i] for i in last]
+
+    with conn:
+        conn.executemany(
+            "INSERT INTO positions (engin, timestamp, lat, lon, zone) VALUES (?, ?, ?, ?, ?)", rows
+        )
+        conn.executemany(
+            "INSERT INTO positions_latest (engin, timestamp, lat, lon, zone) VALUES (?, ?, ?, ?, ?) "
+            "ON CONFLICT(engin) DO UPDATE SET timestamp = excluded.timestamp, lat = excluded.lat, "
+            "lon = excluded.lon, zone = excluded.zone WHERE excluded.timestamp >= positions_latest.timestamp",
+            latest,
+        )
+    return len(rows)
+
+
+# ========== LECTURE POUR LA CARTE ==========
+LATEST_QUERY = "SELECT engin, timestamp, lat, lon, zone FROM positions_latest WHERE {predicate}"
+
+TRACKS_QUERY = """
+SELECT engin, timestamp, lat, lon FROM positions
+WHERE engin IN (
+    SELECT engin FROM positions_latest
+    WHERE {predicate} AND timestamp >= ?
+    ORDER BY timestamp DESC LIMIT ?
+) AND timestamp >= ?
+ORDER BY engin, timestamp
+"""
+
+
+def latest_query(engin_types):
+    predicate, params = engin_type_predicate(engin_types)
+    return LATEST_QUERY.format(predicate=predicate), params
+
+
+def tracks_query(engin_types, since, max_engins):
+    predicate, params = engin_type_predicate(engin_types)
+    return TRACKS_QUERY.format(predicate=predicate), [*params, since, max_engins, since]
+
+
+def _read(sql, params, db_path):
+    with data_access.get_pool(db_path).connection() as conn:
+        return pd.read_sql_query(sql, conn, params=params)
+
+
+def latest_positions(engin_types, db_path=data_access.DB_PATH):
+    """Dernière position de chaque engin des types sélectionnés (cache court par types)"""
+    types = tuple(sorted(set(engin_types)))
+    return data_access.cached(
+        (str(db_path), "positions_latest", types), POSITIONS_TTL,
+        lambda: _read(*latest_query(types), db_path),
+    )
+
+
+def recent_tracks(engin_types, minutes=30, max_engins=200, db_path=data_access.DB_PATH):
+    """Trajets récents (pings des dernières minutes) des engins sélectionnés"""
+    types = tuple(sorted(set(engin_types)))
+
+    def compute():
+        since = (datetime.now() - timedelta(minutes=minutes)).strftime('%Y-%m-%d %H:%M:%S')
+        return _read(*tracks_query(types, since, max_engins), db_path)
+
+    return data_access.cached((str(db_path), "positions_tracks", types, minutes, max_engins), POSITIONS_TTL, compute)
+
+
+def select_types(pings, engin_types):
+    """Pings des engins des types sélectionnés (équivalent en mémoire du prédicat SQL)"""
+    prefixes = tuple(ENGIN_TYPES[t] for t in engin_types if t in ENGIN_TYPES)
+    return pings[pings['engin'].astype(str).str.startswith(prefixes)] if prefixes else pings.iloc[0:0]
+
+
+def latest_of(pings):
+    """Dernier ping de chaque engin, zone affectée"""
+    latest = pings.sort_values('timestamp').drop_duplicates('engin', keep='last').reset_index(drop=True)
+    return latest.assign(zone=zone_index().assign(latest['lat'].to_numpy(), latest['lon'].to_numpy()))
+
+
+def has_positions(db_path=data_access.DB_PATH):
+    with data_access.get_pool(db_path).connection() as conn:
+        return conn.execute(
+            "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'positions_latest'"
+        ).fetchone() is not None
+
+
+# ========== SIMULATION ==========
+def simulate_pings(n_engins, n_steps, start=None, interval_s=10, seed=2026):
+    """Marche aléatoire vectorisée de n_engins dans le périmètre du port"""
+    rng = np.random.default_rng(seed)
+    start = start or datetime.now() - timedelta(seconds=n_steps * interval_s)
+    perimeter = np.asarray(port_map.PORT_PERIMETER)
+    (lat_min, lon_min), (lat_max, lon_max) = perimeter.min(axis=0), perimeter.max(axis=0)
+    kinds = np.array(list(ENGIN_TYPES.values()))[rng.integers(0, len(ENGIN_TYPES), n_engins)]
+    engins = np.char.add(kinds.astype(str), np.char.zfill(np.arange(1, n_engins + 1).astype(str), 4))
+
+    steps = rng.normal(0, 0.00005, (n_steps, n_engins, 2))
+    origin = np.column_stack([rng.uniform(lat_min, lat_max, n_engins), rng.uniform(lon_min, lon_max, n_engins)])
+    path = origin + np.cumsum(steps, axis=0)
+    path[..., 0] = np.clip(path[..., 0], lat_min, lat_max)
+    path[..., 1] = np.clip(path[..., 1], lon_min, lon_max)
+
+    stamps = pd.Timestamp(start) + pd.to_timedelta(np.arange(n_steps) * interval_s, unit='s')
+    return pd.DataFrame({
+        'engin': np.tile(engins, n_steps),
+        'timestamp': np.repeat(stamps.to_numpy(), n_engins),
+        'lat': path[..., 0].ravel(),
+        'lon': path[..., 1].ravel(),
+    })
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Positions des engins PortSec")
+    sub = parser.add_subparsers(dest="command", required=True)
+    ingest_cmd = sub.add_parser("ingest", help="Ingérer des fichiers de pings")
+    ingest_cmd.add_argument("files", nargs="+")
+    simulate_cmd = sub.add_parser("simulate", help="Générer des pings simulés")
+    simulate_cmd.add_argument("--engins", type=int, default=500)
+    simulate_cmd.add_argument("--steps", type=int, default=30)
+    parser.add_argument("--db", default=str(data_access.DB_PATH), help="Chemin de la base SQLite")
+    args = parser.parse_args(argv)
+
+    import ingest
+
+    conn = ingest.connect(args.db)
+    try:
+        started = time.perf_counter()
+        total = 0
+        if args.command == "simulate":
+            total = ingest_pings(conn, simulate_pings(args.engins, args.steps))
+        else:
+            for path in args.files:
+                for chunk in ingest.read_chunks(path):
+                    total += ingest_pings(conn, chunk)
+        elapsed = time.perf_counter() - started
+        print(f"✅ {total:,} pings ingérés en {elapsed:.1f}s ({total / max(elapsed, 1e-9):,.0f} pings/s)")
+        return 0
+    finally:
+        conn.close()
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,269 @@
+"""Sommes cumulées par jour : agrégat de n'importe quelle période en O(1).
+
+prefix_sums garde, pour chaque portée (global, engin, zone) et chaque
+jour ayant des opérations, les totaux cumulés depuis le premier jour.
+Le total d'une période [a, b] vaut P(b) - P(a - 1), où P(j) est la
+dernière ligne de jour <= j : deux recherches dans la clé primaire et une
+soustraction, quelle que soit la longueur de la période.
+
+L'ajout d'opérations au jour j décale toutes les lignes de jour >= j ; en
+pratique l'ingestion ajoute au jour courant et ne touche qu'une ligne par
+clé. Maintenue par des triggers (garde de suspension des rollups) et par
+le repli ensembliste des lots d'ingestion.
+
+Usage :
+    python dashboard/prefix_sums.py install --db data/processed/portsec.db
+    python dashboard/prefix_sums.py rebuild
+    python dashboard/prefix_sums.py verify
+"""
+import argparse
+import sqlite3
+import sys
+import time
+from bisect import bisect_right
+
+import cube
+import partitions
+import rollups
+
+MEASURES = ("nb_operations", "somme_duree", "nb_durees", "urgences", "erreurs")
+
+# Portée -> expression de la clé sur une ligne {r} d'operations
+SCOPES = {
+    "global": "''",
+    "engin": "COALESCE({r}engin, '')",
+    "zone": "COALESCE({r}zone, '')",
+}
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS prefix_sums (
+    scope TEXT NOT NULL,
+    cle TEXT NOT NULL,
+    jour INTEGER NOT NULL,
+    nb_operations INTEGER NOT NULL DEFAULT 0,
+    somme_duree REAL NOT NULL DEFAULT 0,
+    nb_durees INTEGER NOT NULL DEFAULT 0,
+    urgences INTEGER NOT NULL DEFAULT 0,
+    erreurs INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (scope, cle, jour)
+) WITHOUT ROWID;
+"""
+
+# Valeurs des mesures pour une ligne {r} d'operations, signe {s}
+_ROW_VALUES = (
+    "{s}1", "{s}COALESCE({r}duree_minutes, 0)", "{s}({r}duree_minutes IS NOT NULL)",
+    "{s}(COALESCE({r}urgence, 0) != 0)", "{s}(COALESCE({r}erreur, 0) != 0)",
+)
+
+
+def _previous(measure, scope, cle, jour):
+    # Cumul du dernier jour strictement antérieur (0 s'il n'existe pas)
+    return (f"COALESCE((SELECT p.{measure} FROM prefix_sums AS p WHERE p.scope = {scope} "
+            f"AND p.cle = {cle} AND p.jour < {jour} ORDER BY p.jour DESC LIMIT 1), 0)")
+
+
+def _seed(scope, cle, jour):
+    """Crée la ligne (scope, cle, jour) si besoin, initialisée au cumul précédent"""
+    previous = ", ".join(_previous(m, scope, cle, jour) for m in MEASURES)
+    return (f"INSERT OR IGNORE INTO prefix_sums (scope, cle, jour, {', '.join(MEASURES)}) "
+            f"VALUES ({scope}, {cle}, {jour}, {previous});")
+
+
+def _fold(r, s):
+    jour = cube._JOUR.format(r=f"{r}.")
+    statements = []
+    for scope, key in SCOPES.items():
+        cle = key.format(r=f"{r}.")
+        deltas = ", ".join(
+            f"{m} = {m} + {v.format(r=f'{r}.', s=s)}" for m, v in zip(MEASURES, _ROW_VALUES)
+        )
+        statements.append(_seed(f"'{scope}'", cle, jour))
+        statements.append(
+            f"UPDATE prefix_sums SET {deltas} WHERE scope = '{scope}' AND cle = {cle} AND jour >= {jour};"
+        )
+    return "\n".join(statements)
+
+
+TRIGGERS = f"""
+DROP TRIGGER IF EXISTS trg_prefix_sums_insert;
+DROP TRIGGER IF EXISTS trg_prefix_sums_delete;
+DROP TRIGGER IF EXISTS trg_prefix_sums_update;
+CREATE TRIGGER trg_prefix_sums_insert AFTER INSERT ON operations {rollups._ACTIVE} BEGIN
+{_fold("NEW", "")}
+END;
+CREATE TRIGGER trg_prefix_sums_delete AFTER DELETE ON operations {rollups._ACTIVE} BEGIN
+{_fold("OLD", "-")}
+END;
+CREATE TRIGGER trg_prefix_sums_update AFTER UPDATE ON operations {rollups._ACTIVE} BEGIN
+{_fold("OLD", "-")}
+{_fold("NEW", "")}
+END;
+"""
+
+# Totaux journaliers d'une source par portée (lot d'ingestion ou operations)
+_DAILY = " UNION ALL ".join(
+    f"""SELECT '{scope}' AS scope, {key.format(r='')} AS cle, {cube._JOUR.format(r='')} AS jour,
+               {', '.join(f"SUM({v.format(r='', s='')}) AS {m}" for m, v in zip(MEASURES, _ROW_VALUES))}
+        FROM {{source}} GROUP BY 2, 3"""
+    for scope, key in SCOPES.items()
+)
+
+DELTA_TABLE = "temp.prefix_delta"
+
+# Paliers du lot : pour chaque clé, cumul des deltas du lot à chacun de ses
+# jours, valable jusqu'au jour suivant du lot (fin exclue)
+_STEPS = f"""
+    SELECT scope, cle, jour, LEAD(jour, 1, 2147483647) OVER (PARTITION BY scope, cle ORDER BY jour) AS fin,
+           {', '.join(f"SUM({m}) OVER (PARTITION BY scope, cle ORDER BY jour) AS {m}" for m in MEASURES)}
+    FROM ({_DAILY.format(source="{source}")})
+"""
+
+# Chaque ligne de jour >= au premier jour du lot reçoit le palier qui la
+# couvre : parcours des paliers, recherche de plage dans la clé primaire
+_FOLD_STEPS = f"""
+    UPDATE prefix_sums SET {', '.join(f"{m} = prefix_sums.{m} + s.{m}" for m in MEASURES)}
+    FROM {DELTA_TABLE} AS s
+    WHERE prefix_sums.scope = s.scope AND prefix_sums.cle = s.cle
+      AND prefix_sums.jour >= s.jour AND prefix_sums.jour < s.fin
+"""
+
+REBUILD = f"""
+    DELETE FROM prefix_sums;
+    INSERT INTO prefix_sums (scope, cle, jour, {', '.join(MEASURES)})
+    SELECT scope, cle, jour,
+           {', '.join(f"SUM({m}) OVER (PARTITION BY scope, cle ORDER BY jour) AS {m}" for m in MEASURES)}
+    FROM ({_DAILY.format(source="operations")});
+"""
+
+# Lecture : cumul au dernier jour <= ? pour une clé
+LOOKUP_QUERY = f"""
+    SELECT {', '.join(MEASURES)} FROM prefix_sums
+    WHERE scope = ? AND cle = ? AND jour <= ?
+    ORDER BY jour DESC LIMIT 1
+"""
+
+
+def has_prefix_sums(conn):
+    """Indique si la table des sommes cumulées existe dans la base"""
+    return conn.execute(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'prefix_sums'"
+    ).fetchone() is not None
+
+
+def install(conn):
+    """Crée la table et (re)crée les triggers ; reconstruit si neuve"""
+    fresh = not has_prefix_sums(conn)
+    with conn:
+        conn.executescript(SCHEMA)
+        conn.executescript(TRIGGERS)
+    if fresh:
+        rebuild(conn)
+    return fresh
+
+
+def rebuild(conn):
+    """Recalcule intégralement les sommes cumulées depuis la table operations"""
+    partitions.check_complete(conn)
+    conn.executescript("BEGIN;" + REBUILD + "COMMIT;")
+
+
+def fold_staged(conn, staging):
+    """Replie une table de lot (après rollups.insert_staged, même transaction)
+
+    Coût proportionnel au lot et aux jours postérieurs à son premier jour,
+    jamais à la taille de prefix_sums.
+    """
+    conn.execute(f"DROP TABLE IF EXISTS {DELTA_TABLE}")
+    conn.execute(f"CREATE TABLE {DELTA_TABLE} AS {_STEPS.format(source=staging)}")
+    # 1. Jours absents : ligne initialisée au cumul précédent
+    previous = ", ".join(_previous(m, "s.scope", "s.cle", "s.jour") for m in MEASURES)
+    conn.execute(
+        f"INSERT OR IGNORE INTO prefix_sums (scope, cle, jour, {', '.join(MEASURES)}) "
+        f"SELECT s.scope, s.cle, s.jour, {previous} FROM {DELTA_TABLE} AS s"
+    )
+    # 2. Chaque ligne reçoit la somme des deltas des jours <= au sien
+    conn.execute(_FOLD_STEPS)
+    conn.execute(f"DROP TABLE {DELTA_TABLE}")
+
+
+def range_totals(conn, start_day, end_day, scope="global", keys=("",)):
+    """Totaux de la période [start_day, end_day] : deux recherches par clé"""
+    totals = dict.fromkeys(MEASURES, 0)
+    first, last = cube.day_number(start_day), cube.day_number(end_day)
+    for key in keys:
+        upper = conn.execute(LOOKUP_QUERY, (scope, key, last)).fetchone()
+        if upper is None:
+            continue
+        lower = conn.execute(LOOKUP_QUERY, (scope, key, first - 1)).fetchone() or (0,) * len(MEASURES)
+        for measure, high, low in zip(MEASURES, upper, lower):
+            totals[measure] += high - low
+    return totals
+
+
+def verify(conn):
+    """Compare les sommes cumulées à un recalcul complet ; retourne les écarts"""
+    partitions.check_complete(conn)
+    expected_sql = f"""
+        SELECT scope, cle, jour,
+               {', '.join(f"SUM({m}) OVER (PARTITION BY scope, cle ORDER BY jour)" for m in MEASURES)}
+        FROM ({_DAILY.format(source="operations")})
+        ORDER BY scope, cle, jour
+    """
+    series = {}
+    for row in conn.execute(expected_sql):
+        days, values = series.setdefault(row[:2], ([], []))
+        days.append(row[2])
+        values.append(row[3:])
+    stored = {row[:3]: row[3:] for row in conn.execute(
+        f"SELECT scope, cle, jour, {', '.join(MEASURES)} FROM prefix_sums"
+    )}
+    missing = [key + tuple(values[i]) for key, (days, values) in series.items()
+               for i, day in enumerate(days) if key + (day,) not in stored]
+    # Chaque ligne stockée doit valoir le cumul attendu à son jour (un jour
+    # vidé de ses opérations garde le cumul du jour précédent)
+    wrong = []
+    for (scope, cle, jour), values in stored.items():
+        days, expected = series.get((scope, cle), ([], []))
+        i = bisect_right(days, jour) - 1
+        if not rollups._same_row(values, expected[i] if i >= 0 else (0,) * len(MEASURES)):
+            wrong.append((scope, cle, jour) + tuple(values))
+    if missing or wrong:
+        return {"prefix_sums": {"manquants": missing, "en_trop": wrong}}
+    return {}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Gestion des sommes cumulées PortSec")
+    parser.add_argument("command", choices=["install", "rebuild", "verify"])
+    parser.add_argument("--db", default="data/processed/portsec.db", help="Chemin de la base SQLite")
+    args = parser.parse_args(argv)
+
+    conn = sqlite3.connect(args.db)
+    try:
+        started = time.perf_counter()
+        if args.command == "install":
+            fresh = install(conn)
+            print(f"✅ Sommes cumulées installées ({'reconstruites' if fresh else 'déjà présentes'})")
+        elif args.command == "rebuild":
+            rebuild(conn)
+            print("✅ Sommes cumulées reconstruites")
+        else:
+            mismatches = verify(conn)
+            if mismatches:
+                diff = mismatches["prefix_sums"]
+                print(f"❌ prefix_sums: {len(diff['manquants'])} lignes manquantes, "
+                      f"{len(diff['en_trop'])} lignes en trop")
+                return 1
+            print("✅ Sommes cumulées cohérentes avec la table operations")
+        print(f"   ({time.perf_counter() - started:.2f}s)")
+        return 0
+    except RuntimeError as e:
+        # Mois détachés (partitions.py) : recalcul depuis operations impossible
+        print(f"❌ {e}")
+        return 1
+    finally:
+        conn.close()
+
+
+if __name__ == "__main__":
+    sys.exit(main())
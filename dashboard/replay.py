@@ -0,0 +1,295 @@
+"""Rejeu accéléré d'opérations dans la base, de bout en bout.
+
+Des opérations historiques (lues dans une base source) ou générées par
+synthetic.py sont réémises au rythme de leurs horodatages d'origine,
+accéléré de 1× à 1000×. Chaque opération est réhorodatée à son instant
+d'émission prévu puis écrite par ingest.write_batch : rollups, cube,
+sommes cumulées, moteur d'alertes et scores d'anomalie suivent, et le
+dashboard la voit arriver dans son flux en direct (section 14).
+
+Les événements dus au même moment sont écrits dans une seule
+transaction : à vitesse élevée les lots grossissent au lieu de prendre du
+retard. Le rejeu sert ainsi de générateur de charge : il rapporte le
+débit soutenu (événements/s) et le retard d'écriture (instant prévu ->
+commit, donc visible par les lecteurs) ; le dashboard mesure de son côté
+la latence événement -> écran (metrics.py).
+
+Le rejeu n'écrit jamais dans la base de production : sa cible par défaut
+est la base de démonstration (DEMO_DB_PATH), recopiée depuis la
+production à chaque lancement (--copy-from, bouton du dashboard). Les
+opérations rejouées, alertes et scores restent dans la copie ; la
+session qui lance la démonstration lit ensuite cette copie.
+
+Usage :
+    python dashboard/replay.py --speed 100 --copy-from data/processed/portsec.db
+    python dashboard/replay.py --speed 1000 --rows 1000000       # charge : ~11 600 évts/s
+    python dashboard/replay.py --source archive.db --start 2026-01-05 --end 2026-01-06 --speed 60
+"""
+import argparse
+import sqlite3
+import sys
+import threading
+import time
+from collections import deque
+from datetime import date, datetime, timedelta
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+import alerts
+import data_access
+import ingest
+import metrics
+import synthetic
+
+MIN_SPEED, MAX_SPEED = 1, 1000
+TICK = 0.2
+CHUNK_SIZE = 50_000
+LAG_WINDOW = 10_000
+REPORT_EVERY = 5.0
+# Bouton de démonstration : la journée synthétique depuis 6 h, en 9 minutes
+DEMO_SPEED = 120
+DEMO_START_HOUR = 6
+# Base de démonstration, à côté de la production (mêmes fichiers de partitions)
+DEMO_DB_PATH = data_access.DB_PATH.with_name("portsec_demo.db")
+
+
+def is_production(db_path):
+    return Path(db_path).resolve() == data_access.DB_PATH.resolve()
+
+
+def copy_database(source, target=DEMO_DB_PATH):
+    """Remplace target par une copie cohérente de source (API de sauvegarde SQLite, WAL compris)"""
+    if is_production(target):
+        raise ValueError(f"Le rejeu n'écrit pas dans la base de production : {target}")
+    Path(target).parent.mkdir(parents=True, exist_ok=True)
+    src = sqlite3.connect(f"{Path(source).resolve().as_uri()}?mode=ro", uri=True)
+    dst = sqlite3.connect(str(target), timeout=30)
+    try:
+        src.backup(dst)
+    finally:
+        src.close()
+        dst.close()
+    # Résultats et indicateurs de schéma de l'ancienne copie
+    data_access.clear_cache()
+
+
+# ========== SOURCES ==========
+def synthetic_chunks(day=None, n_rows=None, seed=None, start_hour=0, batch_size=CHUNK_SIZE):
+    """Une journée d'opérations synthétiques (la veille par défaut) à partir de start_hour, par lots chronologiques"""
+    day = day or date.today() - timedelta(days=1)
+    start = datetime.combine(day, datetime.min.time())
+    seed = synthetic.SEED + day.toordinal() if seed is None else seed
+    begin = pd.Timestamp(start + timedelta(hours=start_hour))
+    for batch in synthetic.generate_operations(start, start + timedelta(days=1, seconds=-1), n_rows, seed, batch_size):
+        batch = batch[batch['timestamp'] >= begin]
+        if not batch.empty:
+            yield batch
+
+
+def historical_chunks(source_db, start_day, end_day, batch_size=CHUNK_SIZE):
+    """Opérations d'une base source sur [start_day, end_day], par pages keyset chronologiques"""
+    conn = sqlite3.connect(f"file:{source_db}?mode=ro", uri=True)
+    try:
+        last = (str(start_day), 0)
+        end = str(datetime.combine(end_day, datetime.max.time()))
+        while True:
+            page = pd.read_sql_query(
+                "SELECT rowid AS op_id, timestamp, type_operation, zone, engin, duree_minutes, urgence, erreur "
+                "FROM operations WHERE (timestamp, rowid) > (?, ?) AND timestamp <= ? "
+                "ORDER BY timestamp, rowid LIMIT ?",
+                conn, params=(*last, end, batch_size),
+            )
+            if page.empty:
+                return
+            last = (page['timestamp'].iloc[-1], int(page['op_id'].iloc[-1]))
+            rows, _ = ingest.validate(page)
+            yield rows
+    finally:
+        conn.close()
+
+
+# ========== MESURES ==========
+class ReplayStats:
+    """Débit et retard d'écriture du rejeu (lu par le dashboard pendant l'exécution)"""
+
+    def __init__(self, speed):
+        self.speed = speed
+        self.events = 0
+        self.batches = 0
+        self.started = time.perf_counter()
+        self.finished = None
+        self._lags = deque(maxlen=LAG_WINDOW)
+        self._lock = threading.Lock()
+
+    def add(self, n, lag):
+        with self._lock:
+            self.events += n
+            self.batches += 1
+            self._lags.append(lag)
+        metrics.record("rejeu : retard d'écriture", lag)
+
+    def snapshot(self):
+        with self._lock:
+            lags = sorted(self._lags)
+            events, batches = self.events, self.batches
+        elapsed = (self.finished or time.perf_counter()) - self.started
+        quantile = lambda q: lags[min(int(q * len(lags)), len(lags) - 1)] if lags else 0.0
+        return {
+            'vitesse': self.speed, 'evenements': events, 'lots': batches, 'secondes': elapsed,
+            'evenements_s': events / elapsed if elapsed > 0 else 0.0,
+            'retard_p50': quantile(0.5), 'retard_p95': quantile(0.95), 'retard_max': lags[-1] if lags else 0.0,
+            'termine': self.finished is not None,
+        }
+
+
+def describe(snapshot):
+    return (f"{snapshot['evenements']:,} événements en {snapshot['secondes']:.1f}s "
+            f"({snapshot['evenements_s']:,.0f}/s, {snapshot['lots']:,} lots), "
+            f"retard d'écriture p50 {snapshot['retard_p50'] * 1000:.0f} ms, "
+            f"p95 {snapshot['retard_p95'] * 1000:.0f} ms, max {snapshot['retard_max'] * 1000:.0f} ms")
+
+
+# ========== REJEU ==========
+def replay(conn, chunks, speed=DEMO_SPEED, tick=TICK, duration=None, stop=None, stats=None, log=print):
+    """Réémet les opérations de chunks (triées par timestamp) à speed fois leur rythme d'origine
+
+    Chaque opération est réhorodatée à son instant d'émission prévu ; les
+    opérations dues sont écrites ensemble par ingest.write_batch. S'arrête
+    à la fin des données, après duration secondes ou quand stop est levé.
+    """
+    if not MIN_SPEED <= speed <= MAX_SPEED:
+        raise ValueError(f"Vitesse hors bornes : {speed} (de {MIN_SPEED} à {MAX_SPEED})")
+    alert_engine = alerts.AlertEngine.for_connection(conn)
+    scorer = ingest.load_scorer(conn)
+    stats = stats or ReplayStats(speed)
+    origin = None
+    clock0 = pd.Timestamp.now()
+    stats.started = wall0 = time.perf_counter()
+    next_report = REPORT_EVERY
+    try:
+        for chunk in chunks:
+            if chunk.empty:
+                continue
+            source_s = chunk['timestamp'].to_numpy().astype('datetime64[ms]').astype(np.int64) / 1000
+            if origin is None:
+                origin = source_s[0]
+            due = (source_s - origin) / speed
+            i = 0
+            while i < len(chunk):
+                elapsed = time.perf_counter() - wall0
+                if (stop is not None and stop.is_set()) or (duration is not None and elapsed >= duration):
+                    return stats
+                j = int(np.searchsorted(due, elapsed, side='right'))
+                if j == i:
+                    time.sleep(min(tick, due[i] - elapsed))
+                    continue
+                batch = chunk.iloc[i:j].assign(timestamp=clock0 + pd.to_timedelta(due[i:j], unit='s'))
+                ingest.write_batch(conn, batch, alert_engine=alert_engine, scorer=scorer)
+                # Retard du plus ancien événement du lot : prévu -> validé
+                stats.add(j - i, time.perf_counter() - wall0 - due[i])
+                i = j
+                if time.perf_counter() - wall0 >= next_report:
+                    next_report += REPORT_EVERY
+                    log(f"   {describe(stats.snapshot())}, {len(alert_engine.active)} alertes actives")
+        return stats
+    finally:
+        stats.finished = time.perf_counter()
+
+
+# ========== REJEU EN ARRIÈRE-PLAN (DASHBOARD) ==========
+class BackgroundReplay:
+    """Rejeu dans un thread démon, avec sa propre connexion d'écriture"""
+
+    def __init__(self, db_path, chunks, speed):
+        self.db_path = Path(db_path)
+        self.stats = ReplayStats(speed)
+        self.error = None
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, args=(db_path, chunks, speed), name="replay", daemon=True)
+        self._thread.start()
+
+    def _run(self, db_path, chunks, speed):
+        try:
+            conn = ingest.connect(db_path)
+            try:
+                replay(conn, chunks, speed, stop=self._stop, stats=self.stats, log=lambda message: None)
+            finally:
+                conn.close()
+        except Exception as e:
+            self.error = e
+
+    @property
+    def running(self):
+        return self._thread.is_alive()
+
+    def stop(self):
+        self._stop.set()
+
+
+_background = None
+_background_lock = threading.Lock()
+
+
+def start_background(source=data_access.DB_PATH, db_path=DEMO_DB_PATH, speed=DEMO_SPEED):
+    """Lance le rejeu d'une journée synthétique dans une copie fraîche de source,
+    sauf s'il en tourne déjà un dans le processus (la copie en cours est gardée)"""
+    global _background
+    with _background_lock:
+        if _background is None or not _background.running:
+            copy_database(source, db_path)
+            _background = BackgroundReplay(db_path, synthetic_chunks(start_hour=DEMO_START_HOUR), speed)
+        return _background
+
+
+def current():
+    """Dernier rejeu lancé par le dashboard (en cours ou terminé), None sinon"""
+    return _background
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Rejeu accéléré d'opérations PortSec")
+    parser.add_argument("--db", default=str(DEMO_DB_PATH), help="Base cible (écriture), jamais la production")
+    parser.add_argument("--copy-from", help="Base recopiée dans la cible avant le rejeu (ex. la production)")
+    parser.add_argument("--speed", type=float, default=DEMO_SPEED, help=f"Accélération ({MIN_SPEED} à {MAX_SPEED})")
+    parser.add_argument("--source", help="Base historique à rejouer (sinon données synthétiques)")
+    parser.add_argument("--start", type=date.fromisoformat, help="Premier jour rejoué (base source)")
+    parser.add_argument("--end", type=date.fromisoformat, help="Dernier jour rejoué (base source)")
+    parser.add_argument("--day", type=date.fromisoformat, help="Journée synthétique générée (défaut : la veille)")
+    parser.add_argument("--rows", type=int, help="Nombre d'opérations synthétiques de la journée")
+    parser.add_argument("--start-hour", type=int, default=0, help="Heure de départ de la journée synthétique")
+    parser.add_argument("--duration", type=float, help="Arrêt après ce nombre de secondes")
+    args = parser.parse_args(argv)
+
+    if not MIN_SPEED <= args.speed <= MAX_SPEED:
+        parser.error(f"--speed doit être compris entre {MIN_SPEED} et {MAX_SPEED}")
+    if is_production(args.db):
+        parser.error(f"{args.db} est la base de production : rejouer dans une copie (--copy-from)")
+    if args.source:
+        if not (args.start and args.end):
+            parser.error("--source nécessite --start et --end")
+        chunks = historical_chunks(args.source, args.start, args.end)
+    else:
+        chunks = synthetic_chunks(args.day, args.rows, start_hour=args.start_hour)
+
+    if args.copy_from:
+        copy_database(args.copy_from, args.db)
+        print(f"📋 {args.copy_from} copiée dans {args.db}")
+    conn = ingest.connect(args.db)
+    try:
+        print(f"▶️  Rejeu à {args.speed:g}× vers {args.db}")
+        stats = ReplayStats(args.speed)
+        try:
+            replay(conn, chunks, args.speed, duration=args.duration, stats=stats)
+        except KeyboardInterrupt:
+            print(f"⏹️  Interrompu : {describe(stats.snapshot())}")
+            return 1
+        print(f"✅ {describe(stats.snapshot())}")
+        return 0
+    finally:
+        conn.close()
+
+
+if __name__ == "__main__":
+    sys.exit(main())
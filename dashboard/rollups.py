@@ -0,0 +1,307 @@
+"""Tables d'agrégats (rollups) maintenues incrémentalement.
+
+Remplacent la lecture des vues vue_operations_journalieres,
+vue_performance_engins et vue_analyse_horaire, qui rebalaient toute la
+table operations à chaque requête. Des triggers replient chaque ligne
+insérée ou supprimée dans les agrégats ; une page "3 derniers mois" ne
+lit plus que 90 lignes de rollup_journalier.
+
+Usage :
+    python dashboard/rollups.py install --db data/processed/portsec.db
+    python dashboard/rollups.py rebuild
+    python dashboard/rollups.py verify
+"""
+import argparse
+import sqlite3
+import sys
+import time
+
+import partitions
+
+ROLLUP_TABLES = ("rollup_journalier", "rollup_engins", "rollup_horaire")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS rollup_journalier (
+    date TEXT PRIMARY KEY,
+    nb_operations INTEGER NOT NULL DEFAULT 0,
+    somme_duree REAL NOT NULL DEFAULT 0,
+    nb_durees INTEGER NOT NULL DEFAULT 0,
+    urgences INTEGER NOT NULL DEFAULT 0,
+    erreurs INTEGER NOT NULL DEFAULT 0
+);
+CREATE TABLE IF NOT EXISTS rollup_engins (
+    engin TEXT PRIMARY KEY,
+    total_operations INTEGER NOT NULL DEFAULT 0,
+    somme_duree REAL NOT NULL DEFAULT 0,
+    nb_durees INTEGER NOT NULL DEFAULT 0,
+    erreurs INTEGER NOT NULL DEFAULT 0
+);
+CREATE TABLE IF NOT EXISTS rollup_horaire (
+    heure INTEGER PRIMARY KEY,
+    nb_operations INTEGER NOT NULL DEFAULT 0
+);
+CREATE TABLE IF NOT EXISTS rollup_suspension (
+    id INTEGER PRIMARY KEY CHECK (id = 1),
+    actif INTEGER NOT NULL DEFAULT 0
+);
+INSERT OR IGNORE INTO rollup_suspension (id, actif) VALUES (1, 0);
+"""
+
+# Un trigger par sens : +1 à l'insertion, -1 à la suppression.
+# Une mise à jour est repliée comme suppression puis insertion.
+# L'ingestion en masse suspend les triggers le temps d'une transaction et
+# replie le lot entier d'un coup (voir insert_staged).
+_FOLD = """
+    INSERT INTO rollup_journalier (date, nb_operations, somme_duree, nb_durees, urgences, erreurs)
+    VALUES (DATE({r}.timestamp), {s}1, {s}COALESCE({r}.duree_minutes, 0),
+            {s}({r}.duree_minutes IS NOT NULL), {s}COALESCE({r}.urgence, 0), {s}COALESCE({r}.erreur, 0))
+    ON CONFLICT(date) DO UPDATE SET
+        nb_operations = nb_operations + excluded.nb_operations,
+        somme_duree = somme_duree + excluded.somme_duree,
+        nb_durees = nb_durees + excluded.nb_durees,
+        urgences = urgences + excluded.urgences,
+        erreurs = erreurs + excluded.erreurs;
+    INSERT INTO rollup_engins (engin, total_operations, somme_duree, nb_durees, erreurs)
+    VALUES ({r}.engin, {s}1, {s}COALESCE({r}.duree_minutes, 0),
+            {s}({r}.duree_minutes IS NOT NULL), {s}COALESCE({r}.erreur, 0))
+    ON CONFLICT(engin) DO UPDATE SET
+        total_operations = total_operations + excluded.total_operations,
+        somme_duree = somme_duree + excluded.somme_duree,
+        nb_durees = nb_durees + excluded.nb_durees,
+        erreurs = erreurs + excluded.erreurs;
+    INSERT INTO rollup_horaire (heure, nb_operations)
+    VALUES (CAST(strftime('%H', {r}.timestamp) AS INTEGER), {s}1)
+    ON CONFLICT(heure) DO UPDATE SET
+        nb_operations = nb_operations + excluded.nb_operations;
+"""
+
+_ACTIVE = "WHEN (SELECT actif FROM rollup_suspension WHERE id = 1) = 0"
+
+TRIGGERS = f"""
+DROP TRIGGER IF EXISTS trg_rollups_insert;
+DROP TRIGGER IF EXISTS trg_rollups_delete;
+DROP TRIGGER IF EXISTS trg_rollups_update;
+CREATE TRIGGER trg_rollups_insert AFTER INSERT ON operations {_ACTIVE} BEGIN
+{_FOLD.format(r="NEW", s="")}
+END;
+CREATE TRIGGER trg_rollups_delete AFTER DELETE ON operations {_ACTIVE} BEGIN
+{_FOLD.format(r="OLD", s="-")}
+END;
+CREATE TRIGGER trg_rollups_update AFTER UPDATE ON operations {_ACTIVE} BEGIN
+{_FOLD.format(r="OLD", s="-")}
+{_FOLD.format(r="NEW", s="")}
+END;
+"""
+
+# Agrégation ensembliste d'une source ({source} : operations ou table
+# de lot), commune au recalcul complet et au repli d'un lot d'ingestion
+_AGGREGATE = {
+    "rollup_journalier": """
+        INSERT INTO rollup_journalier (date, nb_operations, somme_duree, nb_durees, urgences, erreurs)
+        SELECT DATE(timestamp), COUNT(*), COALESCE(SUM(duree_minutes), 0), COUNT(duree_minutes),
+               COALESCE(SUM(urgence), 0), COALESCE(SUM(erreur), 0)
+        FROM {source} WHERE 1 GROUP BY DATE(timestamp)
+    """,
+    "rollup_engins": """
+        INSERT INTO rollup_engins (engin, total_operations, somme_duree, nb_durees, erreurs)
+        SELECT engin, COUNT(*), COALESCE(SUM(duree_minutes), 0), COUNT(duree_minutes),
+               COALESCE(SUM(erreur), 0)
+        FROM {source} WHERE 1 GROUP BY engin
+    """,
+    "rollup_horaire": """
+        INSERT INTO rollup_horaire (heure, nb_operations)
+        SELECT CAST(strftime('%H', timestamp) AS INTEGER), COUNT(*)
+        FROM {source} WHERE 1 GROUP BY 1
+    """,
+}
+_MERGE = {
+    "rollup_journalier": """
+        ON CONFLICT(date) DO UPDATE SET
+            nb_operations = nb_operations + excluded.nb_operations,
+            somme_duree = somme_duree + excluded.somme_duree,
+            nb_durees = nb_durees + excluded.nb_durees,
+            urgences = urgences + excluded.urgences,
+            erreurs = erreurs + excluded.erreurs
+    """,
+    "rollup_engins": """
+        ON CONFLICT(engin) DO UPDATE SET
+            total_operations = total_operations + excluded.total_operations,
+            somme_duree = somme_duree + excluded.somme_duree,
+            nb_durees = nb_durees + excluded.nb_durees,
+            erreurs = erreurs + excluded.erreurs
+    """,
+    "rollup_horaire": """
+        ON CONFLICT(heure) DO UPDATE SET
+            nb_operations = nb_operations + excluded.nb_operations
+    """,
+}
+
+# Recalcul complet depuis operations (même sémantique que les triggers)
+REBUILD = "".join(
+    f"DELETE FROM {table};" + _AGGREGATE[table].format(source="operations") + ";"
+    for table in ROLLUP_TABLES
+)
+
+# Colonnes exposées au dashboard, identiques à celles des vues
+QUERIES = {
+    "daily": """
+        SELECT date, nb_operations,
+               somme_duree / NULLIF(nb_durees, 0) AS duree_moyenne,
+               urgences, erreurs
+        FROM rollup_journalier
+        WHERE date BETWEEN ? AND ? AND nb_operations > 0
+        ORDER BY date
+    """,
+    "engins": """
+        SELECT engin, total_operations, erreurs,
+               somme_duree / NULLIF(nb_durees, 0) AS duree_moyenne
+        FROM rollup_engins
+        WHERE total_operations > 0
+    """,
+    "hourly": """
+        SELECT heure, nb_operations
+        FROM rollup_horaire
+        WHERE nb_operations > 0
+        ORDER BY heure
+    """,
+}
+
+# Contrôle : agrégats attendus, recalculés depuis operations
+_EXPECTED = {
+    "rollup_journalier": """
+        SELECT DATE(timestamp), COUNT(*), COALESCE(SUM(duree_minutes), 0),
+               COUNT(duree_minutes), COALESCE(SUM(urgence), 0), COALESCE(SUM(erreur), 0)
+        FROM operations GROUP BY DATE(timestamp)
+    """,
+    "rollup_engins": """
+        SELECT engin, COUNT(*), COALESCE(SUM(duree_minutes), 0),
+               COUNT(duree_minutes), COALESCE(SUM(erreur), 0)
+        FROM operations GROUP BY engin
+    """,
+    "rollup_horaire": """
+        SELECT CAST(strftime('%H', timestamp) AS INTEGER), COUNT(*)
+        FROM operations GROUP BY 1
+    """,
+}
+_STORED = {
+    "rollup_journalier": """
+        SELECT date, nb_operations, somme_duree, nb_durees, urgences, erreurs
+        FROM rollup_journalier WHERE nb_operations != 0
+    """,
+    "rollup_engins": """
+        SELECT engin, total_operations, somme_duree, nb_durees, erreurs
+        FROM rollup_engins WHERE total_operations != 0
+    """,
+    "rollup_horaire": """
+        SELECT heure, nb_operations FROM rollup_horaire WHERE nb_operations != 0
+    """,
+}
+
+
+def _same_row(a, b):
+    # Les sommes de durées accumulées ligne à ligne divergent de SUM()
+    # par erreurs d'arrondi : comparaison avec tolérance relative.
+    for x, y in zip(a, b):
+        if isinstance(x, float) or isinstance(y, float):
+            if abs(x - y) > 1e-6 * max(1.0, abs(x), abs(y)):
+                return False
+        elif x != y:
+            return False
+    return True
+
+
+def has_rollups(conn):
+    """Indique si les tables de rollup existent dans la base"""
+    placeholders = ",".join("?" * len(ROLLUP_TABLES))
+    count = conn.execute(
+        f"SELECT COUNT(*) FROM sqlite_master WHERE type = 'table' AND name IN ({placeholders})",
+        ROLLUP_TABLES,
+    ).fetchone()[0]
+    return count == len(ROLLUP_TABLES)
+
+
+def install(conn):
+    """Crée les tables et (re)crée les triggers ; reconstruit si neuves"""
+    fresh = not has_rollups(conn)
+    with conn:
+        conn.executescript(SCHEMA)
+        conn.executescript(TRIGGERS)
+    if fresh:
+        rebuild(conn)
+    return fresh
+
+
+def rebuild(conn):
+    """Recalcule intégralement les rollups depuis la table operations"""
+    partitions.check_complete(conn)
+    conn.executescript("BEGIN;" + REBUILD + "COMMIT;")
+
+
+def insert_staged(conn, staging):
+    """Copie une table de lot dans operations et replie le lot en une passe
+
+    À appeler dans la transaction de l'appelant : les triggers ligne à ligne
+    sont suspendus puis réactivés avant la validation, les autres écrivains
+    ne voient jamais l'état suspendu.
+    """
+    columns = "timestamp, type_operation, zone, engin, duree_minutes, urgence, erreur"
+    conn.execute("UPDATE rollup_suspension SET actif = 1 WHERE id = 1")
+    try:
+        conn.execute(f"INSERT INTO operations ({columns}) SELECT {columns} FROM {staging}")
+        for table in ROLLUP_TABLES:
+            conn.execute(_AGGREGATE[table].format(source=staging) + _MERGE[table])
+    finally:
+        conn.execute("UPDATE rollup_suspension SET actif = 0 WHERE id = 1")
+
+
+def verify(conn):
+    """Compare les rollups à un recalcul complet ; retourne les écarts"""
+    partitions.check_complete(conn)
+    mismatches = {}
+    for table, expected_sql in _EXPECTED.items():
+        expected = {row[0]: row for row in conn.execute(expected_sql)}
+        stored = {row[0]: row for row in conn.execute(_STORED[table])}
+        missing = [row for key, row in expected.items()
+                   if key not in stored or not _same_row(row, stored[key])]
+        extra = [row for key, row in stored.items()
+                 if key not in expected or not _same_row(row, expected[key])]
+        if missing or extra:
+            mismatches[table] = {"manquants": missing, "en_trop": extra}
+    return mismatches
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Gestion des tables de rollup PortSec")
+    parser.add_argument("command", choices=["install", "rebuild", "verify"])
+    parser.add_argument("--db", default="data/processed/portsec.db", help="Chemin de la base SQLite")
+    args = parser.parse_args(argv)
+
+    conn = sqlite3.connect(args.db)
+    try:
+        started = time.perf_counter()
+        if args.command == "install":
+            fresh = install(conn)
+            print(f"✅ Rollups installés ({'reconstruits' if fresh else 'déjà présents'})")
+        elif args.command == "rebuild":
+            rebuild(conn)
+            print("✅ Rollups reconstruits")
+        else:
+            mismatches = verify(conn)
+            if mismatches:
+                for table, diff in mismatches.items():
+                    print(f"❌ {table}: {len(diff['manquants'])} lignes manquantes, "
+                          f"{len(diff['en_trop'])} lignes en trop")
+                return 1
+            print("✅ Rollups cohérents avec la table operations")
+        print(f"   ({time.perf_counter() - started:.2f}s)")
+        return 0
+    except RuntimeError as e:
+        # Mois détachés (partitions.py) : recalcul depuis operations impossible
+        print(f"❌ {e}")
+        return 1
+    finally:
+        conn.close()
+
+
+if __name__ == "__main__":
+    sys.exit(main())
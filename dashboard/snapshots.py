@@ -0,0 +1,265 @@
+"""Instantanés pré-calculés du dashboard, publiés par un processus séparé.
+
+Le worker calcule, pour les périodes prédéfinies de la barre latérale et
+sans filtre, tous les jeux de données de la page (séries journalières et
+horaires, répartition par heure, engins, totaux des KPIs, engins à
+surveiller) ainsi que les alertes actives, les scores d'anomalie et les
+recommandations. Chaque jeu est écrit en Arrow IPC dans un répertoire de
+version, puis la version est publiée atomiquement en remplaçant le
+fichier CURRENT (os.replace) : un lecteur voit l'ancienne ou la nouvelle
+version, jamais un mélange.
+
+Le dashboard ouvre les fichiers par pa.memory_map : les tables Arrow
+pointent directement dans les pages du fichier, partagées par toutes les
+sessions du processus (et par le cache disque de l'OS). Un rerun ne coûte
+que la lecture de CURRENT.
+
+Usage :
+    python dashboard/snapshots.py publish --db data/processed/portsec.db
+    python dashboard/snapshots.py run --interval 60   # boucle du worker
+"""
+import argparse
+import json
+import os
+import shutil
+import sys
+import threading
+import time
+from datetime import date, datetime, timedelta
+from pathlib import Path
+
+import pandas as pd
+
+import data_access
+
+try:
+    import pyarrow as pa
+    import pyarrow.ipc
+except ImportError:  # lecture directe dans SQLite sans instantané
+    pa = None
+
+SNAPSHOT_DIR = Path("data/snapshots")
+POINTER = "CURRENT"
+KEEP_VERSIONS = 3
+# Au-delà, l'instantané est ignoré (worker arrêté) et la page relit SQLite
+MAX_AGE = 300
+
+# Libellé de la barre latérale -> nombre de jours avant aujourd'hui
+PERIODS = {
+    "7 derniers jours": 7,
+    "30 derniers jours": 30,
+    "3 derniers mois": 90,
+}
+PERIOD_DATASETS = ("daily", "engins", "hourly", "activity_hourly", "watchlist", "totals", "recommendations")
+
+
+def period_range(days, today=None):
+    today = today or date.today()
+    return today - timedelta(days=days), today
+
+
+# ========== RECOMMANDATIONS ==========
+def recommendations_of(engins_data, hourly_data):
+    """Recommandations tirées des agrégats de la période (engins, heures de pointe)"""
+    recommendations = []
+    engins = engins_data[engins_data['total_operations'] > 0]
+    if not engins.empty:
+        rates = 100.0 * engins['erreurs'] / engins['total_operations']
+        worst = engins.loc[rates.idxmax()]
+        recommendations.append(
+            f"**Maintenance {worst['engin']}** : Planifier maintenance préventive "
+            f"(taux erreur: {rates.max():.1f}% contre {100.0 * engins['erreurs'].sum() / engins['total_operations'].sum():.1f}% en moyenne)"
+        )
+        with_duration = engins.dropna(subset=['duree_moyenne'])
+        if not with_duration.empty:
+            slowest = with_duration.loc[with_duration['duree_moyenne'].idxmax()]
+            fleet = (with_duration['duree_moyenne'] * with_duration['total_operations']).sum() / with_duration['total_operations'].sum()
+            recommendations.append(
+                f"**Optimiser {slowest['engin']}** : Durée moyenne de {slowest['duree_moyenne']:.0f} min "
+                f"(+{slowest['duree_moyenne'] - fleet:.0f} min par rapport à la flotte)"
+            )
+    if len(hourly_data) >= 4 and hourly_data['nb_operations'].sum() > 0:
+        # Créneaux de deux heures les plus et les moins chargés
+        by_hour = hourly_data.set_index('heure')['nb_operations'].reindex(range(24), fill_value=0)
+        windows = by_hour + by_hour.shift(-1, fill_value=by_hour.iloc[0])
+        peak, low = int(windows.idxmax()), int(windows.idxmin())
+        share = 100.0 * windows.max() / by_hour.sum()
+        recommendations.append(
+            f"**Équilibrage charge** : {share:.0f}% des opérations entre {peak}h et {(peak + 2) % 24}h, "
+            f"déplacer une partie vers {low}h-{(low + 2) % 24}h"
+        )
+    recommendations.append("**Formation équipe** : Session sur procédures chargement (erreurs réduisibles de 40%)")
+    recommendations.append("**Investissement capteurs** : Ajouter 5 capteurs RFID pour tracking temps-réel")
+    return recommendations
+
+
+# ========== CALCUL ==========
+def compute(db_path=data_access.DB_PATH, today=None):
+    """Tous les jeux de données de l'instantané : {nom: DataFrame}"""
+    data_access.clear_cache()
+    datasets = {}
+    for label, days in PERIODS.items():
+        start, end = period_range(days, today)
+        daily, engins, hourly, _ = data_access.load_data(start, end, db_path=db_path)
+        watchlist, n_flagged = data_access.load_watchlist(start, end, db_path=db_path)
+        totals = data_access.load_totals(start, end, db_path=db_path)
+        prefix = _prefix(label)
+        datasets[prefix + "daily"] = daily
+        datasets[prefix + "engins"] = engins
+        datasets[prefix + "hourly"] = hourly
+        datasets[prefix + "activity_hourly"] = data_access.load_activity_hourly(start, end, db_path=db_path)
+        datasets[prefix + "watchlist"] = watchlist.assign(nb_signales=n_flagged)
+        datasets[prefix + "totals"] = pd.DataFrame([totals]) if totals is not None else pd.DataFrame()
+        datasets[prefix + "recommendations"] = pd.DataFrame({'texte': recommendations_of(engins, hourly)})
+    alerts = data_access.load_active_alerts(db_path=db_path)
+    datasets["alerts"] = alerts if alerts is not None else pd.DataFrame()
+    anomalies = data_access.load_anomalies(db_path=db_path)
+    datasets["anomalies"] = anomalies if anomalies is not None else pd.DataFrame()
+    return datasets
+
+
+def _prefix(label):
+    return f"{PERIODS[label]}j."
+
+
+# ========== PUBLICATION ==========
+def publish(datasets, directory=SNAPSHOT_DIR, today=None):
+    """Écrit une nouvelle version puis la rend courante atomiquement ; retourne son nom"""
+    directory = Path(directory)
+    directory.mkdir(parents=True, exist_ok=True)
+    version = f"v{time.time_ns()}"
+    staging = directory / f".{version}.tmp"
+    staging.mkdir()
+    for name, frame in datasets.items():
+        table = pa.Table.from_pandas(frame, preserve_index=False)
+        with pa.OSFile(str(staging / f"{name}.arrow"), "wb") as sink:
+            with pa.ipc.new_file(sink, table.schema) as writer:
+                writer.write_table(table)
+    manifest = {
+        "version": version,
+        "genere_a": time.time(),
+        "jour": str(today or date.today()),
+        "datasets": sorted(datasets),
+    }
+    (staging / "manifest.json").write_text(json.dumps(manifest, ensure_ascii=False))
+    os.replace(staging, directory / version)
+    pointer = directory / f".{POINTER}.tmp"
+    pointer.write_text(version)
+    os.replace(pointer, directory / POINTER)
+    _prune(directory, version)
+    return version
+
+
+def _prune(directory, current):
+    versions = sorted(p for p in directory.glob("v*") if p.is_dir() and p.name != current)
+    for old in versions[:max(len(versions) - (KEEP_VERSIONS - 1), 0)]:
+        # Les lecteurs encore ouverts gardent leurs pages mappées (POSIX)
+        shutil.rmtree(old, ignore_errors=True)
+
+
+# ========== LECTURE ==========
+class Snapshot:
+    """Version publiée : tables Arrow mappées en mémoire, converties à la demande"""
+
+    def __init__(self, path):
+        self.path = Path(path)
+        self.manifest = json.loads((self.path / "manifest.json").read_text())
+        self._tables = {}
+        self._lock = threading.Lock()
+
+    @property
+    def age(self):
+        return time.time() - self.manifest["genere_a"]
+
+    def is_fresh(self, max_age=MAX_AGE):
+        return self.manifest["jour"] == str(date.today()) and self.age <= max_age
+
+    def table(self, name):
+        with self._lock:
+            if name not in self._tables:
+                source = pa.memory_map(str(self.path / f"{name}.arrow"), "r")
+                self._tables[name] = pa.ipc.open_file(source).read_all()
+            return self._tables[name]
+
+    def frame(self, name):
+        return self.table(name).to_pandas()
+
+    def view(self, period_label):
+        """Jeux de données d'une période prédéfinie, None si la période n'est pas couverte"""
+        if period_label not in PERIODS:
+            return None
+        prefix = _prefix(period_label)
+        return {name: self.frame(prefix + name) for name in PERIOD_DATASETS}
+
+
+_opened = {}
+_opened_lock = threading.Lock()
+
+
+def current(directory=SNAPSHOT_DIR):
+    """Version courante (partagée par le processus), None si absente ou pyarrow manquant"""
+    if pa is None:
+        return None
+    try:
+        version = (Path(directory) / POINTER).read_text().strip()
+    except FileNotFoundError:
+        return None
+    key = (str(directory), version)
+    with _opened_lock:
+        snapshot = _opened.get(key)
+        if snapshot is None:
+            snapshot = Snapshot(Path(directory) / version)
+            # Une seule version ouverte par répertoire : les précédentes sont libérées
+            for old in [k for k in _opened if k[0] == key[0]]:
+                del _opened[old]
+            _opened[key] = snapshot
+    return snapshot
+
+
+# ========== WORKER ==========
+def _source_version(db_path):
+    """Dernier rowid d'operations : change à chaque ingestion"""
+    with data_access.get_pool(db_path).connection() as conn:
+        return conn.execute("SELECT MAX(rowid) FROM operations").fetchone()[0]
+
+
+def run(db_path=data_access.DB_PATH, directory=SNAPSHOT_DIR, interval=60, poll=2.0, min_gap=10, log=print):
+    """Republie après chaque ingestion détectée (au plus une fois toutes les
+    min_gap secondes) et au moins toutes les interval secondes"""
+    published_for, published_at = None, float("-inf")
+    while True:
+        source = (_source_version(db_path), date.today())
+        elapsed = time.monotonic() - published_at
+        if (source != published_for and elapsed >= min_gap) or elapsed >= interval:
+            started = time.perf_counter()
+            version = publish(compute(db_path), directory)
+            published_for, published_at = source, time.monotonic()
+            log(f"📦 {datetime.now():%H:%M:%S} instantané {version} publié "
+                f"({time.perf_counter() - started:.2f}s)")
+        time.sleep(poll)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Instantanés pré-calculés du dashboard PortSec")
+    parser.add_argument("command", choices=["publish", "run"])
+    parser.add_argument("--db", default=str(data_access.DB_PATH), help="Chemin de la base SQLite")
+    parser.add_argument("--dir", default=str(SNAPSHOT_DIR), help="Répertoire des instantanés")
+    parser.add_argument("--interval", type=float, default=60, help="Période maximale entre deux publications (s)")
+    args = parser.parse_args(argv)
+
+    if pa is None:
+        print("❌ Les instantanés nécessitent pyarrow (pip install pyarrow)")
+        return 1
+    if args.command == "publish":
+        started = time.perf_counter()
+        version = publish(compute(Path(args.db)), args.dir)
+        print(f"✅ Instantané {version} publié ({time.perf_counter() - started:.2f}s)")
+        return 0
+    try:
+        run(Path(args.db), args.dir, args.interval)
+    except KeyboardInterrupt:
+        return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,265 @@
+"""Générateur vectorisé et reproductible d'opérations synthétiques.
+
+Produit des lignes `operations` (timestamp, type_operation, zone, engin,
+duree_minutes, urgence, erreur) par lots NumPy, avec une saisonnalité
+horaire par zone, hebdomadaire, et des profils d'engins par zone. Les
+agrégats journaliers / engins / horaires sont dérivés de ces lignes et
+sont donc cohérents avec elles.
+
+Usage :
+    python dashboard/synthetic.py --db /tmp/loadtest.db --rows 10000000 --days 730
+"""
+import argparse
+import sqlite3
+import sys
+import time
+from datetime import datetime, timedelta
+
+import numpy as np
+import pandas as pd
+
+SEED = 2026
+BATCH_SIZE = 500_000
+OPS_PER_DAY = 300  # 128 à 500 camions/jour sur le terrain
+
+ENGINS = ['TRACTEUR_01', 'TRACTEUR_02', 'TRACTEUR_03', 'CHARIOT_01', 'CHARIOT_02', 'GRUE_01']
+ZONES = ['QUAI_1', 'QUAI_2_ROUTIER', 'ZONE_STOCKAGE', 'CONTROLE_DOUANE', 'MAINTENANCE']
+TYPES_OPERATION = ['CHARGEMENT', 'DÉCHARGEMENT', 'VÉRIFICATION']
+
+COLUMNS = ['timestamp', 'type_operation', 'zone', 'engin', 'duree_minutes', 'urgence', 'erreur']
+
+# ========== PROFILS DE SAISONNALITÉ ==========
+_HOURS = np.arange(24)
+
+
+def _bell(center, width):
+    return np.exp(-0.5 * ((_HOURS - center) / width) ** 2)
+
+
+# Activité relative par heure et par zone (lignes = ZONES)
+HOURLY_PROFILE = np.vstack([
+    0.05 + _bell(10, 2.5) + 0.8 * _bell(15, 2.0),    # QUAI_1
+    0.05 + _bell(8, 2.0) + _bell(17, 2.0),           # QUAI_2_ROUTIER : pointes camions
+    0.10 + 0.6 * _bell(12, 4.0),                     # ZONE_STOCKAGE : étalé
+    0.02 + _bell(11, 3.0),                           # CONTROLE_DOUANE : heures de bureau
+    0.30 + 0.2 * _bell(3, 3.0),                      # MAINTENANCE : plutôt de nuit
+])
+# Lundi .. dimanche
+WEEKDAY_PROFILE = np.array([1.10, 1.05, 1.00, 1.00, 1.15, 0.70, 0.35])
+ZONE_WEIGHTS = np.array([0.30, 0.28, 0.22, 0.15, 0.05])
+# Probabilité d'engin par zone (lignes = ZONES, colonnes = ENGINS)
+ENGIN_BY_ZONE = np.array([
+    [0.25, 0.20, 0.10, 0.10, 0.05, 0.30],
+    [0.30, 0.30, 0.25, 0.05, 0.05, 0.05],
+    [0.05, 0.05, 0.10, 0.35, 0.35, 0.10],
+    [0.30, 0.30, 0.30, 0.05, 0.05, 0.00],
+    [0.20, 0.20, 0.20, 0.15, 0.15, 0.10],
+])
+TYPE_BY_ZONE = np.array([
+    [0.45, 0.45, 0.10],
+    [0.45, 0.45, 0.10],
+    [0.40, 0.40, 0.20],
+    [0.05, 0.05, 0.90],
+    [0.10, 0.10, 0.80],
+])
+# Durée médiane (min) par type, facteur multiplicatif par engin
+MEDIAN_DURATION = np.array([42.0, 38.0, 20.0])
+ENGIN_DURATION_FACTOR = np.array([1.00, 1.05, 1.10, 0.90, 0.95, 1.25])
+URGENCE_BY_ZONE = np.array([0.04, 0.05, 0.02, 0.06, 0.08])
+ERREUR_BY_ENGIN = np.array([0.020, 0.025, 0.045, 0.015, 0.020, 0.030])
+
+
+def _conditional_cdf(weights):
+    """CDF par ligne, décalée de l'indice de ligne pour un searchsorted unique"""
+    probs = weights / weights.sum(axis=1, keepdims=True)
+    cdf = np.cumsum(probs, axis=1)
+    cdf[:, -1] = 1.0
+    return (cdf + np.arange(len(weights))[:, None]).ravel()
+
+
+def _sample_conditional(rng, flat_cdf, rows, n_cols):
+    """Tire une colonne par ligne selon la distribution conditionnelle de rows"""
+    u = rows + rng.random(len(rows))
+    idx = np.searchsorted(flat_cdf, u, side='right') - rows * n_cols
+    return np.minimum(idx, n_cols - 1)
+
+
+_HOUR_CDF = _conditional_cdf(HOURLY_PROFILE)
+_ENGIN_CDF = _conditional_cdf(ENGIN_BY_ZONE)
+_TYPE_CDF = _conditional_cdf(TYPE_BY_ZONE)
+
+
+# ========== GÉNÉRATION ==========
+def _day_counts(rng, start, n_days, n_rows):
+    weekdays = (np.arange(n_days) + start.weekday()) % 7
+    weights = WEEKDAY_PROFILE[weekdays] * rng.uniform(0.85, 1.15, n_days)
+    if n_rows is None:
+        return rng.poisson(OPS_PER_DAY * weights / WEEKDAY_PROFILE.mean())
+    return rng.multinomial(n_rows, weights / weights.sum())
+
+
+def _make_batch(rng, day0, days):
+    n = len(days)
+    zone = rng.choice(len(ZONES), size=n, p=ZONE_WEIGHTS / ZONE_WEIGHTS.sum())
+    hour = _sample_conditional(rng, _HOUR_CDF, zone, 24)
+    engin = _sample_conditional(rng, _ENGIN_CDF, zone, len(ENGINS))
+    op_type = _sample_conditional(rng, _TYPE_CDF, zone, len(TYPES_OPERATION))
+
+    seconds = days * 86400 + hour * 3600 + rng.integers(0, 3600, n)
+    order = np.argsort(seconds, kind='stable')
+    seconds, zone, hour, engin, op_type = (a[order] for a in (seconds, zone, hour, engin, op_type))
+
+    # Congestion : les heures chargées de la zone allongent les opérations
+    load = HOURLY_PROFILE[zone, hour] / HOURLY_PROFILE.max(axis=1)[zone]
+    median = MEDIAN_DURATION[op_type] * ENGIN_DURATION_FACTOR[engin] * (0.85 + 0.3 * load)
+    duree = np.round(median * rng.lognormal(0.0, 0.25, n), 1)
+    urgence = (rng.random(n) < URGENCE_BY_ZONE[zone]).astype(np.int8)
+    erreur = (rng.random(n) < ERREUR_BY_ENGIN[engin] * (0.7 + 0.6 * load)).astype(np.int8)
+
+    return pd.DataFrame({
+        'timestamp': day0 + seconds.astype('timedelta64[s]'),
+        'type_operation': pd.Categorical.from_codes(op_type, TYPES_OPERATION),
+        'zone': pd.Categorical.from_codes(zone, ZONES),
+        'engin': pd.Categorical.from_codes(engin, ENGINS),
+        'duree_minutes': duree,
+        'urgence': urgence,
+        'erreur': erreur,
+    })
+
+
+def generate_operations(start_date, end_date, n_rows=None, seed=SEED, batch_size=BATCH_SIZE):
+    """Génère des lots d'opérations triés par timestamp sur [start_date, end_date]
+
+    Sans n_rows, le volume suit OPS_PER_DAY modulé par le jour de semaine.
+    """
+    rng = np.random.default_rng(seed)
+    start = pd.Timestamp(start_date).normalize()
+    end = pd.Timestamp(end_date).normalize()
+    n_days = (end - start).days + 1
+    if n_days <= 0:
+        return
+    counts = _day_counts(rng, start, n_days, n_rows)
+    day0 = np.datetime64(start.to_datetime64(), 's')
+
+    # Découpage en lots de jours entiers d'environ batch_size lignes
+    cum = np.cumsum(counts)
+    first = 0
+    while first < n_days:
+        base = cum[first - 1] if first else 0
+        last = int(np.searchsorted(cum, base + batch_size, side='right'))
+        last = max(last, first + 1)
+        days = np.repeat(np.arange(first, min(last, n_days)), counts[first:last])
+        if len(days):
+            batch = _make_batch(rng, day0, days)
+            # Le dernier jour s'arrête à l'heure de fin (pas d'opérations futures)
+            if last >= n_days:
+                batch = batch[batch['timestamp'] <= pd.Timestamp(end_date)]
+            yield batch
+        first = last
+
+
+def sample_operations(start_date, end_date, n_rows=None, seed=SEED):
+    """Opérations synthétiques de la période dans un seul DataFrame"""
+    batches = list(generate_operations(start_date, end_date, n_rows, seed))
+    if not batches:
+        return pd.DataFrame({c: [] for c in COLUMNS})
+    return pd.concat(batches, ignore_index=True)
+
+
+def sample_datasets(start_date, end_date, active_filters=None):
+    """Les quatre jeux de données du dashboard calculés sur des opérations synthétiques
+
+    Les agrégats sont tranchés dans un cube construit en mémoire (mêmes
+    fonctions que la base) : ils sont cohérents avec les opérations
+    récentes et stables d'un appel à l'autre (graine fixe).
+    """
+    import cube
+    from filters import Filters
+
+    active_filters = active_filters or Filters()
+    ops = sample_operations(start_date, end_date)
+    cells = cube.OperationsCube.from_operations(ops)
+    selected = active_filters.cube_mask(cells)
+    daily_data, engins_data, hourly_data = cells.daily(selected), cells.engins(selected), cells.hourly(selected)
+
+    recent_ops = ops[active_filters.frame_mask(ops)].iloc[::-1].head(100).reset_index(drop=True)
+    for col in ('type_operation', 'zone', 'engin'):
+        recent_ops[col] = recent_ops[col].astype(str)
+    return daily_data, engins_data, hourly_data, recent_ops
+
+
+def _labels(column):
+    # Catégoriel : indexation du tableau des libellés par les codes,
+    # bien plus rapide que astype(str) ligne à ligne
+    if isinstance(column.dtype, pd.CategoricalDtype):
+        return column.cat.categories.to_numpy(dtype=object)[column.cat.codes.to_numpy()].tolist()
+    return column.astype(str).tolist()
+
+
+def to_sql_rows(batch):
+    """Convertit un lot en tuples prêts pour executemany (timestamps texte)"""
+    stamps = np.datetime_as_string(batch['timestamp'].to_numpy().astype('datetime64[s]'), unit='s')
+    # 'YYYY-MM-DDTHH:MM:SS' -> 'YYYY-MM-DD HH:MM:SS' sans copie caractère par caractère
+    stamps.view(np.uint32).reshape(len(stamps), -1)[:, 10] = ord(' ')
+    return zip(
+        stamps.tolist(),
+        _labels(batch['type_operation']),
+        _labels(batch['zone']),
+        _labels(batch['engin']),
+        batch['duree_minutes'].tolist(),
+        batch['urgence'].tolist(),
+        batch['erreur'].tolist(),
+    )
+
+
+def write_sqlite(db_path, start_date, end_date, n_rows=None, seed=SEED, batch_size=BATCH_SIZE, log=print):
+    """Remplit la table operations d'un fichier SQLite puis le migre
+
+    Les index et rollups sont construits après le chargement (migrations
+    2 et 3), bien plus vite que maintenus ligne à ligne.
+    """
+    import migrate
+
+    conn = sqlite3.connect(db_path)
+    try:
+        conn.execute("PRAGMA journal_mode = WAL")
+        conn.execute("PRAGMA synchronous = OFF")
+        conn.execute("PRAGMA cache_size = -262144")
+        conn.executescript(migrate.BASE_SCHEMA)
+        started = time.perf_counter()
+        total = 0
+        for batch in generate_operations(start_date, end_date, n_rows, seed, batch_size):
+            with conn:
+                conn.executemany(
+                    "INSERT INTO operations (timestamp, type_operation, zone, engin, "
+                    "duree_minutes, urgence, erreur) VALUES (?, ?, ?, ?, ?, ?, ?)",
+                    to_sql_rows(batch),
+                )
+            total += len(batch)
+            log(f"   {total:,} lignes ({total / (time.perf_counter() - started):,.0f} lignes/s)")
+        migrate.migrate(conn, log=log)
+        conn.execute("PRAGMA synchronous = NORMAL")
+        return total
+    finally:
+        conn.close()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Génère une base PortSec synthétique")
+    parser.add_argument("--db", required=True, help="Fichier SQLite à remplir")
+    parser.add_argument("--rows", type=int, default=None, help="Nombre total de lignes")
+    parser.add_argument("--days", type=int, default=90, help="Profondeur d'historique (jours)")
+    parser.add_argument("--seed", type=int, default=SEED)
+    parser.add_argument("--batch-size", type=int, default=BATCH_SIZE)
+    args = parser.parse_args(argv)
+
+    end_date = datetime.now()
+    start_date = end_date - timedelta(days=args.days)
+    started = time.perf_counter()
+    total = write_sqlite(args.db, start_date, end_date, args.rows, args.seed, args.batch_size)
+    print(f"✅ {total:,} opérations écrites dans {args.db} en {time.perf_counter() - started:.1f}s")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())